@@ -17,8 +17,25 @@ class Settings:
     MAX_UPLOAD_FILES: int = int(os.getenv("MAX_UPLOAD_FILES", "10"))
     OCR_LANGUAGE: str = os.getenv("OCR_LANGUAGE", "deu")
     OCR_DPI: int = int(os.getenv("OCR_DPI", "300"))
+    # Anzahl paralleler OCR-Prozesse (je Seite ein Tesseract-Aufruf)
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+    # Basisverzeichnis für Disk-Caches (liegt standardmäßig im persistenten Upload-Volume)
+    CACHE_DIR: Path = Path(os.getenv("CACHE_DIR", str(UPLOAD_DIR / "cache")))
+    # ICD-10-GM-Katalog für Validierung und Suche der Diagnoseschlüssel
+    ICD10_DATA_PATH: Path = Path(os.getenv("ICD10_DATA_PATH", str(FORM_TEMPLATE_DIR / "icd10_codes_2025.json")))
+    # Cache für Text-/OCR-Extraktion (Schlüssel: SHA-256 der PDF + OCR-Einstellungen)
+    EXTRACTION_CACHE_ENABLED: bool = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    EXTRACTION_CACHE_MAX_MB: int = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "200"))
+    # Cache für LLM-Antworten (Schlüssel: Modell, Optionen, Schema, System- und User-Prompt)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "50"))
+    LLM_CACHE_TTL_HOURS: int = int(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+    # Kassetten für Offline-Tests: "record" zeichnet jede Ollama-Anfrage auf, "replay" spielt nur
+    # Aufzeichnungen ab (ohne Ollama), "off" deaktiviert. Kassetten enthalten den Quelltext der Dokumente!
+    LLM_CASSETTE_MODE: str = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+    LLM_CASSETTE_DIR: Path = Path(os.getenv("LLM_CASSETTE_DIR", str(UPLOAD_DIR / "cassettes")))
     MAX_OLLAMA_PASSES: int = int(os.getenv("MAX_OLLAMA_PASSES", "3"))
-    # Context-Fenstergröße Standard: für kurze Anfragen (ICD-10-Validierung, Warmup)
+    # Context-Fenstergröße Standard: für kurze Anfragen (Warmup); ICD-10-Codes werden lokal geprüft (ICD10_DATA_PATH)
     OLLAMA_NUM_CTX: int = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
     # Context-Fenstergröße für Pässe mit vollem Quelltext (Pass 1-4): passt noch vollständig in VRAM
     # Benchmark: 8192→10.1 GB VRAM (100%), 16384≈11.2 GB VRAM (100%), 32768→17.2 GB (64%, CPU-Overflow)
@@ -27,6 +44,43 @@ class Settings:
     OLLAMA_MODEL_SMALL: str = os.getenv("OLLAMA_MODEL_SMALL", "gemma4:e2b")
     # Schwellenwert in Zeichen: ab dieser OCR-Textlänge wird das kleinere Modell verwendet
     LARGE_TEXT_THRESHOLD: int = int(os.getenv("LARGE_TEXT_THRESHOLD", "15000"))
+    # Retrieval für große Quelltexte: jeder Pass erhält nur die relevantesten Abschnitte (BM25)
+    # statt des vollständigen Texts, dadurch bleibt das Standard-Modell nutzbar
+    TEXT_RETRIEVAL_ENABLED: bool = os.getenv("TEXT_RETRIEVAL_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Zeichenbudget pro Pass (muss inkl. System-Prompt in OLLAMA_NUM_CTX_LARGE passen)
+    TEXT_RETRIEVAL_MAX_CHARS: int = int(os.getenv("TEXT_RETRIEVAL_MAX_CHARS", "12000"))
+    TEXT_RETRIEVAL_CHUNK_CHARS: int = int(os.getenv("TEXT_RETRIEVAL_CHUNK_CHARS", "1200"))
+    # Maximale Anzahl gleichzeitiger Extraktions-Pässe pro Dokument. Sollte OLLAMA_NUM_PARALLEL
+    # des Ollama-Servers entsprechen; jeder parallele Slot belegt zusätzlichen KV-Cache (num_ctx) im VRAM
+    OLLAMA_PARALLEL_PASSES: int = int(os.getenv("OLLAMA_PARALLEL_PASSES", "1"))
+    # Wie lange Ollama das Modell (inkl. KV-Cache des Quelltext-Prefix) nach einer Anfrage hält
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    # Gültigkeit des /api/ps-Caches in Sekunden (wird bei Laden/Entladen sofort verworfen)
+    OLLAMA_PS_CACHE_SECONDS: float = float(os.getenv("OLLAMA_PS_CACHE_SECONDS", "5"))
+    # JSON-Schema als Ollama "format" senden (structured output); false = freie JSON-Antwort + Reparatur
+    OLLAMA_STRUCTURED_OUTPUT: bool = os.getenv("OLLAMA_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+    # HTTP-Verbindungspool zu Ollama (pro Prozess) und Wiederholungen bei Verbindungsfehlern
+    OLLAMA_HTTP_POOL_SIZE: int = int(os.getenv("OLLAMA_HTTP_POOL_SIZE", "8"))
+    OLLAMA_HTTP_RETRIES: int = int(os.getenv("OLLAMA_HTTP_RETRIES", "3"))
+    OLLAMA_HTTP_BACKOFF: float = float(os.getenv("OLLAMA_HTTP_BACKOFF", "0.5"))
+    # Ausgefüllte PDFs linearisieren ("Fast Web View") bzw. Objekte in komprimierte Object-Streams packen
+    PDF_LINEARIZE: bool = os.getenv("PDF_LINEARIZE", "false").lower() in ("1", "true", "yes")
+    PDF_OBJECT_STREAMS: bool = os.getenv("PDF_OBJECT_STREAMS", "false").lower() in ("1", "true", "yes")
+    # Prometheus-Metriken unter /metrics; jeder Gunicorn-Worker legt dort seinen Snapshot ab
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_DIR: Path = Path(os.getenv("METRICS_DIR", "/tmp/kiforms-metrics"))
+    # Span-Zeitleiste pro Session (UPLOAD_DIR/<session>/trace.jsonl), Ansicht unter /admin/traces
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+    # Zugangs-Token fuer /admin/traces und /api/traces (leer = Ansichten abgeschaltet)
+    TRACING_ADMIN_TOKEN: str = os.getenv("TRACING_ADMIN_TOKEN", "")
+    # Anzahl paralleler Verarbeitungs-Jobs pro Gunicorn-Worker (Durchsatz ist durch die GPU begrenzt)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))
+    # Jobs ohne Heartbeat gelten danach als verwaist (passend zu gunicorn --timeout)
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "600"))
+    # Session-Speicher: "sqlite" (prozessübergreifend, persistent) oder "memory" (nur ein Worker)
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "sqlite")
+    SESSION_DB_PATH: Path = Path(os.getenv("SESSION_DB_PATH", str(UPLOAD_DIR / "sessions.db")))
+    SESSION_TTL_HOURS: int = int(os.getenv("SESSION_TTL_HOURS", "24"))
 
 
 settings = Settings()
@@ -1,4 +1,5 @@
 ﻿from app.models.form_schema import FormField, FieldType, FormDefinition
+from app.services.rule_extractor import FieldRule, normalize_date, normalize_plz
 
 S0051_FIELDS = [
     # ===================================================================
@@ -923,10 +924,46 @@ S0051_FIELDS = [
     ),
 ]
 
+# ===================================================================
+# Regeln fuer die deterministische Vorab-Extraktion (vor den KI-Pässen)
+# ===================================================================
+# Felder werden nur bei eindeutigem Treffer gefuellt und dann aus den KI-Pässen
+# genommen. ICD-Codes bleiben bewusst bei der KI: ihre Reihenfolge muss zu den
+# Diagnosetexten (VERS_DIAGNOSE_N) passen. Das Geburtsdatum fuellt nur
+# PAT_Geburtsdatum: Versicherte/r und Patient/in koennen verschiedene Personen
+# sein, die S0050-Uebernahme faellt ohnehin von PAT auf VERS zurueck. Ein "*"
+# vor dem Datum ist kein Geburtsdatum-Kennzeichen (Aufzaehlungen in Befunden).
+# Die Anschrift zaehlt nur mit eigenstaendigem Schluesselwort direkt vor der
+# Strasse: "Praxis-Adresse:" oder "Anschrift der Praxis:" sind nicht die des
+# Versicherten.
+S0051_RULES = [
+    FieldRule(
+        name="Geburtsdatum",
+        pattern=r"(?i:\bgeb(?:oren|\.)?(?:\s+am)?|Geburtsdatum|Geb\.-Datum)\s*:?\s*"
+                r"(?P<gebdat>\d{1,2}\.\s?\d{1,2}\.\s?(?:\d{4}|\d{2})\b)",
+        targets={"gebdat": ["PAT_Geburtsdatum"]},
+        normalizers={"gebdat": normalize_date},
+    ),
+    FieldRule(
+        name="Anschrift",
+        pattern=r"(?<![\w-])(?i:wohnhaft(?:\s+in)?|Anschrift|Adresse|whft\.)\s*:?\s*"
+                r"(?P<strasse>[A-ZÄÖÜ][^\n,:]{2,40}?\s\d+\s?[a-z]?)\s*,\s*"
+                r"(?P<plz>\d{5})[ ]+"
+                r"(?P<ort>[A-ZÄÖÜ][\w.\-]+(?:[ ](?:am|an der|im|ob der)[ ][A-ZÄÖÜ][\w\-]+)?)",
+        targets={
+            "strasse": ["VERS_STRASSE_HNR"],
+            "plz": ["VERS_PLZ"],
+            "ort": ["VERS_WOHNORT"],
+        },
+        normalizers={"plz": normalize_plz},
+    ),
+]
+
 S0051_DEFINITION = FormDefinition(
     form_id="S0051",
     form_title="Befundbericht fuer die Deutsche Rentenversicherung",
     fields=S0051_FIELDS,
+    rules=S0051_RULES,
 )
 
 
@@ -18,6 +18,8 @@ from datetime import datetime
 
 from app.models.form_schema import FormField, FieldStatus, FieldType
 from app.config import settings
+from app.services import tracing
+from app.services.metrics import S0050_GENERATION_SECONDS
 from .base_handler import BaseFormHandler
 
 logger = logging.getLogger(__name__)
@@ -71,6 +73,8 @@ class S0051FormHandler(BaseFormHandler):
         Hook nach KI-Extraktion:
         1. Sender-Daten einfuegen
         2. PAT_* -> VERS_* Kopie
+        3. Fallback fuer leere Befundfelder
+        4. ICD-10-Codes gegen den Katalog pruefen und normalisieren
         """
         fields_by_name = {f.field_name: f for f in fields}
 
@@ -88,6 +92,9 @@ class S0051FormHandler(BaseFormHandler):
                 field.status = FieldStatus.FILLED
                 field.ai_confidence = "low"
 
+        # 4. ICD-10-Codes validieren
+        self._validate_icd_codes(fields_by_name)
+
         return fields
 
     def on_finalize(
@@ -100,7 +107,8 @@ class S0051FormHandler(BaseFormHandler):
         Generiert S0050 automatisch aus S0051-Daten.
         """
         try:
-            self._generate_s0050_from_s0051(session_id, fields_by_name)
+            with S0050_GENERATION_SECONDS.time(), tracing.span("s0050_generation"):
+                self._generate_s0050_from_s0051(session_id, fields_by_name)
             logger.info(f"S0050 automatisch generiert für Session {session_id}")
         except Exception as e:
             logger.error(f"Fehler beim automatischen Generieren von S0050: {e}")
@@ -230,6 +238,40 @@ class S0051FormHandler(BaseFormHandler):
         except Exception as e:
             logger.warning(f"Fehler beim Befüllen der Behandlungsfelder mit Sender-Daten: {e}")
 
+    def _validate_icd_codes(self, fields_by_name: Dict[str, FormField]) -> None:
+        """
+        Normalisiert die ICD-10-Felder (VERS_DIAGNOSESCH_*) gegen den ICD-10-GM-Katalog.
+
+        Gueltige Codes werden vereinheitlicht (z.B. "m54,5" -> "M54.5"). Unbekannte
+        Codes bleiben zur Pruefung im Review stehen, erhalten aber Konfidenz "low";
+        ebenso Codes, die auf eine gueltige Ebene gekuerzt wurden ("M54.59" -> "M54.5").
+
+        Args:
+            fields_by_name: Dictionary mit field_name als Key
+        """
+        from app.services.icd10_index import get_icd10_index, is_formatting_change
+
+        try:
+            index = get_icd10_index()
+        except Exception as e:
+            logger.warning(f"ICD-10-Katalog nicht verfuegbar, Codes ungeprueft: {e}")
+            return
+
+        for field_name, field in fields_by_name.items():
+            if not field_name.startswith("VERS_DIAGNOSESCH_") or not field.value:
+                continue
+            normalized = index.normalize_code(field.value)
+            if normalized is None:
+                logger.warning(f"{field_name}: unbekannter ICD-10-Code '{field.value}'")
+                field.ai_confidence = "low"
+            elif normalized != field.value:
+                if is_formatting_change(field.value, normalized):
+                    logger.info(f"{field_name}: ICD-10-Code '{field.value}' -> '{normalized}'")
+                else:
+                    logger.warning(f"{field_name}: ICD-10-Code '{field.value}' unbekannt, gekuerzt auf '{normalized}'")
+                    field.ai_confidence = "low"
+                field.value = normalized
+
     def _copy_patient_to_versicherte(self, fields_by_name: Dict[str, FormField]) -> None:
         """
         Kopiert PAT_* Felder zu VERS_* Feldern (falls VERS_* leer ist).
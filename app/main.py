@@ -40,6 +40,13 @@ def inject_version():
 settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 settings.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# ICD-10-Index einmal pro Worker laden (Validierung + Suche)
+try:
+    from app.services.icd10_index import get_icd10_index
+    get_icd10_index()
+except Exception as e:
+    logger.warning(f"ICD-10-Katalog konnte nicht geladen werden: {e}")
+
 try:
     resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=10)
     resp.raise_for_status()
@@ -42,6 +42,7 @@ class FormDefinition:
     form_id: str
     form_title: str
     fields: list[FormField]
+    rules: list = field(default_factory=list)  # Regex-Regeln (rule_extractor.FieldRule) vor der KI-Extraktion
 
 
 @dataclass
@@ -7,12 +7,10 @@ from pathlib import Path
 from flask import Blueprint, render_template, request, redirect, url_for, abort, send_file, jsonify
 
 from app.config import settings
+from app.services.session_store import get_session_store
 
 forms_bp = Blueprint("forms", __name__)
 
-# In-Memory Session-Speicher
-sessions: dict = {}
-
 
 def _normalize_radio_text(value: str | None) -> str:
     text = (value or "").strip()
@@ -147,20 +145,14 @@ def upload_page(form_id):
 
 @forms_bp.route("/form/<form_id>/process", methods=["POST"])
 def process_upload(form_id):
-    """Dateien hochladen, Text extrahieren, KI-Extraktion durchfuehren."""
-    from app.services import pdf_reader, field_extractor
-    from app.models.form_schema import FieldStatus
+    """Dateien hochladen und Verarbeitungs-Job einreihen (Antwort sofort mit Job-ID)."""
+    from app.services import job_queue, tracing
     from app.form_registry import get_form_registry
 
-    # Handler und Definition aus Registry holen
     registry = get_form_registry()
-    registry_entry = registry.get(form_id)
-    if not registry_entry:
+    if not registry.get(form_id):
         abort(404, "Formular nicht gefunden")
 
-    handler = registry.create_handler(form_id)
-    form_def = registry_entry.definition
-
     session_id = str(uuid.uuid4())
     session_dir = settings.UPLOAD_DIR / session_id
     session_dir.mkdir(parents=True, exist_ok=True)
@@ -168,46 +160,120 @@ def process_upload(form_id):
     # Dateien speichern
     files = request.files.getlist("files")
     saved_paths = []
-    for f in files:
-        if not f.filename:
-            continue
-        dest = session_dir / f.filename
-        f.save(str(dest))
-        saved_paths.append(dest)
+    with tracing.trace(session_id, "upload", form_id=form_id) as upload_span:
+        for f in files:
+            if not f.filename:
+                continue
+            dest = session_dir / f.filename
+            f.save(str(dest))
+            saved_paths.append(dest)
+        if upload_span is not None:
+            upload_span.attrs.update(files=len(saved_paths), bytes=sum(p.stat().st_size for p in saved_paths))
 
     if not saved_paths:
         abort(400, "Keine Dateien hochgeladen")
 
-    # Text aus allen PDFs extrahieren
-    source_text = pdf_reader.extract_from_multiple(saved_paths)
+    # OCR + KI-Extraktion laufen im Hintergrund, die Job-ID ist die Session-ID
+    job_queue.submit_job(session_id, form_id, _run_processing_job, form_id, saved_paths)
 
-    # Preprocessing Hook (falls Handler spezielle Logik braucht)
-    fields = [f.model_copy() for f in form_def.fields]
-    fields = handler.preprocess_fields(fields, source_text)
+    return jsonify({
+        "job_id": session_id,
+        "status_url": url_for("forms.job_status", job_id=session_id),
+        "cancel_url": url_for("forms.cancel_job", job_id=session_id),
+    }), 202
 
-    # KI-Feldextraktion
-    extraction_results = field_extractor.extract_fields(fields, source_text)
 
-    # Ergebnisse in Felder zusammenfuehren
-    result_map = {r.field_name: r for r in extraction_results}
-    for field in fields:
-        if field.field_name in result_map:
-            r = result_map[field.field_name]
-            field.value = r.value
-            field.status = FieldStatus.FILLED
-            field.ai_confidence = r.confidence
-
-    # Postprocessing Hook (Sender-Daten, Feldkopien, etc.)
-    fields = handler.postprocess_fields(fields, result_map)
-
-    # Session speichern
-    sessions[session_id] = {
-        "form_id": form_id,
-        "fields": fields,
-        "source_text": source_text,
+def _run_processing_job(job_id: str, form_id: str, saved_paths: list[Path]) -> None:
+    """Text extrahieren, KI-Extraktion durchfuehren, Session anlegen (im Worker-Pool)."""
+    from app.services import pdf_reader, field_extractor, job_queue, tracing
+    from app.models.form_schema import FieldStatus
+    from app.form_registry import get_form_registry
+
+    # Handler und Definition aus Registry holen
+    registry = get_form_registry()
+    registry_entry = registry.get(form_id)
+    handler = registry.create_handler(form_id)
+    form_def = registry_entry.definition
+
+    # Abbruch-Signal (Benutzer verlaesst die Seite / bricht ab)
+    cancel_token = job_queue.get_cancel_token(job_id)
+
+    with tracing.trace(job_id, "processing", form_id=form_id):
+        # Text aus allen PDFs extrahieren
+        job_queue.update_job(job_id, stage="ocr")
+        with tracing.span("ocr", files=len(saved_paths)):
+            source_text = pdf_reader.extract_from_multiple(saved_paths)
+        cancel_token.raise_if_set()
+
+        # Preprocessing Hook (falls Handler spezielle Logik braucht)
+        with tracing.span("preprocess"):
+            fields = [f.model_copy() for f in form_def.fields]
+            fields = handler.preprocess_fields(fields, source_text)
+
+        # KI-Feldextraktion
+        job_queue.update_job(job_id, stage="extraction")
+        with tracing.span("extraction", fields=len(fields)):
+            extraction_results = field_extractor.extract_fields(
+                fields, source_text, cancel_event=cancel_token, rules=form_def.rules
+            )
+        cancel_token.raise_if_set()
+
+        # Ergebnisse in Felder zusammenfuehren
+        job_queue.update_job(job_id, stage="postprocess")
+        with tracing.span("postprocess"):
+            result_map = {r.field_name: r for r in extraction_results}
+            for field in fields:
+                if field.field_name in result_map:
+                    r = result_map[field.field_name]
+                    field.value = r.value
+                    field.status = FieldStatus.FILLED
+                    field.ai_confidence = r.confidence
+
+            # Postprocessing Hook (Sender-Daten, Feldkopien, etc.)
+            fields = handler.postprocess_fields(fields, result_map)
+
+        # Session speichern
+        with tracing.span("session_store"):
+            get_session_store().put(job_id, {
+                "form_id": form_id,
+                "fields": fields,
+                "source_text": source_text,
+            })
+
+
+@forms_bp.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    """Status eines Verarbeitungs-Jobs abfragen (Polling durch upload.js)."""
+    from app.services import job_queue
+
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job nicht gefunden"}), 404
+
+    response = {
+        "job_id": job_id,
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "error": job.get("error"),
     }
+    if job.get("status") == job_queue.JOB_DONE:
+        response["redirect_url"] = url_for(
+            "forms.review_page", form_id=job.get("form_id"), session_id=job_id
+        )
+    response["cancel_url"] = url_for("forms.cancel_job", job_id=job_id)
+    return jsonify(response), 200
+
+
+@forms_bp.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Verarbeitungs-Job abbrechen; eine laufende Ollama-Generierung wird beendet."""
+    from app.services import job_queue
 
-    return redirect(url_for("forms.review_page", form_id=form_id, session_id=session_id))
+    if not job_queue.get_job(job_id):
+        return jsonify({"error": "Job nicht gefunden"}), 404
+    if not job_queue.cancel_job(job_id):
+        return jsonify({"job_id": job_id, "status": "finished"}), 409
+    return jsonify({"job_id": job_id, "status": "cancelling"}), 202
 
 
 @forms_bp.route("/form/<form_id>/review/<session_id>")
@@ -216,7 +282,7 @@ def review_page(form_id, session_id):
     from app.models.form_schema import FieldStatus
     from app.form_registry import get_form_registry
 
-    session = sessions.get(session_id)
+    session = get_session_store().get(session_id)
     if not session:
         abort(404, "Sitzung nicht gefunden")
 
@@ -256,11 +322,11 @@ def review_page(form_id, session_id):
 @forms_bp.route("/form/<form_id>/generate/<session_id>", methods=["POST"])
 def generate_pdf(form_id, session_id):
     """Ausgefuelltes PDF generieren."""
-    from app.services import pdf_filler
+    from app.services import pdf_filler, tracing
     from app.models.form_schema import FieldStatus, FieldType
     from app.form_registry import get_form_registry
 
-    session = sessions.get(session_id)
+    session = get_session_store().get(session_id)
     if not session:
         abort(404, "Sitzung nicht gefunden")
 
@@ -389,19 +455,26 @@ def generate_pdf(form_id, session_id):
     output_path = settings.OUTPUT_DIR / f"{form_id}_{session_id}.pdf"
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    pdf_filler.fill_pdf(template_path, output_path, fields)
+    with tracing.trace(session_id, "generate_pdf", form_id=form_id):
+        with tracing.span("fill_pdf", template=form_id):
+            pdf_filler.fill_pdf(template_path, output_path, fields)
 
-    # Zusaetzliche stabile Debug-/Ablage-Datei ohne Session-ID
-    # (hilft bei manueller Pruefung im Output-Ordner)
-    try:
-        stable_output_path = settings.OUTPUT_DIR / f"{form_id}_ausgefuellt.pdf"
-        shutil.copy2(output_path, stable_output_path)
-        logger.debug(f"Stabile Output-Datei aktualisiert: {stable_output_path}")
-    except Exception as e:
-        logger.warning(f"Konnte stabile Output-Datei nicht aktualisieren: {e}")
+        # Uebernommene Werte in der Session sichern (erneutes Review zeigt den letzten Stand)
+        with tracing.span("session_store"):
+            get_session_store().put(session_id, session)
 
-    # Handler-Hook: Formular-spezifische Finalisierung (z.B. S0050 aus S0051 generieren)
-    handler.on_finalize(fields_by_name, session_id)
+        # Zusaetzliche stabile Debug-/Ablage-Datei ohne Session-ID
+        # (hilft bei manueller Pruefung im Output-Ordner)
+        try:
+            stable_output_path = settings.OUTPUT_DIR / f"{form_id}_ausgefuellt.pdf"
+            shutil.copy2(output_path, stable_output_path)
+            logger.debug(f"Stabile Output-Datei aktualisiert: {stable_output_path}")
+        except Exception as e:
+            logger.warning(f"Konnte stabile Output-Datei nicht aktualisieren: {e}")
+
+        # Handler-Hook: Formular-spezifische Finalisierung (z.B. S0050 aus S0051 generieren)
+        with tracing.span("on_finalize"):
+            handler.on_finalize(fields_by_name, session_id)
 
     return redirect(url_for("forms.index", form=form_id, session=session_id))
 
@@ -449,6 +522,150 @@ def warmup_ollama():
     return {"status": "skipped"}, 202
 
 
+@forms_bp.route("/api/ollama/status")
+def ollama_status():
+    """Diagnose: geladene Modelle, VRAM/CPU-Aufteilung und Context-Größe (?fresh=1 umgeht den Cache)."""
+    from app.services.ollama_client import get_model_status
+
+    fresh = request.args.get("fresh", "").lower() in ("1", "true", "yes")
+    status = get_model_status(fresh=fresh)
+    return jsonify(status), (503 if "error" in status else 200)
+
+
+@forms_bp.route("/metrics")
+def metrics():
+    """Prometheus-Metriken (Stufen-Latenzen, Ollama-Token-Statistik), summiert über alle Worker."""
+    from app.services.metrics import render
+
+    if not settings.METRICS_ENABLED:
+        abort(404)
+    return render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+# Cookie nach Anmeldung unter /admin/traces/login (enthaelt nicht das Token selbst)
+_TRACE_ADMIN_COOKIE = "kiforms_trace_admin"
+
+
+def _trace_admin_cookie_value() -> str:
+    import hashlib
+    import hmac
+
+    return hmac.new(settings.TRACING_ADMIN_TOKEN.encode("utf-8"), b"trace-admin", hashlib.sha256).hexdigest()
+
+
+def _is_trace_admin() -> bool:
+    """
+    Zugriffsschutz der Trace-Ansichten: Header "Authorization: Bearer <TRACING_ADMIN_TOKEN>"
+    oder Cookie aus /admin/traces/login. Das Token steht nie in der URL (Access-Logs,
+    Browser-Verlauf, Referer). Ohne Token sind die Ansichten abgeschaltet (404).
+    """
+    import hmac
+
+    if not settings.TRACING_ENABLED or not settings.TRACING_ADMIN_TOKEN:
+        abort(404)
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        token = auth_header[len("Bearer "):].strip()
+        return hmac.compare_digest(token.encode("utf-8"), settings.TRACING_ADMIN_TOKEN.encode("utf-8"))
+    cookie = request.cookies.get(_TRACE_ADMIN_COOKIE, "")
+    return hmac.compare_digest(cookie.encode("utf-8"), _trace_admin_cookie_value().encode("utf-8"))
+
+
+@forms_bp.route("/admin/traces/login", methods=["POST"])
+def trace_login():
+    """Admin: Token einmalig per Formular pruefen und als Cookie merken."""
+    import hmac
+
+    if not settings.TRACING_ENABLED or not settings.TRACING_ADMIN_TOKEN:
+        abort(404)
+    token = request.form.get("token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), settings.TRACING_ADMIN_TOKEN.encode("utf-8")):
+        return render_template("trace_login.html", error="Token ungültig"), 403
+    response = redirect(url_for("forms.trace_list"))
+    response.set_cookie(
+        _TRACE_ADMIN_COOKIE,
+        _trace_admin_cookie_value(),
+        httponly=True,
+        samesite="Strict",
+        secure=request.is_secure,
+    )
+    return response
+
+
+@forms_bp.route("/admin/traces")
+def trace_list():
+    """Admin: zuletzt aufgezeichnete Verarbeitungs-Zeitleisten."""
+    from datetime import datetime
+    from app.services.tracing import list_traces
+
+    if not _is_trace_admin():
+        return render_template("trace_login.html", error=None), 401
+    traces = list_traces()
+    for t in traces:
+        t["updated"] = datetime.fromtimestamp(t["updated_at"]).strftime("%d.%m.%Y %H:%M:%S")
+    return render_template("traces.html", traces=traces)
+
+
+@forms_bp.route("/admin/traces/<trace_id>")
+def trace_detail(trace_id):
+    """Admin: Zeitleiste einer Session als Wasserfall (trace_id = tracing.public_id)."""
+    from app.services.tracing import load_public_trace, waterfall_rows
+
+    if not _is_trace_admin():
+        return render_template("trace_login.html", error=None), 401
+    spans = load_public_trace(trace_id)
+    if spans is None:
+        abort(404, "Kein Trace mit dieser ID")
+    rows = waterfall_rows(spans)
+    total = max((r["offset"] + (r["span"]["duration"] or 0) for r in rows), default=0)
+    return render_template("trace.html", trace_id=trace_id, rows=rows, total=total)
+
+
+@forms_bp.route("/api/traces/<trace_id>")
+def trace_export(trace_id):
+    """Trace exportieren (?format=json oder ?format=chrome für chrome://tracing / Perfetto)."""
+    from app.services.tracing import load_public_trace, to_chrome_trace
+
+    if not _is_trace_admin():
+        abort(403)
+    spans = load_public_trace(trace_id)
+    if spans is None:
+        return jsonify({"error": "Kein Trace mit dieser ID"}), 404
+
+    export_format = request.args.get("format", "json")
+    if export_format == "chrome":
+        data = to_chrome_trace(spans)
+    elif export_format == "json":
+        data = {"trace_id": trace_id, "spans": spans}
+    else:
+        return jsonify({"error": f"Unbekanntes Format: {export_format}"}), 400
+
+    response = jsonify(data)
+    if request.args.get("download", "").lower() in ("1", "true", "yes"):
+        response.headers["Content-Disposition"] = f'attachment; filename="trace_{trace_id}_{export_format}.json"'
+    return response
+
+
+@forms_bp.route("/api/icd10/search")
+def icd10_search():
+    """Typeahead-Suche im ICD-10-Katalog (?q=M54 oder ?q=rueckenschm, optional &limit=)."""
+    from app.services.icd10_index import get_icd10_index
+
+    query = request.args.get("q", "").strip()
+    try:
+        limit = min(max(int(request.args.get("limit", 15)), 1), 50)
+    except ValueError:
+        limit = 15
+    if len(query) < 2:
+        return jsonify({"query": query, "results": []})
+
+    try:
+        results = get_icd10_index().search(query, limit)
+    except OSError as e:
+        return jsonify({"query": query, "results": [], "error": f"ICD-10-Katalog nicht verfügbar: {e}"}), 503
+    return jsonify({"query": query, "results": results})
+
+
 # Pfad zur Absender-Daten-Datei
 SENDER_DATA_FILE = settings.FORM_TEMPLATE_DIR / "sender_data.json"
 
@@ -788,11 +1005,11 @@ def generate_s0050_standalone():
     s0050_fields_by_name["AW_Verguetung_BB"].status = FieldStatus.MANUAL
 
     # Session speichern für Review
-    sessions[session_id] = {
+    get_session_store().put(session_id, {
         "form_id": "S0050",
         "fields": s0050_fields,
         "source_text": "",
-    }
+    })
 
     # Zur Review-Seite weiterleiten
     return redirect(url_for("forms.review_page", form_id="S0050", session_id=session_id))
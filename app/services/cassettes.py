@@ -0,0 +1,136 @@
+"""
+Cassettes
+
+Aufzeichnung und Wiedergabe von Ollama-Anfragen fuer Offline-Tests.
+
+Bei LLM_CASSETTE_MODE=record schreibt chat_completion pro Anfrage (= pro
+Extraktions-Pass) eine gzip-komprimierte JSON-Datei mit dem Request-Payload
+und den unveraenderten Stream-Chunks nach LLM_CASSETTE_DIR/<schluessel>.json.gz.
+Bei LLM_CASSETTE_MODE=replay wird die Antwort ausschliesslich aus diesen
+Dateien geliefert; JSON-Reparatur, Pass-Orchestrierung und Postprocessing
+laufen dann ohne Modell in voller Geschwindigkeit.
+
+Der Schluessel ist derselbe wie beim LLM-Antwort-Cache (Modell, Optionen,
+Schema, Prompts). Kassetten enthalten den vollstaendigen Quelltext der
+Dokumente und sind entsprechend zu schuetzen.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+_SUFFIX = ".json.gz"
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+
+class CassetteNotFound(Exception):
+    """Im Replay-Modus existiert keine Aufzeichnung fuer die Anfrage."""
+
+
+def is_recording() -> bool:
+    return settings.LLM_CASSETTE_MODE == MODE_RECORD
+
+
+def is_replaying() -> bool:
+    return settings.LLM_CASSETTE_MODE == MODE_REPLAY
+
+
+def cassette_path(key: str, directory: Optional[Path] = None) -> Path:
+    return Path(directory or settings.LLM_CASSETTE_DIR) / f"{key}{_SUFFIX}"
+
+
+def record(
+    key: str,
+    payload: dict,
+    stop_on_json_complete: bool,
+    chunks: list[dict],
+    response: str,
+    result: str,
+) -> None:
+    """
+    Schreibt eine Kassette (atomar, damit parallele Paesse/Worker keine halben Dateien sehen).
+
+    Args:
+        key: Anfrage-Schluessel (_response_cache_key)
+        payload: Request-Payload an /api/chat
+        stop_on_json_complete: Wurde der Stream nach vollstaendigem JSON beendet?
+        chunks: Empfangene Stream-Chunks in Originalform
+        response: Von chat_completion zurueckgegebener Text
+        result: "complete" oder "early_stop"
+    """
+    cassette = {
+        "version": CASSETTE_VERSION,
+        "recorded_at": time.time(),
+        "request": payload,
+        "stop_on_json_complete": stop_on_json_complete,
+        "result": result,
+        "chunks": chunks,
+        "response": response,
+    }
+    path = cassette_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.debug(f"Kassette aufgezeichnet: {path.name} ({len(chunks)} Chunks)")
+    except OSError as e:
+        logger.warning(f"Kassette {key} konnte nicht geschrieben werden: {e}")
+
+
+def load(key: str, directory: Optional[Path] = None) -> Optional[dict]:
+    """
+    Liest eine Kassette.
+
+    Returns:
+        Kassetten-Dictionary oder None (nicht vorhanden, unlesbar oder andere Version)
+    """
+    path = cassette_path(key, directory)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            cassette = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Kassette {path.name} nicht lesbar: {e}")
+        return None
+    if cassette.get("version") != CASSETTE_VERSION:
+        return None
+    return cassette
+
+
+def iter_cassettes(directory: Optional[Path] = None) -> Iterator[tuple[str, dict]]:
+    """
+    Alle Kassetten eines Verzeichnisses (z.B. fuer Benchmarks von _parse_response).
+
+    Yields:
+        (Schluessel, Kassette), nach Aufnahmezeitpunkt sortiert
+    """
+    base = Path(directory or settings.LLM_CASSETTE_DIR)
+    entries = []
+    for path in base.glob(f"*{_SUFFIX}"):
+        key = path.name[:-len(_SUFFIX)]
+        cassette = load(key, base)
+        if cassette is not None:
+            entries.append((cassette.get("recorded_at", 0), key, cassette))
+    for _, key, cassette in sorted(entries, key=lambda e: (e[0], e[1])):
+        yield key, cassette
+
+
+def streamed_text(cassette: dict) -> str:
+    """Roher Antworttext aus den aufgezeichneten Chunks (vor Kuerzung und strip())."""
+    return "".join((chunk.get("message") or {}).get("content", "") for chunk in cassette.get("chunks", []))
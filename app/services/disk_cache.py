@@ -0,0 +1,131 @@
+"""
+Disk Cache
+
+Einfacher, prozessuebergreifender Datei-Cache fuer teure Zwischenergebnisse
+(z.B. OCR-Texte). Eintraege werden nach Gesamtgroesse per LRU verdraengt und
+koennen optional nach einer TTL verfallen.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Header jeder Cache-Datei: Erstellungszeitpunkt (double, little endian)
+_HEADER = struct.Struct("<d")
+
+
+class DiskCache:
+    """
+    Datei-Cache mit LRU-Verdraengung nach Groesse.
+
+    Jeder Eintrag ist eine Datei <directory>/<key[:2]>/<key>. Die mtime dient als
+    Zeitpunkt des letzten Zugriffs (LRU), der Erstellungszeitpunkt steht im
+    Datei-Header (TTL). Schreibzugriffe sind atomar (tmp-Datei + os.replace),
+    dadurch koennen mehrere Gunicorn-Worker denselben Cache nutzen.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, ttl_seconds: Optional[int] = None):
+        """
+        Args:
+            directory: Cache-Verzeichnis (wird bei Bedarf angelegt)
+            max_bytes: Maximale Gesamtgroesse aller Eintraege
+            ttl_seconds: Optionale Lebensdauer eines Eintrags (None = unbegrenzt)
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._evict_lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Liest einen Eintrag und markiert ihn als zuletzt verwendet.
+
+        Returns:
+            Gespeicherte Bytes oder None (nicht vorhanden / abgelaufen)
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cache-Eintrag {key} nicht lesbar: {e}")
+            return None
+
+        if len(header) != _HEADER.size:
+            self.delete(key)
+            return None
+
+        (created_at,) = _HEADER.unpack(header)
+        if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """Schreibt einen Eintrag und verdraengt bei Bedarf alte Eintraege."""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(time.time()))
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Cache-Eintrag {key} konnte nicht geschrieben werden: {e}")
+            return
+        self._evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        """Entfernt die am laengsten nicht verwendeten Eintraege, bis max_bytes eingehalten ist."""
+        with self._evict_lock:
+            entries = []
+            total = 0
+            for path in self.directory.glob("*/*"):
+                if path.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            logger.info(f"Cache {self.directory.name}: {removed} Eintraege verdraengt (LRU)")
@@ -1,10 +1,17 @@
 import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 from app.models.form_schema import FormField, FieldType, ExtractionResult
 from app.config import settings
-from app.services.ollama_client import chat_completion, unload_all_models
+from app.services import tracing
+from app.services.json_scanner import JsonScanner
+from app.services.metrics import EXTRACTION_PASS_SECONDS, JSON_PARSE_FAILURES, JSON_PARSE_SECONDS, JSON_REPAIRS
+from app.services.ollama_client import chat_completion, ensure_model_resident, GenerationCancelled
+from app.services.rule_extractor import apply_rules
+from app.services.text_retrieval import TextRetriever
 
 logger = logging.getLogger(__name__)
 
@@ -81,9 +88,27 @@ BESONDERHEITEN:
 - Psychische Erkrankungen: Schweregradeinschaetzung"""
 
 
+def _build_document_system_prompt(source_text: str) -> str:
+    """
+    System-Prompt inkl. Quelltext bauen.
+
+    Der Quelltext steht fuer alle Paesse eines Dokuments an derselben Stelle im
+    stabilen Prefix (System-Prompt), die feldspezifischen Anweisungen folgen als
+    User-Prompt. Ollama kann den KV-Cache dieses identischen Prefix ueber die
+    Paesse hinweg wiederverwenden, sodass der Prefill des Quelltexts nur einmal
+    pro Dokument (bzw. pro parallelem Slot) anfaellt.
+    """
+    return f"""{SYSTEM_PROMPT}
+
+Hier ist der Quelltext aus den hochgeladenen medizinischen Dokumenten:
+
+--- QUELLTEXT BEGINN ---
+{source_text}
+--- QUELLTEXT ENDE ---"""
+
+
 def _build_text_fields_prompt(
     fields: list[FormField],
-    source_text: str,
 ) -> str:
     """Prompt fuer Textfeld-Extraktion bauen."""
     field_descriptions = []
@@ -93,13 +118,7 @@ def _build_text_fields_prompt(
 
     fields_block = ",\n".join(field_descriptions)
 
-    return f"""Hier ist der Quelltext aus den hochgeladenen medizinischen Dokumenten:
-
---- QUELLTEXT BEGINN ---
-{source_text}
---- QUELLTEXT ENDE ---
-
-Extrahiere die folgenden Informationen aus dem Quelltext und ordne sie den Formularfeldern zu.
+    return f"""Extrahiere die folgenden Informationen aus dem Quelltext und ordne sie den Formularfeldern zu.
 Fuer jedes Feld, fuer das du eine Information findest, gib den Wert und deine Konfidenz an.
 
 FELDER:
@@ -123,7 +142,6 @@ Lasse Felder, fuer die keine Information im Quelltext gefunden wurde, komplett w
 
 def _build_large_text_fields_prompt(
     fields: list[FormField],
-    source_text: str,
 ) -> str:
     """Prompt für große Textfeld-Extraktion bauen (narrative Abschnitte, ein Feld pro Pass)."""
     field_descriptions = []
@@ -133,13 +151,7 @@ def _build_large_text_fields_prompt(
 
     fields_block = ",\n".join(field_descriptions)
 
-    return f"""Hier ist der Quelltext aus den hochgeladenen medizinischen Dokumenten:
-
---- QUELLTEXT BEGINN ---
-{source_text}
---- QUELLTEXT ENDE ---
-
-WICHTIG: Du extrahierst jetzt AUSSCHLIESSLICH den folgenden narrativen Textabschnitt.
+    return f"""WICHTIG: Du extrahierst jetzt AUSSCHLIESSLICH den folgenden narrativen Textabschnitt.
 Der Text muss in ein PDF-Formularfeld passen - fasse pragnant zusammen.
 
 Extrahiere und fasse zusammen:
@@ -173,7 +185,6 @@ WICHTIG: Antworte mit reinem JSON ohne ```-Markierungen oder zusätzlichen Text.
 
 def _build_checkbox_prompt(
     fields: list[FormField],
-    source_text: str,
 ) -> str:
     """Prompt fuer Checkbox-Extraktion bauen."""
     checkbox_descriptions = []
@@ -183,13 +194,7 @@ def _build_checkbox_prompt(
 
     cb_block = ",\n".join(checkbox_descriptions)
 
-    return f"""Hier ist der Quelltext aus den hochgeladenen medizinischen Dokumenten:
-
---- QUELLTEXT BEGINN ---
-{source_text}
---- QUELLTEXT ENDE ---
-
-Bestimme anhand des Quelltexts, welche der folgenden Checkboxen angekreuzt werden sollen.
+    return f"""Bestimme anhand des Quelltexts, welche der folgenden Checkboxen angekreuzt werden sollen.
 
 CHECKBOXEN:
 {{
@@ -213,7 +218,6 @@ Lasse alle Checkboxen weg, die nicht angekreuzt werden sollen oder bei denen du
 
 def _build_retry_prompt(
     fields: list[FormField],
-    source_text: str,
 ) -> str:
     """Erneuter Prompt fuer im ersten Durchgang nicht gefundene Felder."""
     field_list = "\n".join(f"- {f.field_name}: {f.description}" for f in fields)
@@ -221,10 +225,6 @@ def _build_retry_prompt(
 extrahiert werden. Bitte versuche erneut, diese Informationen zu finden. Suche auch nach \
 indirekten Hinweisen, Synonymen oder aehnlichen Formulierungen.
 
---- QUELLTEXT BEGINN ---
-{source_text}
---- QUELLTEXT ENDE ---
-
 GESUCHTE FELDER:
 {field_list}
 
@@ -242,33 +242,169 @@ Antworte im JSON-Format:
 Gib NUR Felder an, fuer die du tatsaechlich einen Wert im Text gefunden hast."""
 
 
+def _build_response_schema(fields: list[FormField], key: str) -> dict:
+    """
+    JSON-Schema der erwarteten Antwort fuer Ollamas structured output ("format").
+
+    field_name ist auf die Felder des Passes beschraenkt, Checkbox-Werte auf "ja".
+    Dadurch ist die Antwort garantiert mit einem einzigen json.loads() lesbar.
+    """
+    value_schema: dict = {"type": "string"}
+    if fields and all(f.field_type == FieldType.CHECKBOX for f in fields):
+        value_schema = {"type": "string", "enum": ["ja"]}
+    item_schema = {
+        "type": "object",
+        "properties": {
+            "field_name": {"type": "string", "enum": [f.field_name for f in fields]},
+            "value": value_schema,
+            "confidence": {"type": "string", "enum": ["high", "medium", "low"]},
+        },
+        "required": ["field_name", "value", "confidence"],
+    }
+    return {
+        "type": "object",
+        "properties": {key: {"type": "array", "items": item_schema}},
+        "required": [key],
+    }
+
+
+@dataclass
+class _ExtractionPass:
+    """Ein einzelner, unabhaengiger Extraktions-Pass (ein chat_completion-Aufruf)."""
+    label: str
+    prompt: str
+    key: str  # JSON-Schluessel der Antwort ("fields" oder "checkboxes")
+    fields: list[FormField]
+    system_prompt: str | None = None  # Eigener Quelltext-Ausschnitt (Retrieval), sonst gemeinsamer Prefix
+    num_predict: int = 4096
+
+
+def _run_pass(
+    extraction_pass: _ExtractionPass,
+    system_prompt: str,
+    num_ctx: int,
+    model: str | None,
+    cancel_event=None,
+) -> list[ExtractionResult]:
+    """
+    Fuehrt einen Pass aus; Fehler werden geloggt und ergeben eine leere Ergebnisliste.
+    Ein Abbruch (GenerationCancelled) wird dagegen weitergereicht.
+    """
+    # "Pass 2.1 (ANAMNESE)" → "Pass 2.1": Feldnamen nicht als Metrik-Label
+    pass_name = extraction_pass.label.split(" (")[0]
+    try:
+        with EXTRACTION_PASS_SECONDS.time(pass_name=pass_name), tracing.span(pass_name, fields=len(extraction_pass.fields)):
+            response = chat_completion(
+                extraction_pass.system_prompt or system_prompt,
+                extraction_pass.prompt,
+                num_ctx=num_ctx,
+                model=model,
+                num_predict=extraction_pass.num_predict,
+                cancel_event=cancel_event,
+                stop_on_json_complete=True,
+                response_format=(
+                    _build_response_schema(extraction_pass.fields, extraction_pass.key)
+                    if settings.OLLAMA_STRUCTURED_OUTPUT else None
+                ),
+            )
+            logger.debug(f"{extraction_pass.label} Raw-Antwort ({len(response)} Zeichen): {response[:500]}")
+            with JSON_PARSE_SECONDS.time(), tracing.span("parse_response"):
+                results = _parse_response(response, extraction_pass.key)
+            tracing.set_attributes(results=len(results))
+        logger.info(f"{extraction_pass.label}: {len(results)} Felder extrahiert")
+        return results
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"{extraction_pass.label} fehlgeschlagen: {e}")
+        return []
+
+
+def _run_passes(
+    passes: list[_ExtractionPass],
+    system_prompt: str,
+    num_ctx: int,
+    model: str | None,
+    cancel_event=None,
+) -> list[ExtractionResult]:
+    """
+    Fuehrt unabhaengige Paesse aus, bei settings.OLLAMA_PARALLEL_PASSES > 1 nebenlaeufig.
+    Die Ergebnisse werden unabhaengig von der Fertigstellungsreihenfolge
+    deterministisch in Pass-Reihenfolge zusammengefuehrt.
+    """
+    if not passes:
+        return []
+
+    concurrency = min(settings.OLLAMA_PARALLEL_PASSES, len(passes))
+    if concurrency <= 1:
+        pass_results = [_run_pass(p, system_prompt, num_ctx, model, cancel_event) for p in passes]
+    else:
+        logger.info(f"Starte {len(passes)} Paesse mit bis zu {concurrency} parallelen Anfragen")
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="extraction-pass") as executor:
+            # Ergebnisse in Eingabereihenfolge; jeder Pass laeuft im Trace-Kontext des Aufrufers
+            futures = [
+                executor.submit(tracing.in_current_context(_run_pass), p, system_prompt, num_ctx, model, cancel_event)
+                for p in passes
+            ]
+            pass_results = [future.result() for future in futures]
+
+    all_results: list[ExtractionResult] = []
+    for results in pass_results:
+        all_results.extend(results)
+    return all_results
+
+
 def extract_fields(
     fields: list[FormField],
     source_text: str,
+    cancel_event=None,
+    rules: list | None = None,
 ) -> list[ExtractionResult]:
     """
     Multi-Pass-Extraktion:
+      Pass 0: Regel-Extraktion (Regex) streng formatierter Felder, ohne LLM
       Pass 1: Kleine Textfelder + Diagnosen (ohne große Textfelder)
       Pass 2: Große narrative Textfelder (ANAMNESE, FUNKTIONSEINSCHRAENKUNGEN, etc.)
       Pass 3: Checkboxen extrahieren
       Pass 4 (optional): Nicht gefundene kleine Textfelder nochmal versuchen
-    """
-    all_results: list[ExtractionResult] = []
 
-    # VRAM komplett freigeben, bevor neues Modell geladen wird
-    unload_all_models()
+    Pass 1-3 haengen nicht voneinander ab und koennen parallel laufen
+    (settings.OLLAMA_PARALLEL_PASSES); Pass 4 wartet auf deren Ergebnisse.
+
+    cancel_event: Optionales Abbruch-Signal (Objekt mit is_set()). Laufende
+    Generierungen werden abgebrochen und GenerationCancelled ausgeloest.
+    rules: Regeln der Formular-Definition (FormDefinition.rules); per Regel
+    gefuellte Felder werden aus den LLM-Paessen genommen.
+    """
+    # --- Pass 0: Regel-Extraktion ---
+    with tracing.span("Pass 0", rules=len(rules or [])):
+        rule_results = apply_rules(rules, fields, source_text) if rules else []
+    rule_filled = {r.field_name for r in rule_results}
 
     # Textfelder aufteilen: kleine vs. große
-    text_fields = [f for f in fields if f.field_type == FieldType.TEXT and f.extract_from_ai]
+    text_fields = [
+        f for f in fields
+        if f.field_type == FieldType.TEXT and f.extract_from_ai and f.field_name not in rule_filled
+    ]
     small_text_fields = [f for f in text_fields if f.field_name not in LARGE_TEXT_FIELDS]
     large_text_fields = [f for f in text_fields if f.field_name in LARGE_TEXT_FIELDS]
 
     # Größerer Context für Pässe mit vollem Quelltext (passt noch vollständig in VRAM)
     large_ctx = settings.OLLAMA_NUM_CTX_LARGE
 
-    # Bei großen Quelltexten kleineres Modell verwenden (passt vollständig in VRAM → 100% GPU)
+    # Bei großen Quelltexten: pro Pass nur relevante Abschnitte (Retrieval) mit dem
+    # Standard-Modell, sonst kleineres Modell (passt vollständig in VRAM → 100% GPU)
     text_len = len(source_text)
-    if text_len >= settings.LARGE_TEXT_THRESHOLD:
+    retriever = None
+    if text_len >= settings.LARGE_TEXT_THRESHOLD and settings.TEXT_RETRIEVAL_ENABLED:
+        model = None
+        retriever = TextRetriever(source_text, settings.TEXT_RETRIEVAL_CHUNK_CHARS)
+        logger.info(
+            f"Großer Quelltext ({text_len} Zeichen >= {settings.LARGE_TEXT_THRESHOLD}): "
+            f"Retrieval mit max. {settings.TEXT_RETRIEVAL_MAX_CHARS} Zeichen pro Pass, "
+            f"Standard-Modell {settings.OLLAMA_MODEL}"
+        )
+    elif text_len >= settings.LARGE_TEXT_THRESHOLD:
         model = settings.OLLAMA_MODEL_SMALL
         logger.info(
             f"Großer Quelltext ({text_len} Zeichen >= {settings.LARGE_TEXT_THRESHOLD}): "
@@ -278,17 +414,31 @@ def extract_fields(
         model = None  # Standard-Modell aus Settings
         logger.info(f"Quelltext ({text_len} Zeichen): verwende Standard-Modell {settings.OLLAMA_MODEL}")
 
+    model_label = model or settings.OLLAMA_MODEL
+    # Nur bei Modell- oder Context-Wechsel entladen/neu laden; sonst startet der Job heiß
+    with tracing.span("ensure_model_resident", model=model_label, num_ctx=large_ctx):
+        ensure_model_resident(model_label, large_ctx)
+    # Gemeinsamer Prefix (System-Prompt + Quelltext) fuer alle Paesse → KV-Cache-Wiederverwendung
+    system_prompt = _build_document_system_prompt(source_text)
+    passes: list[_ExtractionPass] = []
+
+    def pass_system_prompt(pass_fields: list[FormField], include_document_starts: bool = False) -> str | None:
+        """Bei Retrieval: System-Prompt mit den fuer diese Felder relevanten Abschnitten."""
+        if retriever is None:
+            return None
+        excerpt = retriever.select(pass_fields, settings.TEXT_RETRIEVAL_MAX_CHARS, include_document_starts)
+        return _build_document_system_prompt(excerpt)
+
     # --- Pass 1: Kleine Textfelder (schnelle Extraktion) ---
     if small_text_fields:
-        logger.info(f"Pass 1: Extrahiere {len(small_text_fields)} kleine Textfelder (num_ctx={large_ctx}, model={model or settings.OLLAMA_MODEL})...")
-        prompt = _build_text_fields_prompt(small_text_fields, source_text)
-        try:
-            response = chat_completion(SYSTEM_PROMPT, prompt, num_ctx=large_ctx, model=model)
-            results = _parse_response(response, "fields")
-            all_results.extend(results)
-            logger.info(f"Pass 1: {len(results)} kleine Textfelder extrahiert")
-        except Exception as e:
-            logger.error(f"Pass 1 fehlgeschlagen: {e}")
+        logger.info(f"Pass 1: Extrahiere {len(small_text_fields)} kleine Textfelder (num_ctx={large_ctx}, model={model_label})...")
+        passes.append(_ExtractionPass(
+            label="Pass 1",
+            prompt=_build_text_fields_prompt(small_text_fields),
+            key="fields",
+            fields=small_text_fields,
+            system_prompt=pass_system_prompt(small_text_fields, include_document_starts=True),
+        ))
 
     # --- Pass 2.x: Große Textfelder ---
     # UNTERSUCHUNGSBEFUNDE und MED_TECHN_BEFUNDE werden gemeinsam in einem Call verarbeitet,
@@ -305,30 +455,30 @@ def extract_fields(
         field_names = ", ".join(f.field_name for f in batch)
         logger.info(
             f"Pass 2.{pass_idx} ({field_names}): Extrahiere {len(batch)} Textfeld(er) "
-            f"(num_ctx={large_ctx}, model={model or settings.OLLAMA_MODEL})..."
+            f"(num_ctx={large_ctx}, model={model_label})..."
         )
-        prompt = _build_large_text_fields_prompt(batch, source_text)
-        try:
-            response = chat_completion(SYSTEM_PROMPT, prompt, num_ctx=large_ctx, model=model, num_predict=8192)
-            logger.debug(f"Pass 2.{pass_idx} ({field_names}) Raw-Antwort ({len(response)} Zeichen): {response[:500]}")
-            results = _parse_response(response, "fields")
-            all_results.extend(results)
-            logger.info(f"Pass 2.{pass_idx} ({field_names}): {len(results)} Felder extrahiert")
-        except Exception as e:
-            logger.error(f"Pass 2.{pass_idx} ({field_names}) fehlgeschlagen: {e}")
+        passes.append(_ExtractionPass(
+            label=f"Pass 2.{pass_idx} ({field_names})",
+            prompt=_build_large_text_fields_prompt(batch),
+            key="fields",
+            fields=batch,
+            system_prompt=pass_system_prompt(batch),
+            num_predict=8192,
+        ))
 
     # --- Pass 3: Checkboxen ---
     checkbox_fields = [f for f in fields if f.field_type == FieldType.CHECKBOX and f.extract_from_ai]
     if checkbox_fields:
-        logger.info(f"Pass 3: Extrahiere {len(checkbox_fields)} Checkboxen (num_ctx={large_ctx}, model={model or settings.OLLAMA_MODEL})...")
-        prompt = _build_checkbox_prompt(checkbox_fields, source_text)
-        try:
-            response = chat_completion(SYSTEM_PROMPT, prompt, num_ctx=large_ctx, model=model)
-            results = _parse_response(response, "checkboxes")
-            all_results.extend(results)
-            logger.info(f"Pass 3: {len(results)} Checkboxen extrahiert")
-        except Exception as e:
-            logger.error(f"Pass 3 fehlgeschlagen: {e}")
+        logger.info(f"Pass 3: Extrahiere {len(checkbox_fields)} Checkboxen (num_ctx={large_ctx}, model={model_label})...")
+        passes.append(_ExtractionPass(
+            label="Pass 3",
+            prompt=_build_checkbox_prompt(checkbox_fields),
+            key="checkboxes",
+            fields=checkbox_fields,
+            system_prompt=pass_system_prompt(checkbox_fields),
+        ))
+
+    all_results = _run_passes(passes, system_prompt, large_ctx, model, cancel_event)
 
     # --- Pass 4: Retry für nicht gefundene kleine Textfelder ---
     filled_names = {r.field_name for r in all_results}
@@ -336,17 +486,18 @@ def extract_fields(
 
     if unfilled_small_text and len(unfilled_small_text) < len(small_text_fields):
         logger.info(
-            f"Pass 4: Versuche {len(unfilled_small_text)} nicht gefundene kleine Felder erneut (num_ctx={large_ctx}, model={model or settings.OLLAMA_MODEL})..."
+            f"Pass 4: Versuche {len(unfilled_small_text)} nicht gefundene kleine Felder erneut (num_ctx={large_ctx}, model={model_label})..."
         )
-        prompt = _build_retry_prompt(unfilled_small_text, source_text)
-        try:
-            response = chat_completion(SYSTEM_PROMPT, prompt, num_ctx=large_ctx, model=model)
-            results = _parse_response(response, "fields")
-            all_results.extend(results)
-            logger.info(f"Pass 4: {len(results)} zusaetzliche Felder extrahiert")
-        except Exception as e:
-            logger.error(f"Pass 4 fehlgeschlagen: {e}")
+        retry_pass = _ExtractionPass(
+            label="Pass 4",
+            prompt=_build_retry_prompt(unfilled_small_text),
+            key="fields",
+            fields=unfilled_small_text,
+            system_prompt=pass_system_prompt(unfilled_small_text, include_document_starts=True),
+        )
+        all_results.extend(_run_pass(retry_pass, system_prompt, large_ctx, model, cancel_event))
 
+    all_results = rule_results + all_results
     logger.info(f"Extraktion abgeschlossen: {len(all_results)} Felder insgesamt")
     return all_results
 
@@ -412,45 +563,39 @@ def _close_truncated_json(json_str: str) -> str:
     - Escaped literal Steuerzeichen (\\n, \\r, \\t ...) innerhalb von Strings
     - Schliesst nicht-terminierten String am Ende (fehlendes Anführungszeichen)
     - Schliesst offene { } und [ ] Strukturen am Ende
+    - Verwirft Text vor der ersten "{" und nach dem Ende des obersten Objekts
 
     Hintergrund: LLMs geben bei langen Werten manchmal JSON aus, dessen
     String-Wert nicht mit " abgeschlossen wird und dem die schliessenden
     Strukturzeichen fehlen. json.loads() schlägt dann mit 'Unterminated string'
     oder 'Kein JSON gefunden' fehl.
+
+    Anfang und Ende bestimmt derselbe JsonScanner wie der Streaming-Abbruch
+    (stop_on_json_complete). Ohne "{" bleibt der Text unverändert.
     """
+    scanner = JsonScanner()
     result = []
-    in_string = False
-    depth_stack: list[str] = []
-    i = 0
-    while i < len(json_str):
-        char = json_str[i]
-        if char == '"' and (i == 0 or json_str[i - 1] != '\\'):
-            in_string = not in_string
-            result.append(char)
-        elif in_string:
-            if char == '\n':
-                result.append('\\n')
-            elif char == '\r':
-                result.append('\\r')
-            elif char == '\t':
-                result.append('\\t')
-            elif ord(char) < 0x20:
-                result.append(f'\\u{ord(char):04x}')
-            else:
-                result.append(char)
+    for char in json_str:
+        in_string = scanner.step(char)
+        if not scanner.started:
+            continue
+        if in_string and char == '\n':
+            result.append('\\n')
+        elif in_string and char == '\r':
+            result.append('\\r')
+        elif in_string and char == '\t':
+            result.append('\\t')
+        elif in_string and ord(char) < 0x20:
+            result.append(f'\\u{ord(char):04x}')
         else:
-            if char == '{':
-                depth_stack.append('}')
-            elif char == '[':
-                depth_stack.append(']')
-            elif char in ('}', ']'):
-                if depth_stack and depth_stack[-1] == char:
-                    depth_stack.pop()
             result.append(char)
-        i += 1
-    if in_string:
+        if scanner.complete:
+            break
+    if not scanner.started:
+        return json_str
+    if scanner.in_string:
         result.append('"')
-    for closer in reversed(depth_stack):
+    for closer in reversed(scanner.stack):
         result.append(closer)
     return ''.join(result)
 
@@ -521,6 +666,14 @@ def _parse_response(raw: str, key: str) -> list[ExtractionResult]:
     """JSON-Antwort von Ollama parsen, mit Fallback-Logik."""
     cleaned = raw.strip()
 
+    # Schneller Pfad: structured output liefert gueltiges JSON, Reparatur unnoetig
+    try:
+        data = json.loads(cleaned)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, dict):
+        return _results_from_data(data, key)
+
     # Zuerst versuchen, Code-Blöcke zu extrahieren (auch wenn sie nicht am Anfang stehen)
     code_block_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", cleaned, re.DOTALL)
     if code_block_match:
@@ -539,6 +692,7 @@ def _parse_response(raw: str, key: str) -> list[ExtractionResult]:
     data = None
     try:
         data = json.loads(cleaned)
+        JSON_REPAIRS.inc()
     except json.JSONDecodeError as e:
         logger.warning(f"Erster JSON-Parse-Versuch fehlgeschlagen, versuche Extraktion...")
         # Versuche, JSON aus der Antwort zu extrahieren (entfernt Preamble-Text)
@@ -549,6 +703,7 @@ def _parse_response(raw: str, key: str) -> list[ExtractionResult]:
             extracted = _repair_json(extracted)
             try:
                 data = json.loads(extracted)
+                JSON_REPAIRS.inc()
                 logger.info("JSON erfolgreich nach Extraktion und Reparatur geparst")
             except json.JSONDecodeError as e2:
                 # Letzter Versuch: abgeschnittenes JSON reparieren
@@ -556,9 +711,11 @@ def _parse_response(raw: str, key: str) -> list[ExtractionResult]:
                 if repaired:
                     try:
                         data = json.loads(repaired)
+                        JSON_REPAIRS.inc()
                     except json.JSONDecodeError:
                         pass
                 if data is None:
+                    JSON_PARSE_FAILURES.inc()
                     logger.error(f"JSON-Parsing fehlgeschlagen bei Position {e2.pos}: {e2.msg}")
                     logger.error(f"Kontext um Fehlerposition: ...{extracted[max(0, e2.pos-100):e2.pos+100]}...")
                     logger.error(f"Vollständige Antwort ({len(raw)} Zeichen): {raw}")
@@ -569,15 +726,22 @@ def _parse_response(raw: str, key: str) -> list[ExtractionResult]:
             if repaired:
                 try:
                     data = json.loads(repaired)
+                    JSON_REPAIRS.inc()
                 except json.JSONDecodeError:
                     pass
             if data is None:
+                JSON_PARSE_FAILURES.inc()
                 logger.error(f"Kein JSON in Ollama-Antwort gefunden: {raw}")
                 return []
 
     if data is None:
         return []
 
+    return _results_from_data(data, key)
+
+
+def _results_from_data(data: dict, key: str) -> list[ExtractionResult]:
+    """ExtractionResults aus dem geparsten Antwort-Objekt erzeugen."""
     results = []
     for item in data.get(key, []):
         if "field_name" in item and "value" in item:
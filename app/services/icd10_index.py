@@ -0,0 +1,243 @@
+"""
+ICD-10 Index
+
+In-Memory-Index ueber den ICD-10-GM-Katalog (data/icd10_codes_2025.json) zur
+Validierung und Normalisierung von KI-extrahierten Diagnoseschluesseln sowie
+fuer Code- und Volltextsuche.
+
+Aufbau (einmal pro Prozess geladen):
+- sortiertes Code-Array + Dictionary Code → Position (exakte Pruefung)
+- Praefix-Suche ueber das sortierte Array kompakter Codes (ohne Punkt); ein
+  Praefix entspricht dort einem zusammenhaengenden Bereich (bisect)
+- invertierter Index Token → Positionen ueber die Krankheitsbezeichnungen,
+  plus sortiertes Vokabular fuer die Praefix-Suche auf Wortanfaengen
+- vorberechnete, normalisierte Bezeichnungen (casefold, Umlaute → ae/oe/ue/ss)
+  fuer Ranking und Teilwortsuche in Komposita ("schmerz" → "Rueckenschmerzen")
+"""
+
+import json
+import logging
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_CODE_QUERY_RE = re.compile(r"^[A-Z]\d")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# ICD-Code mit optionalem Zusatzkennzeichen (G/V/Z/A = Diagnosesicherheit, R/L/B = Seite)
+_CODE_RE = re.compile(r"^([A-Z])\s*(\d{2})(?:\s*[.,]?\s*(\d{1,2}))?\s*[!*+†#]?\s*([GVZARLB])?$")
+
+
+def normalize_text(text: str) -> str:
+    """Kleinschreibung, Umlaute als ae/oe/ue/ss, sonstige Akzente entfernen."""
+    text = text.casefold()
+    text = text.replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def _compact(code: str) -> str:
+    return code.replace(".", "")
+
+
+def is_formatting_change(raw: str, normalized: str) -> bool:
+    """
+    Unterscheidet sich der normalisierte Code vom Rohwert nur in der Schreibweise
+    (Gross-/Kleinschreibung, Punkt/Komma, Leerzeichen, Kreuz-Stern-Symbole)?
+    False bedeutet: der Code wurde inhaltlich geaendert (z.B. auf die
+    uebergeordnete Ebene gekuerzt).
+    """
+    return re.sub(r"[\s.,!*+†#]", "", raw.upper()) == re.sub(r"[\s.]", "", normalized)
+
+
+class ICD10Index:
+    """
+    Kompakter Suchindex ueber ICD-10-Codes und Bezeichnungen.
+    """
+
+    def __init__(self, entries: List[dict]):
+        """
+        Args:
+            entries: Liste von {"Code": ..., "Krankheit": ...} (Reihenfolge beliebig)
+        """
+        pairs = sorted(
+            {(e["Code"].strip().upper(), e["Krankheit"].strip()) for e in entries if _CODE_QUERY_RE.match(e.get("Code", ""))}
+        )
+        self.codes: List[str] = [code for code, _ in pairs]
+        self.labels: List[str] = [label for _, label in pairs]
+        self._position: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        # Sortierung der kompakten Codes entspricht der der Codes (Punkt steht immer an Position 3)
+        self._compact_codes: List[str] = [_compact(code) for code in self.codes]
+        self._label_keys: List[str] = [normalize_text(label) for label in self.labels]
+        # Alle Bezeichnungen als ein String fuer die Teilwortsuche per str.find (C-Geschwindigkeit)
+        self._label_blob = "\n".join(self._label_keys)
+        self._label_offsets = array("I")
+        offset = 0
+        for key in self._label_keys:
+            self._label_offsets.append(offset)
+            offset += len(key) + 1
+
+        postings: Dict[str, List[int]] = {}
+        for i, label in enumerate(self.labels):
+            for token in set(_tokenize(label)):
+                postings.setdefault(token, []).append(i)
+        self._postings: Dict[str, array] = {t: array("I", p) for t, p in postings.items()}
+        self._vocabulary: List[str] = sorted(self._postings)
+
+        logger.info(f"ICD-10-Index: {len(self.codes)} Codes, {len(self._vocabulary)} Begriffe")
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._position
+
+    def label(self, code: str) -> Optional[str]:
+        """Bezeichnung zu einem gueltigen Code (None, falls unbekannt)."""
+        pos = self._position.get(code)
+        return self.labels[pos] if pos is not None else None
+
+    def normalize_code(self, raw: str) -> Optional[str]:
+        """
+        Normalisiert einen (KI-extrahierten) Code und prueft ihn gegen den Katalog.
+
+        Beispiele: "m54,5" → "M54.5", "M545 G" → "M54.5 G", "F32.1!" → "F32.1".
+        Ist die Subkategorie unbekannt, wird auf die naechsthoehere gueltige
+        Ebene gekuerzt ("M54.59" → "M54.5" bzw. "M54").
+
+        Returns:
+            Gueltiger Code (ggf. mit Zusatzkennzeichen) oder None
+        """
+        match = _CODE_RE.match(raw.strip().upper())
+        if not match:
+            return None
+        letter, category, sub, marker = match.groups()
+        base = f"{letter}{category}"
+        candidates = [f"{base}.{sub}", f"{base}.{sub[:1]}"] if sub else []
+        candidates.append(base)
+        for code in candidates:
+            if code in self._position:
+                return f"{code} {marker}" if marker else code
+        return None
+
+    def search_code_prefix(self, prefix: str, limit: int = 20) -> List[int]:
+        """Positionen aller Codes mit dem Praefix (Punkt optional), in Code-Reihenfolge."""
+        key = _compact(prefix.strip().upper())
+        if not key:
+            return []
+        start = bisect_left(self._compact_codes, key)
+        result = []
+        for i in range(start, len(self._compact_codes)):
+            if not self._compact_codes[i].startswith(key) or len(result) >= limit:
+                break
+            result.append(i)
+        return result
+
+    def _token_matches(self, token: str, prefix: bool) -> set:
+        """Positionen aller Eintraege mit dem Token (bzw. einem Wort, das damit beginnt)."""
+        if not prefix:
+            return set(self._postings.get(token, ()))
+        matches: set = set()
+        start = bisect_left(self._vocabulary, token)
+        for i in range(start, len(self._vocabulary)):
+            word = self._vocabulary[i]
+            if not word.startswith(token):
+                break
+            matches.update(self._postings[word])
+        return matches
+
+    def _rank(self, positions, normalized_query: str) -> List[int]:
+        """Bezeichnung beginnt mit der Anfrage, dann kuerzere Bezeichnung, dann Code-Reihenfolge."""
+        return sorted(
+            positions,
+            key=lambda i: (not self._label_keys[i].startswith(normalized_query), len(self.labels[i]), i),
+        )
+
+    def search_text(self, query: str, limit: int = 20) -> List[int]:
+        """
+        Volltextsuche: zuerst Eintraege, in denen alle Suchbegriffe als Wortanfang
+        vorkommen (invertierter Index); reicht das nicht fuer `limit` Treffer,
+        folgen Eintraege, die alle Suchbegriffe als Teilwort enthalten.
+        """
+        tokens = _tokenize(query)
+        if not tokens:
+            return []
+        normalized_query = normalize_text(query.strip())
+
+        hits: Optional[set] = None
+        for token in sorted(tokens, key=len, reverse=True):
+            matches = self._token_matches(token, prefix=True)
+            hits = matches if hits is None else hits & matches
+            if not hits:
+                break
+        ranked = self._rank(hits, normalized_query)[:limit]
+        if len(ranked) >= limit:
+            return ranked
+
+        found = set(ranked)
+        return ranked + self._rank(self._substring_matches(tokens, found), normalized_query)[:limit - len(ranked)]
+
+    def _substring_matches(self, tokens: List[str], exclude: set) -> List[int]:
+        """Positionen aller Eintraege, deren Bezeichnung alle Tokens als Teilwort enthaelt."""
+        longest = max(tokens, key=len)
+        others = [t for t in tokens if t is not longest]
+        result = []
+        pos = self._label_blob.find(longest)
+        while pos != -1:
+            i = bisect_right(self._label_offsets, pos) - 1
+            if i not in exclude and all(t in self._label_keys[i] for t in others):
+                result.append(i)
+            # Weiter ab der naechsten Bezeichnung
+            next_start = self._label_offsets[i + 1] if i + 1 < len(self._label_offsets) else len(self._label_blob)
+            pos = self._label_blob.find(longest, next_start)
+        return result
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """
+        Kombinierte Suche: Code-Praefix ("M54", "m54.") oder Volltext ("rueckenschm").
+
+        Returns:
+            Liste von {"code", "label"}
+        """
+        query = query.strip()
+        if _CODE_QUERY_RE.match(query.upper()):
+            positions = self.search_code_prefix(query, limit)
+        else:
+            positions = self.search_text(query, limit)
+        return [{"code": self.codes[i], "label": self.labels[i]} for i in positions]
+
+
+# Singleton-Instanz
+_index_instance: Optional[ICD10Index] = None
+_index_lock = threading.Lock()
+
+
+def get_icd10_index(path: Optional[Path] = None) -> ICD10Index:
+    """
+    Liefert den globalen ICD-10-Index (lazy, Singleton).
+
+    Args:
+        path: Optionaler Pfad zur JSON-Datei (Standard: settings.ICD10_DATA_PATH)
+
+    Returns:
+        ICD10Index-Instanz
+    """
+    global _index_instance
+
+    with _index_lock:
+        if _index_instance is None:
+            data_path = Path(path or settings.ICD10_DATA_PATH)
+            with open(data_path, "r", encoding="utf-8") as f:
+                _index_instance = ICD10Index(json.load(f))
+        return _index_instance
@@ -0,0 +1,332 @@
+"""
+Job Queue
+
+Hintergrund-Verarbeitung fuer Uploads: OCR, KI-Extraktion und Postprocessing
+laufen in einem Worker-Pool statt im HTTP-Request. Der Job-Status wird als
+JSON-Datei im Upload-Verzeichnis abgelegt, damit jeder Gunicorn-Worker
+Status-Anfragen beantworten kann. Aenderungen laufen unter einer Datei-Sperre
+pro Job (fcntl.flock), damit Stage-Updates des Job-Threads und ein Abbruch aus
+einem anderen Worker sich nicht gegenseitig ueberschreiben.
+
+Der Prozess, der einen Job ausfuehrt, aktualisiert dessen updated_at
+regelmaessig (Heartbeat). Bleibt das aus (Worker neu gestartet), wird der
+Job nach JOB_STALE_SECONDS als fehlgeschlagen markiert.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows (lokale Entwicklung): nur prozessinterne Sperre
+    fcntl = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+_FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+_JOB_FILENAME = "job.json"
+_LOCK_FILENAME = "job.lock"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Abbruch-Signale der in diesem Prozess laufenden bzw. wartenden Jobs
+_cancel_tokens: dict[str, "CancelToken"] = {}
+_cancel_tokens_lock = threading.Lock()
+
+_heartbeat_thread: Optional[threading.Thread] = None
+_local_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Wird von Verarbeitungsfunktionen ausgeloest, wenn ihr Job abgebrochen wurde."""
+
+
+class CancelToken:
+    """
+    Abbruch-Signal fuer einen Job.
+
+    Verhaelt sich wie threading.Event (set/is_set). Da die Abbruch-Anfrage bei
+    einem anderen Gunicorn-Worker eingehen kann, prueft is_set() zusaetzlich
+    (hoechstens einmal pro poll_interval) das Flag cancel_requested in job.json.
+    """
+
+    def __init__(self, job_id: str, poll_interval: float = 1.0):
+        self.job_id = job_id
+        self.poll_interval = poll_interval
+        self._event = threading.Event()
+        self._last_poll = 0.0
+
+    def set(self) -> None:
+        self._event.set()
+
+    def is_set(self) -> bool:
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._last_poll >= self.poll_interval:
+            self._last_poll = now
+            job = get_job(self.job_id)
+            if job and job.get("cancel_requested"):
+                self._event.set()
+        return self._event.is_set()
+
+    def raise_if_set(self) -> None:
+        """Loest JobCancelled aus, falls der Abbruch angefordert wurde."""
+        if self.is_set():
+            raise JobCancelled(self.job_id)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Liefert den prozessweiten Worker-Pool (lazy, Singleton)."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.JOB_WORKERS),
+                thread_name_prefix="ki-forms-job",
+            )
+        return _executor
+
+
+def _job_path(job_id: str) -> Path:
+    return settings.UPLOAD_DIR / job_id / _JOB_FILENAME
+
+
+@contextmanager
+def _job_lock(job_id: str) -> Iterator[None]:
+    """Exklusive Sperre fuer Lese-Aendern-Schreiben eines Jobs (prozessuebergreifend)."""
+    lock_path = settings.UPLOAD_DIR / job_id / _LOCK_FILENAME
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_job(job: dict) -> None:
+    """Job-Status atomar schreiben (tmp-Datei pro Prozess/Thread + os.replace)."""
+    path = _job_path(job["job_id"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_job(job_id: str) -> Optional[dict]:
+    path = _job_path(job_id)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Job-Status {job_id} nicht lesbar: {e}")
+        return None
+
+
+def _is_stale(job: dict) -> bool:
+    """Unbeendeter Job ohne Heartbeat seit JOB_STALE_SECONDS (Worker neu gestartet)?"""
+    if job.get("status") in _FINISHED_STATES:
+        return False
+    return time.time() - job.get("updated_at", 0) > settings.JOB_STALE_SECONDS
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Liest den aktuellen Status eines Jobs.
+
+    Verwaiste Jobs (kein Heartbeat seit JOB_STALE_SECONDS) werden dabei als
+    fehlgeschlagen markiert, damit die Oberflaeche nicht endlos wartet.
+
+    Args:
+        job_id: Die Job-ID (= Session-ID)
+
+    Returns:
+        Job-Dictionary oder None, falls unbekannt
+    """
+    job = _read_job(job_id)
+    if job is None or not _is_stale(job):
+        return job
+    with _job_lock(job_id):
+        job = _read_job(job_id)
+        if job is None or not _is_stale(job):
+            return job
+        logger.warning(f"Job {job_id} ohne Heartbeat seit {settings.JOB_STALE_SECONDS}s, als fehlgeschlagen markiert")
+        now = time.time()
+        job.update(
+            status=JOB_FAILED,
+            stage=None,
+            error="Verarbeitung unterbrochen (Server-Prozess neu gestartet)",
+            finished_at=now,
+            updated_at=now,
+        )
+        _write_job(job)
+    return job
+
+
+def update_job(job_id: str, **changes) -> None:
+    """
+    Aktualisiert einzelne Attribute eines Jobs (z.B. status, stage, error).
+
+    Ohne changes wird nur updated_at gesetzt (Heartbeat).
+
+    Args:
+        job_id: Die Job-ID
+        **changes: Zu setzende Attribute
+    """
+    with _job_lock(job_id):
+        job = _read_job(job_id) or {"job_id": job_id}
+        job.update(changes)
+        job["updated_at"] = time.time()
+        _write_job(job)
+
+
+def _heartbeat_loop() -> None:
+    """Haelt updated_at aller Jobs dieses Prozesses (wartend oder laufend) aktuell."""
+    interval = max(1.0, settings.JOB_STALE_SECONDS / 4)
+    while True:
+        time.sleep(interval)
+        with _cancel_tokens_lock:
+            job_ids = list(_cancel_tokens)
+        for job_id in job_ids:
+            try:
+                update_job(job_id)
+            except OSError as e:
+                logger.warning(f"Heartbeat fuer Job {job_id} fehlgeschlagen: {e}")
+
+
+def _ensure_heartbeat() -> None:
+    global _heartbeat_thread
+
+    with _executor_lock:
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="ki-forms-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def get_cancel_token(job_id: str) -> CancelToken:
+    """
+    Liefert das Abbruch-Signal eines Jobs (fuer die Verarbeitungsfunktion).
+
+    Args:
+        job_id: Die Job-ID
+
+    Returns:
+        CancelToken des Jobs
+    """
+    with _cancel_tokens_lock:
+        token = _cancel_tokens.get(job_id)
+        if token is None:
+            token = _cancel_tokens[job_id] = CancelToken(job_id)
+        return token
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    Fordert den Abbruch eines wartenden oder laufenden Jobs an.
+
+    Args:
+        job_id: Die Job-ID
+
+    Returns:
+        False, falls der Job unbekannt oder bereits beendet ist
+    """
+    with _job_lock(job_id):
+        job = _read_job(job_id)
+        if not job or job.get("status") in _FINISHED_STATES:
+            return False
+        job["cancel_requested"] = True
+        job["updated_at"] = time.time()
+        _write_job(job)
+    with _cancel_tokens_lock:
+        token = _cancel_tokens.get(job_id)
+    if token is not None:
+        token.set()
+    logger.info(f"Abbruch fuer Job {job_id} angefordert")
+    return True
+
+
+def submit_job(job_id: str, form_id: str, func: Callable, *args) -> dict:
+    """
+    Legt einen Job an und reiht ihn in den Worker-Pool ein.
+
+    Die Funktion wird als func(job_id, *args) ausgefuehrt. Ausnahmen werden
+    abgefangen und als Status "failed" mit Fehlermeldung gespeichert. Wurde der
+    Job per cancel_job() abgebrochen, endet er mit Status "cancelled"; die
+    Funktion sollte dazu get_cancel_token(job_id) pruefen (z.B. raise_if_set()).
+
+    Args:
+        job_id: Die Job-ID (= Session-ID)
+        form_id: Formular-ID, fuer die der Job laeuft
+        func: Auszufuehrende Verarbeitungsfunktion
+        *args: Weitere Argumente fuer func
+
+    Returns:
+        Das angelegte Job-Dictionary
+    """
+    now = time.time()
+    job = {
+        "job_id": job_id,
+        "form_id": form_id,
+        "status": JOB_QUEUED,
+        "stage": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    with _job_lock(job_id):
+        _write_job(job)
+    token = get_cancel_token(job_id)
+    _ensure_heartbeat()
+
+    def _run():
+        try:
+            if token.is_set():
+                update_job(job_id, status=JOB_CANCELLED, finished_at=time.time())
+                logger.info(f"Job {job_id} vor dem Start abgebrochen")
+                return
+            update_job(job_id, status=JOB_RUNNING, started_at=time.time())
+            try:
+                func(job_id, *args)
+            except Exception as e:
+                if token.is_set():
+                    update_job(job_id, status=JOB_CANCELLED, stage=None, finished_at=time.time())
+                    logger.info(f"Job {job_id} abgebrochen")
+                    return
+                logger.exception(f"Job {job_id} fehlgeschlagen")
+                update_job(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+                return
+            update_job(job_id, status=JOB_DONE, stage=None, finished_at=time.time())
+            logger.info(f"Job {job_id} abgeschlossen ({time.time() - now:.1f}s)")
+        finally:
+            with _cancel_tokens_lock:
+                _cancel_tokens.pop(job_id, None)
+
+    _get_executor().submit(_run)
+    logger.info(f"Job {job_id} fuer {form_id} eingereiht")
+    return job
@@ -0,0 +1,101 @@
+"""
+JSON Scanner
+
+Zustandsautomat ueber (moeglicherweise unvollstaendiges) LLM-JSON: Strings und
+Escapes, //- und /* */-Kommentare sowie der Stapel offener Klammern.
+
+Gemeinsame Grundlage fuer den Streaming-Abbruch (ollama_client.chat_completion)
+und die JSON-Reparatur (field_extractor._close_truncated_json), damit beide
+dasselbe Ende des obersten JSON-Objekts erkennen.
+"""
+
+from typing import List
+
+
+class JsonScanner:
+    """
+    Zeichenweiser Scanner fuer das oberste JSON-Objekt einer LLM-Antwort.
+
+    Text vor der ersten "{" (Preamble, Code-Fence) wird uebersprungen. Klammern
+    innerhalb von Strings und Kommentaren zaehlen nicht; eine schliessende
+    Klammer, die nicht zur zuletzt geoeffneten passt, wird ignoriert. Nach dem
+    Schliessen des obersten Objekts aendert sich der Zustand nicht mehr.
+
+    Attributes:
+        started: Die erste "{" wurde gelesen
+        complete: Das oberste Objekt ist geschlossen
+        in_string: Der Scanner steht innerhalb eines Strings
+        stack: Erwartete schliessende Klammern der offenen Strukturen (innerste zuletzt)
+    """
+
+    def __init__(self):
+        self.started = False
+        self.complete = False
+        self.in_string = False
+        self.stack: List[str] = []
+        self._escape = False
+        self._line_comment = False
+        self._block_comment = False
+        self._prev = ""
+
+    def step(self, char: str) -> bool:
+        """
+        Verarbeitet ein Zeichen.
+
+        Returns:
+            True, wenn das Zeichen String-Inhalt ist (ohne die begrenzenden Anfuehrungszeichen)
+        """
+        prev, self._prev = self._prev, char
+        if self.complete:
+            return False
+        if self.in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self.in_string = False
+                return False
+            return True
+        if self._line_comment:
+            if char == "\n":
+                self._line_comment = False
+        elif self._block_comment:
+            if prev == "*" and char == "/":
+                self._block_comment = False
+                self._prev = ""
+        elif not self.started:
+            if char == "{":
+                self.started = True
+                self.stack.append("}")
+        elif char == '"':
+            self.in_string = True
+        elif prev == "/" and char == "/":
+            self._line_comment = True
+        elif prev == "/" and char == "*":
+            self._block_comment = True
+            self._prev = ""
+        elif char == "{":
+            self.stack.append("}")
+        elif char == "[":
+            self.stack.append("]")
+        elif char in "}]" and self.stack and self.stack[-1] == char:
+            self.stack.pop()
+            self.complete = not self.stack
+        return False
+
+    def feed(self, text: str) -> int:
+        """
+        Verarbeitet den naechsten Chunk.
+
+        Returns:
+            Index direkt hinter der schliessenden Klammer des obersten Objekts,
+            falls es in diesem Chunk geschlossen wurde, sonst -1
+        """
+        if self.complete:
+            return -1
+        for i, char in enumerate(text):
+            self.step(char)
+            if self.complete:
+                return i + 1
+        return -1
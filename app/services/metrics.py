@@ -0,0 +1,365 @@
+"""
+Metrics
+
+Schlanke Prometheus-kompatible Metriken (Counter, Histogramme) fuer
+Kapazitaetsplanung: Dauer von OCR, Textextraktion, Extraktions-Paessen,
+JSON-Parsing, PDF-Ausfuellung sowie Token-Statistiken von Ollama.
+
+Gunicorn startet mehrere Worker-Prozesse, ein Scrape landet aber nur bei
+einem davon. Jeder Prozess schreibt daher seinen Stand regelmaessig als
+Snapshot nach METRICS_DIR/<pid>.json; /metrics summiert alle Snapshots.
+Nur Prozesse, die tatsaechlich etwas gemessen haben, schreiben einen Snapshot
+(OCR-Worker-Prozesse z.B. nie). Snapshots beendeter Prozesse werden beim
+Scrape in METRICS_DIR/retired.json aufsummiert und geloescht, damit Counter
+monoton bleiben, ohne dass sich Dateien ansammeln (das Verzeichnis liegt
+standardmaessig im nicht-persistenten /tmp).
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows (lokale Entwicklung): nur prozessinterne Sperre
+    fcntl = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Abstand zwischen zwei Snapshot-Schreibvorgaengen eines Prozesses (Sekunden)
+_FLUSH_INTERVAL = 5.0
+
+# Bucket-Grenzen in Sekunden
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_registry: Dict[str, "_Metric"] = {}
+_lock = threading.Lock()
+_dirty = False
+# PID, fuer die der Flush-Thread laeuft (nach fork neu starten)
+_flush_pid: Optional[int] = None
+_exit_hook_registered = False
+
+# Summierte Snapshots beendeter Prozesse
+_RETIRED_FILENAME = "retired.json"
+_LOCK_FILENAME = ".lock"
+_local_lock = threading.Lock()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, object] = {}
+        with _lock:
+            _registry[name] = self
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: Labels {sorted(labels)} statt {list(self.labelnames)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Monoton steigender Zaehler."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        _mark_dirty()
+
+
+class Histogram(_Metric):
+    """Verteilung von Messwerten (kumulative Buckets, Summe, Anzahl)."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with _lock:
+            # [Anzahl je Bucket (nicht kumulativ) ..., +Inf, Summe]
+            state = self._values.get(key)
+            if state is None:
+                state = [0] * (len(self.buckets) + 1) + [0.0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+        _mark_dirty()
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Misst die Dauer des with-Blocks (auch bei Exceptions)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+# ===================================================================
+# Snapshots (prozessuebergreifend)
+# ===================================================================
+
+def _mark_dirty() -> None:
+    global _dirty, _flush_pid, _exit_hook_registered
+    _dirty = True
+    if _flush_pid != os.getpid():
+        with _lock:
+            if _flush_pid != os.getpid():
+                _flush_pid = os.getpid()
+                threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+                # Erst mit dem ersten Messwert: Prozesse ohne Messungen hinterlassen keinen Snapshot
+                if not _exit_hook_registered:
+                    _exit_hook_registered = True
+                    atexit.register(flush)
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(_FLUSH_INTERVAL)
+        if _dirty:
+            flush()
+
+
+def _to_snapshot(values_by_name: Dict[str, Dict[LabelKey, object]]) -> dict:
+    return {
+        name: [[list(map(list, key)), value if isinstance(value, float) else list(value)]
+               for key, value in values.items()]
+        for name, values in values_by_name.items()
+    }
+
+
+def _snapshot() -> dict:
+    with _lock:
+        return _to_snapshot({name: metric._values for name, metric in _registry.items()})
+
+
+def _write_atomic(path, snapshot: dict) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def flush() -> None:
+    """
+    Schreibt den Stand dieses Prozesses nach METRICS_DIR/<pid>.json (atomar).
+
+    Ohne Messwerte wird nichts geschrieben.
+    """
+    global _dirty
+    if not settings.METRICS_ENABLED:
+        return
+    with _lock:
+        has_values = any(metric._values for metric in _registry.values())
+    if not _dirty and not has_values:
+        return
+    _dirty = False
+    directory = settings.METRICS_DIR
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_atomic(directory / f"{os.getpid()}.json", _snapshot())
+    except OSError as e:
+        logger.warning(f"Metriken konnten nicht geschrieben werden: {e}")
+
+
+@contextmanager
+def _dir_lock() -> Iterator[None]:
+    """Exklusive Sperre auf METRICS_DIR fuer das Zusammenfassen (prozessuebergreifend)."""
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    with open(settings.METRICS_DIR / _LOCK_FILENAME, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # existiert, gehoert aber einem anderen Benutzer
+    return True
+
+
+def _read_snapshot(path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_into(merged: Dict[str, Dict[LabelKey, object]], snapshot: dict) -> None:
+    for name, entries in snapshot.items():
+        values = merged.setdefault(name, {})
+        for raw_key, value in entries:
+            key = tuple(tuple(pair) for pair in raw_key)
+            current = values.get(key)
+            if current is None:
+                values[key] = value
+            elif isinstance(value, list):
+                if len(current) == len(value):
+                    values[key] = [a + b for a, b in zip(current, value)]
+            else:
+                values[key] = current + value
+
+
+def _retire_dead_snapshots() -> None:
+    """Summiert Snapshots beendeter Prozesse in retired.json und loescht sie."""
+    directory = settings.METRICS_DIR
+    dead = [
+        path for path in directory.glob("*.json")
+        if path.stem.isdigit() and not _pid_alive(int(path.stem))
+    ]
+    if not dead:
+        return
+    try:
+        with _dir_lock():
+            retired_path = directory / _RETIRED_FILENAME
+            retired: Dict[str, Dict[LabelKey, object]] = {}
+            _merge_into(retired, _read_snapshot(retired_path) or {})
+            dead = [path for path in dead if path.exists()]  # evtl. schon von einem anderen Worker
+            for path in dead:
+                _merge_into(retired, _read_snapshot(path) or {})
+            if dead:
+                _write_atomic(retired_path, _to_snapshot(retired))
+            for path in dead:
+                path.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Metriken beendeter Prozesse konnten nicht zusammengefasst werden: {e}")
+
+
+def _merged_values() -> Dict[str, Dict[LabelKey, object]]:
+    """Summiert die Snapshots aller Prozesse (inkl. des aktuellen Stands dieses Prozesses)."""
+    flush()
+    merged: Dict[str, Dict[LabelKey, object]] = {}
+    if not settings.METRICS_DIR.is_dir():
+        return merged
+    _retire_dead_snapshots()
+    for path in settings.METRICS_DIR.glob("*.json"):
+        _merge_into(merged, _read_snapshot(path) or {})
+    return merged
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="' + value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    """
+    Alle Metriken im Prometheus-Textformat (Version 0.0.4).
+
+    Returns:
+        Text fuer die /metrics-Antwort
+    """
+    merged = _merged_values()
+    lines = []
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(merged.get(metric.name, {}).items()):
+            if metric.kind == "counter":
+                lines.append(f"{metric.name}{_format_labels(key)} {_format_number(value)}")
+                continue
+            if len(value) != len(metric.buckets) + 2:
+                continue  # Snapshot mit anderen Bucket-Grenzen (alte Version)
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                lines.append(f"{metric.name}_bucket{_format_labels(key, ('le', _format_number(bound)))} {cumulative}")
+            cumulative += value[len(metric.buckets)]
+            lines.append(f"{metric.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_number(value[-1])}")
+            lines.append(f"{metric.name}_count{_format_labels(key)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ===================================================================
+# Metriken der Anwendung
+# ===================================================================
+
+OCR_PAGE_SECONDS = Histogram(
+    "kiforms_ocr_page_seconds", "Rendern und OCR einer Seite", buckets=LATENCY_BUCKETS,
+)
+TEXT_EXTRACTION_SECONDS = Histogram(
+    "kiforms_text_extraction_seconds", "Textextraktion pro PDF-Dokument", ["method"],
+)
+EXTRACTION_PASS_SECONDS = Histogram(
+    "kiforms_extraction_pass_seconds", "Dauer eines Extraktions-Passes (inkl. Parsing)", ["pass_name"],
+)
+JSON_PARSE_SECONDS = Histogram(
+    "kiforms_json_parse_seconds", "Parsen und ggf. Reparieren einer LLM-Antwort", buckets=FAST_BUCKETS,
+)
+JSON_REPAIRS = Counter("kiforms_json_repairs_total", "LLM-Antworten, die erst nach Reparatur gueltiges JSON waren")
+JSON_PARSE_FAILURES = Counter("kiforms_json_parse_failures_total", "LLM-Antworten ohne verwertbares JSON")
+FILL_PDF_SECONDS = Histogram("kiforms_fill_pdf_seconds", "Ausfuellen und Speichern eines PDF-Formulars", ["template"])
+S0050_GENERATION_SECONDS = Histogram("kiforms_s0050_generation_seconds", "Automatische S0050-Erzeugung aus S0051")
+
+OLLAMA_REQUESTS = Counter(
+    "kiforms_ollama_requests_total",
+    "Chat-Anfragen nach Ergebnis (complete, early_stop, cancelled, error, cache_hit, replay)",
+    ["model", "result"],
+)
+OLLAMA_REQUEST_SECONDS = Histogram("kiforms_ollama_request_seconds", "Dauer einer Chat-Anfrage an Ollama", ["model"])
+OLLAMA_PROMPT_TOKENS = Counter(
+    "kiforms_ollama_prompt_tokens_total", "Ausgewertete Prompt-Tokens (nur vollstaendige Antworten)", ["model"],
+)
+OLLAMA_COMPLETION_TOKENS = Counter(
+    "kiforms_ollama_completion_tokens_total",
+    "Generierte Tokens (bei vorzeitigem Stream-Ende aus der Chunk-Anzahl)",
+    ["model"],
+)
+OLLAMA_PROMPT_EVAL_SECONDS = Counter("kiforms_ollama_prompt_eval_seconds_total", "Prefill-Zeit laut Ollama", ["model"])
+OLLAMA_EVAL_SECONDS = Counter("kiforms_ollama_eval_seconds_total", "Generierungszeit laut Ollama", ["model"])
+OLLAMA_LOAD_SECONDS = Counter("kiforms_ollama_load_seconds_total", "Ladezeit des Modells laut Ollama", ["model"])
+OLLAMA_MODEL_LOADS = Counter("kiforms_ollama_model_loads_total", "(Neu-)Laden eines Modells in den GPU-Speicher", ["model"])
@@ -1,17 +1,246 @@
+import contextlib
+import hashlib
 import json
 import logging
+import socket
+import threading
 import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 
 from app.config import settings
+from app.services import cassettes, tracing
+from app.services.disk_cache import DiskCache
+from app.services.json_scanner import JsonScanner
+from app.services.metrics import (
+    OLLAMA_COMPLETION_TOKENS,
+    OLLAMA_EVAL_SECONDS,
+    OLLAMA_LOAD_SECONDS,
+    OLLAMA_MODEL_LOADS,
+    OLLAMA_PROMPT_EVAL_SECONDS,
+    OLLAMA_PROMPT_TOKENS,
+    OLLAMA_REQUEST_SECONDS,
+    OLLAMA_REQUESTS,
+)
 
 logger = logging.getLogger(__name__)
 
-# Cache für Warmup-Status pro Modell
-_warmed_up_models = set()
+# Version des Antwort-Cache-Formats: erhoehen, wenn sich die Nachbearbeitung der Antwort aendert
+RESPONSE_CACHE_VERSION = 1
+
+_response_cache = DiskCache(
+    settings.CACHE_DIR / "llm",
+    max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=settings.LLM_CACHE_TTL_HOURS * 3600,
+)
+
+
+class GenerationCancelled(Exception):
+    """Die Generierung wurde über das Abbruch-Signal beendet (Job abgebrochen)."""
+
+
+# Aktiver _RequestAbort des Threads, der gerade eine Anfrage sendet
+_abort_scope = threading.local()
+
+
+class _AbortablePoolMixin:
+    """Meldet die fuer eine Anfrage entnommene Verbindung beim _RequestAbort des Threads an."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        scope = getattr(_abort_scope, "current", None)
+        if scope is not None:
+            scope.attach(conn)
+        return conn
+
+
+class _AbortableHTTPConnectionPool(_AbortablePoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _AbortableHTTPSConnectionPool(_AbortablePoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _AbortableHTTPConnectionPool,
+            "https": _AbortableHTTPSConnectionPool,
+        }
+
+
+class _RequestAbort:
+    """
+    Bricht die Ollama-Anfrage des aktuellen Threads ab, sobald das Abbruch-Signal
+    gesetzt ist.
+
+    Waehrend des Prefills sendet Ollama weder Header noch Zeilen; eine Pruefung
+    zwischen den Stream-Zeilen greift dann erst mit dem ersten Token. Ein
+    Watcher-Thread prueft das Signal daher unabhaengig vom Stream und schliesst
+    den Socket der Verbindung. Ollama bemerkt den Verbindungsabbruch, beendet die
+    Auswertung und gibt den Slot frei.
+    """
+
+    def __init__(self, cancel_event, poll_interval: float = 0.25):
+        self.cancel_event = cancel_event
+        self.poll_interval = poll_interval
+        self.aborted = False
+        self._conn = None
+        self._done = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def attach(self, conn) -> None:
+        self._conn = conn
+
+    def __enter__(self) -> "_RequestAbort":
+        _abort_scope.current = self
+        self._thread = threading.Thread(target=self._watch, name="ollama-abort", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        _abort_scope.current = None
+        self._done.set()
+        self._thread.join()
+        return False
+
+    def _watch(self) -> None:
+        while not self._done.wait(self.poll_interval):
+            if not self.aborted and not self.cancel_event.is_set():
+                continue
+            self.aborted = True
+            # Verbindung evtl. noch im Aufbau: dann beim naechsten Durchlauf erneut
+            sock = getattr(self._conn, "sock", None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                return
+
+
+class OllamaHttpClient:
+    """
+    HTTP-Client für die Ollama-API mit gemeinsamem Verbindungspool.
+
+    Alle Anfragen teilen sich eine requests.Session (Keep-Alive), dadurch
+    entfällt der TCP-Verbindungsaufbau pro Pass. Verbindungsfehler (z.B.
+    "connection refused" während Ollama unter Last neu startet) werden mit
+    exponentiellem Backoff wiederholt; bereits gesendete Anfragen nicht, da
+    eine Generierung sonst doppelt laufen könnte.
+    """
+
+    def __init__(self, base_url: str, pool_size: int, retries: int, backoff: float):
+        """
+        Args:
+            base_url: Basis-URL des Ollama-Servers
+            pool_size: Maximale Anzahl offener Verbindungen
+            retries: Anzahl Wiederholungen bei Verbindungsfehlern
+            backoff: Backoff-Faktor in Sekunden (0.5 → 0.5s, 1s, 2s, ...)
+        """
+        self.base_url = base_url.rstrip("/")
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=backoff,
+            allowed_methods=None,  # Verbindungsfehler auch bei POST wiederholen
+            raise_on_status=False,
+        )
+        adapter = _AbortableAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path: str, timeout: float = 5, **kwargs) -> requests.Response:
+        return self.session.get(f"{self.base_url}{path}", timeout=timeout, **kwargs)
+
+    def post(self, path: str, timeout: float = 30, **kwargs) -> requests.Response:
+        return self.session.post(f"{self.base_url}{path}", timeout=timeout, **kwargs)
+
+
+# Singleton-Instanz
+_http_client: OllamaHttpClient | None = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> OllamaHttpClient:
+    """
+    Liefert den prozessweiten Ollama-HTTP-Client (lazy, Singleton).
+
+    Returns:
+        OllamaHttpClient-Instanz
+    """
+    global _http_client
+
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = OllamaHttpClient(
+                settings.OLLAMA_BASE_URL,
+                pool_size=settings.OLLAMA_HTTP_POOL_SIZE,
+                retries=settings.OLLAMA_HTTP_RETRIES,
+                backoff=settings.OLLAMA_HTTP_BACKOFF,
+            )
+        return _http_client
+
+# Residenz-Status der von uns geladenen Modelle: Name → {"num_ctx", "size", "size_vram"}
+_resident_models: dict[str, dict] = {}
+# Serialisiert Laden/Entladen (parallele Pässe und Jobs teilen sich die GPU)
+_residency_lock = threading.RLock()
 # Cache für bereits geloggte GPU-Warnungen (vermeidet Spam)
 _gpu_warning_logged = set()
+# Modelle/Server, die structured output (JSON-Schema in "format") abgelehnt haben
+_format_unsupported_models = set()
+# Kurzzeit-Cache für /api/ps: (Zeitpunkt der Abfrage, Modellliste)
+_ps_cache: tuple[float, list[dict]] | None = None
+_ps_cache_lock = threading.Lock()
+
+
+def _list_loaded_models(fresh: bool = False) -> list[dict]:
+    """
+    Liefert die aktuell von Ollama geladenen Modelle (/api/ps).
+
+    Das Ergebnis wird settings.OLLAMA_PS_CACHE_SECONDS lang zwischengespeichert
+    und bei Lade-/Entlade-Vorgängen invalidiert.
+
+    Args:
+        fresh: Cache umgehen und Ollama direkt abfragen
+    """
+    global _ps_cache
+
+    if not fresh:
+        with _ps_cache_lock:
+            if _ps_cache is not None and time.time() - _ps_cache[0] < settings.OLLAMA_PS_CACHE_SECONDS:
+                return _ps_cache[1]
+
+    resp = get_http_client().get("/api/ps")
+    resp.raise_for_status()
+    models = resp.json().get("models", [])
+    with _ps_cache_lock:
+        _ps_cache = (time.time(), models)
+    return models
+
+
+def _invalidate_model_status() -> None:
+    """Verwirft den /api/ps-Cache (nach Laden oder Entladen eines Modells)."""
+    global _ps_cache
+
+    with _ps_cache_lock:
+        _ps_cache = None
+
+
+def _find_loaded(model_name: str, loaded: list[dict]) -> dict | None:
+    for m in loaded:
+        if model_name in m.get("name", ""):
+            return m
+    return None
 
 
 def is_model_loaded(model_name: str) -> bool:
@@ -20,11 +249,7 @@ def is_model_loaded(model_name: str) -> bool:
     Verwendet den /api/ps Endpoint von Ollama.
     """
     try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/ps", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        loaded_models = [m.get("name", "") for m in data.get("models", [])]
-        return any(model_name in name for name in loaded_models)
+        return _find_loaded(model_name, _list_loaded_models()) is not None
     except Exception as e:
         logger.warning(f"Konnte Modellstatus nicht prüfen: {e}")
         return False
@@ -36,6 +261,7 @@ def unload_model(model_name: str) -> None:
     Verwendet keep_alive=0, damit Ollama das Modell sofort freigibt.
     """
     if not is_model_loaded(model_name):
+        _resident_models.pop(model_name, None)
         return
 
     logger.info(f"Entlade Modell {model_name} aus dem Speicher...")
@@ -44,91 +270,74 @@ def unload_model(model_name: str) -> None:
             "model": model_name,
             "keep_alive": 0,
         }
-        resp = requests.post(
-            f"{settings.OLLAMA_BASE_URL}/api/generate",
-            json=payload,
-            timeout=30,
-        )
+        resp = get_http_client().post("/api/generate", json=payload)
         resp.raise_for_status()
-        _warmed_up_models.discard(model_name)
+        _invalidate_model_status()
+        _resident_models.pop(model_name, None)
         _gpu_warning_logged.discard(model_name)
         logger.info(f"Modell {model_name} entladen")
     except Exception as e:
         logger.error(f"Fehler beim Entladen von {model_name}: {e}")
 
 
+def _wait_until_unloaded(model_names: list[str], max_wait: int = 10) -> None:
+    """Wartet bis Ollama die angegebenen Modelle tatsächlich freigegeben hat (max. max_wait Sekunden)."""
+    for attempt in range(max_wait):
+        time.sleep(1)
+        loaded = _list_loaded_models(fresh=True)
+        remaining = [name for name in model_names if _find_loaded(name, loaded)]
+        if not remaining:
+            logger.info(f"VRAM freigegeben (nach {attempt + 1}s)")
+            return
+        logger.debug(f"Warte auf VRAM-Freigabe... ({len(remaining)} Modell(e) noch geladen)")
+    logger.warning(f"VRAM-Freigabe nach {max_wait}s nicht abgeschlossen, fahre trotzdem fort")
+
+
 def unload_all_models() -> None:
     """
     Entlädt ALLE geladenen Modelle aus dem Speicher (VRAM/RAM komplett freigeben).
-    Wird vor einer neuen Analyse aufgerufen, um sicherzustellen, dass der VRAM
-    nicht durch alte Modell-Instanzen belegt ist.
     Wartet bis Ollama die Modelle tatsächlich entladen hat (max. 10 Sekunden).
-    """
-    global _warmed_up_models, _gpu_warning_logged
 
-    try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/ps", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        models = data.get("models", [])
-        if not models:
-            logger.debug("Keine Modelle im Speicher geladen")
-            return
-        logger.info(f"Entlade {len(models)} Modell(e) aus dem Speicher vor neuer Analyse...")
-        for m in models:
-            name = m.get("name", "")
-            if name:
-                unload_model(name)
-
-        # Warten bis Ollama die Modelle tatsächlich freigegeben hat
-        for attempt in range(10):
-            time.sleep(1)
-            resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/ps", timeout=5)
-            resp.raise_for_status()
-            remaining = resp.json().get("models", [])
-            if not remaining:
-                logger.info(f"VRAM vollständig freigegeben (nach {attempt + 1}s)")
-                break
-            logger.debug(f"Warte auf VRAM-Freigabe... ({len(remaining)} Modell(e) noch geladen)")
-        else:
-            logger.warning("VRAM-Freigabe nach 10s nicht abgeschlossen, fahre trotzdem fort")
-
-    except Exception as e:
-        logger.warning(f"Konnte geladene Modelle nicht entladen: {e}")
-
-    # Warmup-Cache komplett zurücksetzen, damit das Modell frisch geladen wird
-    _warmed_up_models.clear()
-    _gpu_warning_logged.clear()
-
-
-def warmup_model(model_name: str) -> None:
+    Für die normale Verarbeitung nicht nötig – ensure_model_resident() entlädt
+    nur, wenn Modell oder Context-Größe wechseln.
     """
-    Führt ein Warmup für das Modell durch, indem eine minimale Anfrage gesendet wird.
-    Dies lädt das Modell in den Speicher.
-    Entlädt vorher andere Modelle, um VRAM freizugeben.
+    with _residency_lock, tracing.span("unload_all_models"):
+        try:
+            models = [m.get("name", "") for m in _list_loaded_models()]
+            models = [name for name in models if name]
+            if not models:
+                logger.debug("Keine Modelle im Speicher geladen")
+            else:
+                logger.info(f"Entlade {len(models)} Modell(e) aus dem Speicher...")
+                for name in models:
+                    unload_model(name)
+                _wait_until_unloaded(models)
+        except Exception as e:
+            logger.warning(f"Konnte geladene Modelle nicht entladen: {e}")
+
+        _invalidate_model_status()
+        _resident_models.clear()
+        _gpu_warning_logged.clear()
+
+
+def warmup_model(model_name: str, num_ctx: int | None = None) -> bool:
     """
-    if model_name in _warmed_up_models:
-        logger.debug(f"Modell {model_name} wurde bereits aufgewärmt")
-        return
+    Lädt das Modell mit einer minimalen Anfrage in den Speicher.
 
-    if is_model_loaded(model_name):
-        logger.info(f"Modell {model_name} ist bereits im Speicher geladen")
-        _warmed_up_models.add(model_name)
-        return
+    Der Warmup muss mit derselben Context-Größe erfolgen wie die späteren
+    Anfragen, sonst lädt Ollama das Modell bei der ersten echten Anfrage neu.
 
-    # Andere Modelle entladen, um VRAM freizugeben
-    try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/ps", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        for m in data.get("models", []):
-            loaded_name = m.get("name", "")
-            if loaded_name and model_name not in loaded_name:
-                unload_model(loaded_name)
-    except Exception as e:
-        logger.warning(f"Konnte geladene Modelle nicht prüfen: {e}")
+    Args:
+        model_name: Zu ladendes Modell
+        num_ctx: Context-Fenstergröße (None = settings.OLLAMA_NUM_CTX)
 
-    logger.info(f"Starte Warmup für Modell {model_name}...")
+    Returns:
+        True, wenn das Modell geladen wurde (Fehler werden nur geloggt)
+    """
+    effective_ctx = num_ctx if num_ctx is not None else settings.OLLAMA_NUM_CTX
+    loaded_ok = False
+    logger.info(f"Starte Warmup für Modell {model_name} (num_ctx={effective_ctx})...")
+    start = time.time()
     try:
         payload = {
             "model": model_name,
@@ -136,23 +345,126 @@ def warmup_model(model_name: str) -> None:
                 {"role": "user", "content": "Hi"},
             ],
             "stream": False,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
             "options": {
                 "num_predict": 1,
+                "num_ctx": effective_ctx,
+                "num_gpu": -1,
             },
         }
 
-        resp = requests.post(
-            f"{settings.OLLAMA_BASE_URL}/api/chat",
-            json=payload,
-            timeout=60,
-        )
+        resp = get_http_client().post("/api/chat", json=payload, timeout=settings.OLLAMA_TIMEOUT)
         resp.raise_for_status()
-        _warmed_up_models.add(model_name)
-        logger.info(f"Warmup für Modell {model_name} abgeschlossen")
+        OLLAMA_LOAD_SECONDS.inc(resp.json().get("load_duration", 0) / 1e9, model=model_name)
+        logger.info(f"Warmup für Modell {model_name} abgeschlossen ({time.time() - start:.1f}s)")
+        loaded_ok = True
     except Exception as e:
         logger.error(f"Warmup für Modell {model_name} fehlgeschlagen: {e}")
-        # Trotzdem zur Liste hinzufügen, um nicht bei jeder Anfrage erneut zu versuchen
-        _warmed_up_models.add(model_name)
+    _invalidate_model_status()
+
+    # Nur nach erfolgreichem Warmup als resident vermerken (Diagnose unter /api/ollama/status);
+    # ob erneut geladen wird, entscheidet ensure_model_resident anhand von /api/ps
+    if not loaded_ok:
+        _resident_models.pop(model_name, None)
+        return False
+    _resident_models[model_name] = {"num_ctx": effective_ctx, "size": 0, "size_vram": 0}
+    try:
+        loaded = _find_loaded(model_name, _list_loaded_models())
+    except Exception:
+        loaded = None
+    if loaded:
+        _resident_models[model_name].update(
+            size=loaded.get("size", 0),
+            size_vram=loaded.get("size_vram", 0),
+        )
+    return True
+
+
+def ensure_model_resident(model_name: str, num_ctx: int | None = None) -> None:
+    """
+    Stellt sicher, dass genau dieses Modell mit dieser Context-Größe geladen ist.
+
+    Ist das Modell bereits mit gleichem num_ctx geladen, passiert nichts (der
+    Job startet "heiß"). Nur wenn ein anderes Modell im Speicher liegt oder sich
+    num_ctx ändert, werden die betroffenen Modelle entladen und das Zielmodell
+    mit passendem num_ctx neu geladen.
+
+    Args:
+        model_name: Zielmodell
+        num_ctx: Context-Fenstergröße (None = settings.OLLAMA_NUM_CTX)
+    """
+    effective_ctx = num_ctx if num_ctx is not None else settings.OLLAMA_NUM_CTX
+    if cassettes.is_replaying():
+        return  # Antworten kommen aus Kassetten, Ollama wird nicht benoetigt
+
+    with _residency_lock:
+        try:
+            loaded = _list_loaded_models()
+        except Exception as e:
+            logger.warning(f"Konnte geladene Modelle nicht prüfen: {e}")
+            loaded = []
+
+        current = _find_loaded(model_name, loaded)
+        if current is not None:
+            # Neuere Ollama-Versionen melden die Context-Größe selbst. Ist sie unbekannt
+            # (z.B. von einem anderen Worker geladen), nicht vorsorglich entladen –
+            # Ollama lädt bei abweichendem num_ctx ohnehin selbst neu.
+            loaded_ctx = current.get("context_length") or _resident_models.get(model_name, {}).get("num_ctx")
+            if loaded_ctx is None or loaded_ctx == effective_ctx:
+                _resident_models[model_name] = {
+                    "num_ctx": effective_ctx,
+                    "size": current.get("size", 0),
+                    "size_vram": current.get("size_vram", 0),
+                }
+                logger.debug(f"Modell {model_name} bereits geladen (num_ctx={effective_ctx})")
+                return
+
+        # Alles entladen, was nicht exakt passt (andere Modelle bzw. falsche Context-Größe)
+        to_unload = [m.get("name", "") for m in loaded if m.get("name")]
+        if to_unload:
+            logger.info(
+                f"Modellwechsel auf {model_name} (num_ctx={effective_ctx}): "
+                f"entlade {', '.join(to_unload)}"
+            )
+            with tracing.span("unload_models", models=", ".join(to_unload)):
+                for name in to_unload:
+                    unload_model(name)
+                try:
+                    _wait_until_unloaded(to_unload)
+                except Exception as e:
+                    logger.warning(f"Konnte VRAM-Freigabe nicht prüfen: {e}")
+
+        with tracing.span("model_load", model=model_name, num_ctx=effective_ctx):
+            if warmup_model(model_name, effective_ctx):
+                OLLAMA_MODEL_LOADS.inc(model=model_name)
+            else:
+                tracing.set_attributes(error="warmup_failed")
+        _log_gpu_usage(model_name, effective_ctx)
+
+
+def _log_gpu_usage(model_name: str, num_ctx: int) -> None:
+    """Loggt die GPU/CPU-Aufteilung einmal pro Ladevorgang (Warnung bei CPU-Offloading)."""
+    gpu_info = get_gpu_layer_ratio(model_name)
+    if "CPU" in gpu_info and "0.0 GB CPU" not in gpu_info:
+        if model_name not in _gpu_warning_logged:
+            logger.warning(
+                f"Modell {model_name} läuft teilweise auf CPU! {gpu_info} – "
+                f"num_ctx={num_ctx} (ggf. OLLAMA_NUM_CTX_LARGE reduzieren)"
+            )
+            _gpu_warning_logged.add(model_name)
+    else:
+        logger.info(f"GPU-Nutzung: {gpu_info}, model={model_name}, num_ctx={num_ctx}")
+
+
+def get_resident_models() -> dict[str, dict]:
+    """
+    Liefert den zuletzt bekannten Residenz-Status (Diagnosezwecke).
+
+    Returns:
+        Dictionary Modellname → {"num_ctx", "size", "size_vram"}
+    """
+    with _residency_lock:
+        return {name: dict(info) for name, info in _resident_models.items()}
 
 
 def get_gpu_layer_ratio(model_name: str | None = None) -> str:
@@ -162,28 +474,102 @@ def get_gpu_layer_ratio(model_name: str | None = None) -> str:
     """
     target = model_name or settings.OLLAMA_MODEL
     try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/ps", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        models = data.get("models", [])
-        for m in models:
-            if target in m.get("name", ""):
-                size_total = m.get("size", 0)
-                size_vram = m.get("size_vram", 0)
-                if size_total > 0:
-                    pct = size_vram / size_total * 100
-                    total_gb = size_total / 1024**3
-                    vram_gb = size_vram / 1024**3
-                    cpu_gb = (size_total - size_vram) / 1024**3
-                    return (
-                        f"{pct:.0f}% auf GPU ({vram_gb:.1f} GB VRAM, "
-                        f"{cpu_gb:.1f} GB CPU) von {total_gb:.1f} GB gesamt"
-                    )
+        m = _find_loaded(target, _list_loaded_models())
+        if m is not None:
+            size_total = m.get("size", 0)
+            size_vram = m.get("size_vram", 0)
+            if size_total > 0:
+                pct = size_vram / size_total * 100
+                total_gb = size_total / 1024**3
+                vram_gb = size_vram / 1024**3
+                cpu_gb = (size_total - size_vram) / 1024**3
+                return (
+                    f"{pct:.0f}% auf GPU ({vram_gb:.1f} GB VRAM, "
+                    f"{cpu_gb:.1f} GB CPU) von {total_gb:.1f} GB gesamt"
+                )
         return "Modell nicht geladen"
     except Exception as e:
         return f"Unbekannt ({e})"
 
 
+def get_model_status(fresh: bool = False) -> dict:
+    """
+    Diagnose-Übersicht der geladenen Modelle inkl. GPU/CPU-Aufteilung.
+
+    Args:
+        fresh: /api/ps-Cache umgehen
+
+    Returns:
+        Dictionary mit "models" (Liste), "resident" (Residenz-Status dieses
+        Prozesses) und ggf. "error"
+    """
+    status = {"models": [], "resident": get_resident_models()}
+    try:
+        loaded = _list_loaded_models(fresh=fresh)
+    except Exception as e:
+        status["error"] = str(e)
+        return status
+
+    for m in loaded:
+        size_total = m.get("size", 0)
+        size_vram = m.get("size_vram", 0)
+        status["models"].append({
+            "name": m.get("name", ""),
+            "size": size_total,
+            "size_vram": size_vram,
+            "gpu_percent": round(size_vram / size_total * 100, 1) if size_total else None,
+            "context_length": m.get("context_length"),
+            "expires_at": m.get("expires_at"),
+        })
+    return status
+
+
+def _record_generation_metrics(model: str, result: str, final_chunk: dict | None, chunk_count: int, seconds: float) -> None:
+    """
+    Erfasst Dauer und Token-Statistik einer Chat-Anfrage (Metriken und Trace-Span).
+    Die Zaehler stehen nur im letzten Chunk (done=true); bei vorzeitig beendetem
+    Stream wird die Anzahl generierter Tokens aus der Anzahl der Chunks (ein Token
+    pro Chunk) bestimmt.
+    """
+    OLLAMA_REQUESTS.inc(model=model, result=result)
+    OLLAMA_REQUEST_SECONDS.observe(seconds, model=model)
+    if final_chunk is None:
+        OLLAMA_COMPLETION_TOKENS.inc(chunk_count, model=model)
+        tracing.add_span("ollama_chat", time.time() - seconds, seconds,
+                         model=model, result=result, completion_tokens=chunk_count)
+        return
+    tracing.add_span(
+        "ollama_chat", time.time() - seconds, seconds,
+        model=model,
+        result=result,
+        prompt_tokens=final_chunk.get("prompt_eval_count", 0),
+        completion_tokens=final_chunk.get("eval_count", chunk_count),
+        load_seconds=round(final_chunk.get("load_duration", 0) / 1e9, 3),
+    )
+    OLLAMA_PROMPT_TOKENS.inc(final_chunk.get("prompt_eval_count", 0), model=model)
+    OLLAMA_COMPLETION_TOKENS.inc(final_chunk.get("eval_count", chunk_count), model=model)
+    OLLAMA_PROMPT_EVAL_SECONDS.inc(final_chunk.get("prompt_eval_duration", 0) / 1e9, model=model)
+    OLLAMA_EVAL_SECONDS.inc(final_chunk.get("eval_duration", 0) / 1e9, model=model)
+    OLLAMA_LOAD_SECONDS.inc(final_chunk.get("load_duration", 0) / 1e9, model=model)
+
+
+def _response_cache_key(payload: dict, stop_on_json_complete: bool) -> str:
+    """
+    Cache-Schluessel: SHA-256 ueber Modell, Optionen, Antwort-Schema und Nachrichten.
+    Bei temperature 0 und festem Seed liefert Ollama fuer denselben Schluessel dieselbe Antwort.
+    """
+    key_data = {
+        "model": payload["model"],
+        "options": payload["options"],
+        "format": payload.get("format"),
+        "messages": payload["messages"],
+        "stop_on_json_complete": stop_on_json_complete,
+        "version": RESPONSE_CACHE_VERSION,
+    }
+    encoded = json.dumps(key_data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
 def chat_completion(
     system_prompt: str,
     user_prompt: str,
@@ -191,36 +577,49 @@ def chat_completion(
     num_ctx: int | None = None,
     model: str | None = None,
     num_predict: int = 4096,
+    cancel_event=None,
+    stop_on_json_complete: bool = False,
+    response_format: dict | None = None,
 ) -> str:
     """
     Chat-Completion-Anfrage an Ollama senden.
     Nutzt Streaming um lange Antworten und Timeouts zu handhaben.
-    Führt automatisch ein Warmup durch, falls das Modell nicht geladen ist.
+    Lädt das Modell bei Bedarf mit passender Context-Größe (ensure_model_resident).
+
+    Ollama verwendet den KV-Cache wieder, solange der Anfang der Nachrichten
+    identisch ist. Gleichbleibende Inhalte (Quelltext) gehören daher in den
+    system_prompt, der variable Teil (Feldanweisungen) in den user_prompt.
 
     num_ctx: Context-Fenstergröße (None = settings.OLLAMA_NUM_CTX).
              Für Pässe mit vollem Quelltext settings.OLLAMA_NUM_CTX_LARGE übergeben.
     model: Modellname (None = settings.OLLAMA_MODEL).
     num_predict: Maximale Anzahl generierter Tokens (Standard: 4096).
+    cancel_event: Optionales Abbruch-Signal (Objekt mit is_set(), z.B. threading.Event).
+                  Ist es gesetzt, wird die Verbindung geschlossen, auch während des
+                  Prefills (_RequestAbort) – Ollama bricht die Auswertung beim
+                  Verbindungsabbruch ab und gibt den Slot frei – und
+                  GenerationCancelled ausgelöst.
+    stop_on_json_complete: Stream beenden, sobald das oberste JSON-Objekt der Antwort
+                  geschlossen ist (JsonScanner, wie die JSON-Reparatur). Nachfolgender Text
+                  würde beim Parsen ohnehin verworfen; der Abbruch spart GPU-Zeit.
+    response_format: Optionales JSON-Schema für Ollamas structured output ("format").
+                  Lehnt der Server es ab (HTTP 400, z.B. ältere Ollama-Version),
+                  wird die Anfrage ohne Schema wiederholt und das Modell gemerkt.
+
+    Antworten werden bei LLM_CACHE_ENABLED auf der Festplatte zwischengespeichert
+    (Schlüssel: Modell, Optionen, Schema, Prompts). Ein identischer Pass, z.B. nach
+    erneutem Hochladen derselben Dokumente, wird ohne GPU-Anfrage beantwortet.
+
+    LLM_CASSETTE_MODE=record zeichnet Payload und Stream-Chunks jeder Anfrage als
+    Kassette auf (ohne Cache-Lookup), replay liefert nur aufgezeichnete Antworten
+    (app.services.cassettes).
     """
-    effective_model = model if model is not None else settings.OLLAMA_MODEL
-
-    # Warmup durchführen, falls Modell nicht im Speicher
-    warmup_model(effective_model)
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled()
 
+    effective_model = model if model is not None else settings.OLLAMA_MODEL
     effective_ctx = num_ctx if num_ctx is not None else settings.OLLAMA_NUM_CTX
 
-    # GPU-Nutzung loggen (Warnung nur einmal pro Modell)
-    gpu_info = get_gpu_layer_ratio(effective_model)
-    if "CPU" in gpu_info and "0.0 GB CPU" not in gpu_info:
-        if effective_model not in _gpu_warning_logged:
-            logger.warning(
-                f"Modell {effective_model} läuft teilweise auf CPU! {gpu_info} – "
-                f"num_ctx={effective_ctx} (ggf. OLLAMA_NUM_CTX_LARGE reduzieren)"
-            )
-            _gpu_warning_logged.add(effective_model)
-    else:
-        logger.debug(f"GPU-Nutzung: {gpu_info}, model={effective_model}, num_ctx={effective_ctx}")
-
     payload = {
         "model": effective_model,
         "messages": [
@@ -228,6 +627,8 @@ def chat_completion(
             {"role": "user", "content": user_prompt},
         ],
         "stream": True,
+        # Modell und KV-Cache zwischen den Pässen im Speicher halten (Prefix-Wiederverwendung)
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
         "options": {
             "temperature": temperature,
             "seed": 42,            # Reproduzierbare Ausgaben (deterministisch)
@@ -237,34 +638,164 @@ def chat_completion(
         },
     }
 
-    full_response = ""
-    with requests.post(
-        f"{settings.OLLAMA_BASE_URL}/api/chat",
-        json=payload,
-        stream=True,
-        timeout=settings.OLLAMA_TIMEOUT,
-    ) as response:
-        response.raise_for_status()
-        for line in response.iter_lines(decode_unicode=True):
-            if not line or not line.strip():
-                continue
-            try:
-                chunk = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            if "message" in chunk and "content" in chunk["message"]:
-                full_response += chunk["message"]["content"]
-            if chunk.get("done", False):
-                break
+    if response_format is not None and effective_model not in _format_unsupported_models:
+        payload["format"] = response_format
+
+    if cassettes.is_replaying():
+        return _replay_cassette(payload, stop_on_json_complete)
+
+    # Beim Aufzeichnen immer Ollama fragen, damit jede Kassette den echten Stream enthaelt
+    recording = cassettes.is_recording()
+    cache_key = (
+        _response_cache_key(payload, stop_on_json_complete)
+        if settings.LLM_CACHE_ENABLED and not recording else None
+    )
+    if cache_key is not None:
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Ollama-Antwort aus Cache: {len(cached)} Bytes ({effective_model})")
+            OLLAMA_REQUESTS.inc(model=effective_model, result="cache_hit")
+            tracing.set_attributes(llm_cache="hit")
+            return cached.decode("utf-8")
+
+    # Modell mit passender Context-Größe laden, falls nicht bereits resident
+    ensure_model_resident(effective_model, effective_ctx)
+
+    parts: list[str] = []
+    tracker = JsonScanner() if stop_on_json_complete else None
+    start = time.perf_counter()
+    result = "complete"
+    final_chunk: dict | None = None
+    chunk_count = 0
+    recorded_chunks: list[dict] | None = [] if recording else None
+    format_rejected = False
+    abort = _RequestAbort(cancel_event) if cancel_event is not None else None
+
+    def _cancelled() -> GenerationCancelled:
+        logger.info(f"Generierung abgebrochen nach {sum(len(p) for p in parts)} Zeichen")
+        _record_generation_metrics(effective_model, "cancelled", None, chunk_count, time.perf_counter() - start)
+        return GenerationCancelled()
 
-    logger.info(f"Ollama-Antwort: {len(full_response)} Zeichen")
-    return full_response.strip()
+    try:
+        with abort or contextlib.nullcontext(), get_http_client().post(
+            "/api/chat",
+            json=payload,
+            stream=True,
+            timeout=settings.OLLAMA_TIMEOUT,
+        ) as response:
+            if "format" in payload and response.status_code == 400:
+                logger.warning(
+                    f"Structured output von {effective_model} nicht unterstützt "
+                    f"(HTTP {response.status_code}: {response.text[:200]}) – verwende freie JSON-Antwort"
+                )
+                _format_unsupported_models.add(effective_model)
+                format_rejected = True
+            else:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if cancel_event is not None and cancel_event.is_set():
+                        response.close()
+                        raise _cancelled()
+                    if not line or not line.strip():
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if recorded_chunks is not None:
+                        recorded_chunks.append(chunk)
+                    if "message" in chunk and "content" in chunk["message"]:
+                        content = chunk["message"]["content"]
+                        if content:
+                            chunk_count += 1
+                        if tracker is not None:
+                            end = tracker.feed(content)
+                            if end >= 0:
+                                parts.append(content[:end])
+                                # Verbindung schließen → Ollama beendet die Generierung
+                                response.close()
+                                logger.debug("JSON-Antwort vollständig, Stream vorzeitig beendet")
+                                result = "early_stop"
+                                break
+                        parts.append(content)
+                    if chunk.get("done", False):
+                        final_chunk = chunk
+                        break
+    except GenerationCancelled:
+        raise
+    except Exception:
+        if abort is not None and abort.aborted:
+            raise _cancelled() from None
+        _record_generation_metrics(effective_model, "error", None, chunk_count, time.perf_counter() - start)
+        raise
+
+    if abort is not None and abort.aborted and final_chunk is None and result == "complete":
+        # Socket geschlossen, Stream endete ohne Fehler
+        raise _cancelled()
+
+    if format_rejected:
+        full_response = chat_completion(
+            system_prompt,
+            user_prompt,
+            temperature=temperature,
+            num_ctx=num_ctx,
+            model=model,
+            num_predict=num_predict,
+            cancel_event=cancel_event,
+            stop_on_json_complete=stop_on_json_complete,
+        )
+        if cache_key is not None and full_response:
+            _response_cache.set(cache_key, full_response.encode("utf-8"))
+        return full_response
+
+    _record_generation_metrics(effective_model, result, final_chunk, chunk_count, time.perf_counter() - start)
+    full_response = "".join(parts).strip()
+    if final_chunk is not None and final_chunk.get("eval_duration"):
+        tokens_per_second = final_chunk.get("eval_count", 0) / (final_chunk["eval_duration"] / 1e9)
+        logger.info(
+            f"Ollama-Antwort: {len(full_response)} Zeichen, {final_chunk.get('eval_count', 0)} Tokens "
+            f"({tokens_per_second:.1f} Tok/s), Prompt {final_chunk.get('prompt_eval_count', 0)} Tokens"
+        )
+    else:
+        logger.info(f"Ollama-Antwort: {len(full_response)} Zeichen")
+    if cache_key is not None and full_response:
+        _response_cache.set(cache_key, full_response.encode("utf-8"))
+    if recorded_chunks is not None:
+        cassettes.record(
+            _response_cache_key(payload, stop_on_json_complete),
+            payload, stop_on_json_complete, recorded_chunks, full_response, result,
+        )
+    return full_response
+
+
+def _replay_cassette(payload: dict, stop_on_json_complete: bool) -> str:
+    """
+    Antwort aus einer aufgezeichneten Kassette (LLM_CASSETTE_MODE=replay), ohne Ollama.
+
+    Raises:
+        CassetteNotFound: Fuer diese Anfrage wurde nichts aufgezeichnet
+    """
+    candidates = [payload]
+    if "format" in payload:
+        # Aufgezeichnet ohne Schema, weil der Server structured output abgelehnt hatte
+        candidates.append({key: value for key, value in payload.items() if key != "format"})
+    for candidate in candidates:
+        key = _response_cache_key(candidate, stop_on_json_complete)
+        cassette = cassettes.load(key)
+        if cassette is not None:
+            logger.info(f"Ollama-Antwort aus Kassette {key[:12]}: {len(cassette['response'])} Zeichen")
+            OLLAMA_REQUESTS.inc(model=payload["model"], result="replay")
+            tracing.set_attributes(cassette=key[:12])
+            return cassette["response"]
+    raise cassettes.CassetteNotFound(
+        f"Keine Kassette fuer Anfrage an {payload['model']} in {settings.LLM_CASSETTE_DIR}"
+    )
 
 
 def check_health() -> bool:
     """Pruefen ob Ollama erreichbar ist und das Modell verfuegbar ist."""
     try:
-        resp = requests.get(f"{settings.OLLAMA_BASE_URL}/api/tags", timeout=10)
+        resp = get_http_client().get("/api/tags", timeout=10)
         data = resp.json()
         model_names = [m["name"] for m in data.get("models", [])]
         return any(settings.OLLAMA_MODEL in name for name in model_names)
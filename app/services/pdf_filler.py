@@ -1,10 +1,16 @@
 import logging
 import re
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import pikepdf
 
+from app.config import settings
 from app.models.form_schema import FormField, FieldType
+from app.services import tracing
+from app.services.metrics import FILL_PDF_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +26,7 @@ def fill_pdf(
     - Radio-Buttons werden ueber den AcroForm-Feldbaum gefuellt,
       da Radio-Widgets kein eigenes /T haben (erben es vom Parent).
     """
-    pdf = pikepdf.open(str(template_path))
+    start = time.perf_counter()
 
     # Lookup-Maps erstellen
     text_map: dict[str, str] = {}
@@ -45,6 +51,288 @@ def fill_pdf(
     else:
         logger.warning("Keine Radio-Auswahlen fuer PDF erhalten (radio_map ist leer)")
 
+    pdf, filled_count = _open_and_fill(template_path, text_map, checkbox_map, radio_map)
+
+    # Finale Sicherheitsreparatur und sichtbare Markierungen, direkt im Speicher
+    # auf demselben Pdf-Objekt (kein Zwischenspeichern + erneutes Parsen).
+    # Alles oder nichts: bricht eine Reparatur ab, wird das halb reparierte Pdf
+    # verworfen und die Vorlage ohne Reparaturen neu befuellt.
+    with tracing.span("post_repair") as repair_span:
+        try:
+            _repair_section5_radio_appearances(pdf)
+            _burn_in_section5_marks(pdf)
+            _burn_in_problematic_button_marks(pdf)
+        except Exception as ex:
+            logger.warning(f"Post-Repair fehlgeschlagen, speichere ohne Reparaturen: {ex}")
+            if repair_span is not None:
+                repair_span.attrs["error"] = type(ex).__name__
+            pdf.close()
+            pdf, filled_count = _open_and_fill(template_path, text_map, checkbox_map, radio_map)
+
+    # Mit eigenen Appearance-Streams fuer gefuellte Textfelder brauchen wir
+    # kein viewer-spezifisches Regenerieren.
+    if "/AcroForm" in pdf.Root:
+        pdf.Root["/AcroForm"][pikepdf.Name("/NeedAppearances")] = False
+    else:
+        logger.warning("Kein AcroForm im PDF gefunden")
+
+    with tracing.span("save", linearize=settings.PDF_LINEARIZE):
+        pdf.save(
+            str(output_path),
+            linearize=settings.PDF_LINEARIZE,
+            object_stream_mode=(
+                pikepdf.ObjectStreamMode.generate if settings.PDF_OBJECT_STREAMS
+                else pikepdf.ObjectStreamMode.preserve
+            ),
+        )
+    pdf.close()
+
+    FILL_PDF_SECONDS.observe(time.perf_counter() - start, template=Path(template_path).stem)
+    logger.info(f"PDF gespeichert: {output_path} ({filled_count} Felder ausgefuellt)")
+    return output_path
+
+
+def _open_and_fill(
+    template_path: Path,
+    text_map: dict[str, str],
+    checkbox_map: dict[str, str],
+    radio_map: dict[str, str],
+) -> tuple[pikepdf.Pdf, int]:
+    """
+    Oeffnet die Vorlage und fuellt die Felder (ohne Post-Repair).
+
+    Returns:
+        (geoeffnetes Pdf, Anzahl ausgefuellter Felder)
+    """
+    pdf = pikepdf.open(str(template_path))
+    with tracing.span("fill_fields") as fill_span:
+        index = _get_template_index(template_path, pdf)
+        if index is not None:
+            filled_count = _fill_from_index(pdf, index, text_map, checkbox_map, radio_map)
+        else:
+            filled_count = _fill_by_traversal(pdf, text_map, checkbox_map, radio_map)
+        if fill_span is not None:
+            fill_span.attrs.update(filled=filled_count, indexed=index is not None)
+    return pdf, filled_count
+
+
+# ---------------------------------------------------------------------------
+# Vorlagen-Index: Feldnamen → Objekt-IDs (einmal pro Vorlage aufgebaut)
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _TextTarget:
+    """Textfeld im AcroForm-Baum: Feld-Objekt plus Widgets (None = Feld ist selbst Widget)."""
+    field_id: tuple[int, int]
+    kid_ids: list[tuple[int, int]] | None
+    ff: int | None
+    max_len: int | None
+
+
+@dataclass
+class _RadioGroup:
+    """Radio-Gruppe im AcroForm-Baum mit Widget-Reihenfolge."""
+    field_id: tuple[int, int]
+    kid_ids: list[tuple[int, int]]
+    # Uebergeordnete Gruppen; ist eine davon ausgewaehlt, wird diese nicht mehr besucht
+    ancestors: tuple[str, ...]
+
+
+@dataclass
+class _TemplateIndex:
+    """
+    Vorberechnete Feldstruktur einer PDF-Vorlage. Enthaelt nur Objekt-IDs und
+    Zahlen und ist damit unabhaengig von einer geoeffneten pikepdf-Instanz.
+    """
+    widgets: dict[str, list[tuple[int, int]]] = field(default_factory=dict)
+    text_targets: dict[str, list[_TextTarget]] = field(default_factory=dict)
+    radio_groups: list[tuple[str, _RadioGroup]] = field(default_factory=list)
+    # Widgets, die der AcroForm-Pass ohnehin mit demselben Wert beschreibt
+    tree_text_widgets: set[tuple[int, int]] = field(default_factory=set)
+
+
+class _NotAddressable(Exception):
+    """Direktes Objekt ohne Objekt-ID - fuer diese Vorlage ist kein Index moeglich."""
+
+
+# Vorlagenpfad → (mtime_ns, Groesse, Index oder None)
+_template_indexes: dict[str, tuple[int, int, _TemplateIndex | None]] = {}
+_template_index_lock = threading.Lock()
+
+
+def _get_template_index(template_path: Path, pdf: pikepdf.Pdf) -> _TemplateIndex | None:
+    """
+    Liefert den Index der Vorlage aus dem Cache oder baut ihn aus der bereits
+    geoeffneten Vorlage auf. Aendert sich die Datei (mtime/Groesse), wird neu aufgebaut.
+
+    Returns:
+        _TemplateIndex oder None, falls die Vorlage nicht adressierbare Objekte enthaelt
+    """
+    path = Path(template_path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    key = str(path.resolve())
+
+    with _template_index_lock:
+        cached = _template_indexes.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        try:
+            index = _build_template_index(pdf)
+            logger.info(
+                f"Vorlagen-Index {path.name}: {len(index.widgets)} Widgets, "
+                f"{len(index.text_targets)} Textfelder, {len(index.radio_groups)} Radio-Gruppen"
+            )
+        except _NotAddressable:
+            index = None
+            logger.info(f"Vorlagen-Index {path.name}: direkte Objekte, Felder werden per Traversierung gefuellt")
+        _template_indexes[key] = (stat.st_mtime_ns, stat.st_size, index)
+        return index
+
+
+def _object_id(obj) -> tuple[int, int]:
+    objgen = obj.objgen
+    if objgen == (0, 0):
+        raise _NotAddressable()
+    return objgen
+
+
+def _decode_field_name(t) -> str | None:
+    """Feldname aus /T, mit Latin-1-Fallback fuer Umlaute."""
+    try:
+        return str(t)
+    except Exception:
+        try:
+            return bytes(t).decode("latin-1")
+        except Exception:
+            return None
+
+
+def _build_template_index(pdf: pikepdf.Pdf) -> _TemplateIndex:
+    """
+    Durchlaeuft Page-Annotations und AcroForm-Baum einmal und merkt sich, welche
+    Objekte fuer welchen Feldnamen beschrieben werden. Die Auswahlregeln
+    entsprechen denen von _fill_by_traversal.
+    """
+    index = _TemplateIndex()
+
+    for page in pdf.pages:
+        for annot in page.get("/Annots") or []:
+            annot_obj = annot.resolve() if hasattr(annot, "resolve") else annot
+            t = annot_obj.get("/T")
+            name = _decode_field_name(t) if t is not None else None
+            if name is not None:
+                index.widgets.setdefault(name, []).append(_object_id(annot_obj))
+
+    def walk(field_obj, parent_name: str | None, ancestors: tuple[str, ...]):
+        t = field_obj.get("/T")
+        name = (_decode_field_name(t) if t is not None else None) or parent_name
+        kids = field_obj.get("/Kids")
+        ft = field_obj.get("/FT")
+        kid_objs = []
+        for kid_ref in kids or []:
+            kid = kid_ref.resolve() if hasattr(kid_ref, "resolve") else kid_ref
+            if not isinstance(kid, pikepdf.Dictionary):
+                raise _NotAddressable()
+            kid_objs.append(kid)
+
+        ft_name = str(ft) if ft is not None else ""
+
+        if name and (ft_name == "/Tx" or kids):
+            target = _TextTarget(
+                field_id=_object_id(field_obj),
+                kid_ids=[_object_id(kid) for kid in kid_objs] if kids else None,
+                ff=_to_int_or_default(field_obj.get("/Ff"), None),
+                max_len=_to_int_or_default(field_obj.get("/MaxLen"), None),
+            )
+            index.text_targets.setdefault(name, []).append(target)
+            if target.kid_ids is None:
+                index.tree_text_widgets.add(target.field_id)
+
+        if name and kids:
+            index.radio_groups.append((name, _RadioGroup(
+                field_id=_object_id(field_obj),
+                kid_ids=[_object_id(kid) for kid in kid_objs],
+                ancestors=ancestors,
+            )))
+            ancestors = ancestors + (name,)
+
+        for kid in kid_objs:
+            walk(kid, name, ancestors)
+
+    acroform = pdf.Root.get("/AcroForm")
+    if acroform and "/Fields" in acroform:
+        for field_ref in acroform["/Fields"]:
+            field_obj = field_ref.resolve() if hasattr(field_ref, "resolve") else field_ref
+            if isinstance(field_obj, pikepdf.Dictionary):
+                walk(field_obj, None, ())
+
+    return index
+
+
+def _fill_from_index(
+    pdf: pikepdf.Pdf,
+    index: _TemplateIndex,
+    text_map: dict[str, str],
+    checkbox_map: dict[str, str],
+    radio_map: dict[str, str],
+) -> int:
+    """Schreibt die Werte direkt in die ueber den Index adressierten Objekte."""
+    filled_count = 0
+
+    # --- Text- und Checkbox-Widgets mit eigenem /T ---
+    for name, widget_ids in index.widgets.items():
+        if name in text_map:
+            for widget_id in widget_ids:
+                # Wird unten im AcroForm-Pass identisch beschrieben
+                if widget_id in index.tree_text_widgets:
+                    continue
+                _set_text_field(pdf, pdf.get_object(widget_id), text_map[name])
+                filled_count += 1
+        elif name in checkbox_map:
+            for widget_id in widget_ids:
+                _set_checkbox_field(pdf.get_object(widget_id), checkbox_map[name])
+                filled_count += 1
+
+    # --- Textfelder im AcroForm-Baum ---
+    for name, value in text_map.items():
+        for target in index.text_targets.get(name, ()):
+            field_obj = pdf.get_object(target.field_id)
+            field_obj[pikepdf.Name("/V")] = pikepdf.String(value)
+            if target.kid_ids is None:
+                _set_text_widget_appearance(pdf, field_obj, value, field_ff=target.ff, field_max_len=target.max_len)
+            else:
+                for kid_id in target.kid_ids:
+                    kid = pdf.get_object(kid_id)
+                    kid[pikepdf.Name("/V")] = pikepdf.String(value)
+                    _set_text_widget_appearance(pdf, kid, value, field_ff=target.ff, field_max_len=target.max_len)
+            filled_count += 1
+
+    # --- Radio-Gruppen ---
+    if radio_map:
+        for name, group in index.radio_groups:
+            if name not in radio_map or any(a in radio_map for a in group.ancestors):
+                continue
+            kids = [pdf.get_object(kid_id) for kid_id in group.kid_ids]
+            filled_count += _activate_radio_option(pdf.get_object(group.field_id), kids, radio_map[name], name)
+        _repair_section5_radio_appearances(pdf)
+
+    return filled_count
+
+
+def _fill_by_traversal(
+    pdf: pikepdf.Pdf,
+    text_map: dict[str, str],
+    checkbox_map: dict[str, str],
+    radio_map: dict[str, str],
+) -> int:
+    """
+    Fuellt die Felder durch Traversieren von Page-Annotations und AcroForm-Baum.
+    Fallback fuer Vorlagen, fuer die kein Index aufgebaut werden kann.
+    """
     filled_count = 0
 
     # --- Text- und Checkbox-Felder ueber Page-Annotations fuellen ---
@@ -87,32 +375,7 @@ def fill_pdf(
                 filled_count += _fill_radio_in_tree(field_ref, radio_map)
             _repair_section5_radio_appearances(pdf)
 
-    # Mit eigenen Appearance-Streams fuer gefuellte Textfelder brauchen wir
-    # kein viewer-spezifisches Regenerieren.
-    if "/AcroForm" in pdf.Root:
-        pdf.Root["/AcroForm"][pikepdf.Name("/NeedAppearances")] = False
-    else:
-        logger.warning("Kein AcroForm im PDF gefunden")
-
-    pdf.save(str(output_path))
-    pdf.close()
-
-    # Finale Sicherheitsreparatur auf der bereits gespeicherten Datei.
-    # Dieser zweite Pass hat sich als robust erwiesen bei Section-5-Radios.
-    try:
-        post_pdf = pikepdf.open(str(output_path), allow_overwriting_input=True)
-        _repair_section5_radio_appearances(post_pdf)
-        _burn_in_section5_marks(post_pdf)
-        _burn_in_problematic_button_marks(post_pdf)
-        if "/AcroForm" in post_pdf.Root:
-            post_pdf.Root["/AcroForm"][pikepdf.Name("/NeedAppearances")] = False
-        post_pdf.save(str(output_path))
-        post_pdf.close()
-    except Exception as ex:
-        logger.warning(f"Post-Repair fehlgeschlagen: {ex}")
-
-    logger.info(f"PDF gespeichert: {output_path} ({filled_count} Felder ausgefuellt)")
-    return output_path
+    return filled_count
 
 
 # ---------------------------------------------------------------------------
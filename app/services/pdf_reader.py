@@ -1,7 +1,16 @@
+import dataclasses
+import hashlib
+import json
 import logging
+import multiprocessing
+import os
 import re
-from dataclasses import dataclass
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Iterator
 
 import pypdf
 import pytesseract
@@ -9,6 +18,9 @@ from pdf2image import convert_from_path
 from PIL import Image, ImageEnhance
 
 from app.config import settings
+from app.services import tracing
+from app.services.disk_cache import DiskCache
+from app.services.metrics import OCR_PAGE_SECONDS, TEXT_EXTRACTION_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +32,14 @@ MIN_CHARS_PER_PAGE = 50
 # preserve_interword_spaces → Wortabstände beibehalten
 TESSERACT_CONFIG = "--oem 3 --psm 3 -c preserve_interword_spaces=1"
 
+# Version des Cache-Formats: erhoehen, wenn sich die Extraktionslogik aendert
+EXTRACTION_CACHE_VERSION = 3
+
+_extraction_cache = DiskCache(
+    settings.CACHE_DIR / "extraction",
+    max_bytes=settings.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+)
+
 
 @dataclass
 class ExtractionInfo:
@@ -28,6 +48,7 @@ class ExtractionInfo:
     page_count: int
     char_count: int
     is_ocr_fallback: bool
+    ocr_pages: list[int] = field(default_factory=list)  # Seitennummern (1-basiert), die per OCR erkannt wurden
 
 
 def _preprocess_image(img: Image.Image) -> Image.Image:
@@ -57,72 +78,237 @@ def _postprocess_text(text: str) -> str:
     return text.strip()
 
 
+def _extraction_cache_key(file_path: Path) -> str:
+    """
+    Cache-Schluessel: SHA-256 ueber den Dateiinhalt plus alle OCR-Einstellungen,
+    die das Ergebnis beeinflussen.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    digest.update(
+        f"|{settings.OCR_LANGUAGE}|{settings.OCR_DPI}|{TESSERACT_CONFIG}"
+        f"|{MIN_CHARS_PER_PAGE}|v{EXTRACTION_CACHE_VERSION}".encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
 def extract_text_from_pdf(file_path: Path) -> ExtractionInfo:
     """
-    Text aus PDF extrahieren.
-    Falls der Text zu duenn ist (gescanntes Dokument), wird OCR verwendet.
+    Text aus PDF extrahieren (mit inhaltsadressiertem Cache).
+    Ein bereits verarbeitetes Dokument wird ohne erneute OCR aus dem Cache geliefert.
+    """
+    start = time.perf_counter()
+    if not settings.EXTRACTION_CACHE_ENABLED:
+        info = _extract_text_from_pdf(file_path)
+        TEXT_EXTRACTION_SECONDS.observe(time.perf_counter() - start, method=info.method)
+        return info
+
+    cache_key = _extraction_cache_key(file_path)
+    cached = _extraction_cache.get(cache_key)
+    if cached is not None:
+        try:
+            info = ExtractionInfo(**json.loads(cached.decode("utf-8")))
+            logger.info(f"{file_path.name}: Text aus Cache geladen ({info.char_count} Zeichen, {info.method})")
+            tracing.set_attributes(cache="hit")
+            TEXT_EXTRACTION_SECONDS.observe(time.perf_counter() - start, method="cache")
+            return info
+        except Exception as e:
+            logger.warning(f"{file_path.name}: Cache-Eintrag ungueltig, extrahiere neu: {e}")
+
+    info = _extract_text_from_pdf(file_path)
+    TEXT_EXTRACTION_SECONDS.observe(time.perf_counter() - start, method=info.method)
+    _extraction_cache.set(
+        cache_key,
+        json.dumps(dataclasses.asdict(info), ensure_ascii=False).encode("utf-8"),
+    )
+    return info
+
+
+def _page_has_images(page: pypdf.PageObject) -> bool:
+    """Enthaelt die Seite Rasterbilder (Bild-XObjects, auch in Form-XObjects, oder Inline-Bilder)?"""
+    try:
+        return len(page.images) > 0
+    except Exception as e:
+        logger.debug(f"Bilder der Seite nicht lesbar, OCR zur Sicherheit: {e}")
+        return True
+
+
+def _join_pages(pages_text: list[str]) -> str:
+    """Seitentexte mit Seitenmarkern zusammenfuegen (gleiches Format fuer Text-Ebene und OCR)."""
+    return "\n\n".join(f"--- Seite {i + 1} ---\n{text}" for i, text in enumerate(pages_text))
+
+
+def _extract_text_from_pdf(file_path: Path) -> ExtractionInfo:
+    """
+    Text aus PDF extrahieren, Entscheidung Text-Ebene vs. OCR pro Seite:
+    Seiten mit ausreichender Text-Ebene behalten den pypdf-Text, nur Seiten
+    mit wenig Text und Rasterbildern (gescannte Seiten/Anlagen) werden per OCR
+    erkannt. Leere Seiten oder Seiten mit reiner Vektorgrafik (z.B. Unterschrift)
+    haben nichts, was OCR finden koennte, und bleiben bei der Text-Ebene.
     """
     reader = pypdf.PdfReader(str(file_path))
     pages_text = []
-    for page in reader.pages:
+    ocr_pages = []
+    for i, page in enumerate(reader.pages):
         text = page.extract_text() or ""
         pages_text.append(text)
+        if len(text.strip()) < MIN_CHARS_PER_PAGE and _page_has_images(page):
+            ocr_pages.append(i + 1)
+    page_count = len(pages_text)
 
-    full_text = "\n\n".join(pages_text)
-    avg_chars = len(full_text.strip()) / max(len(reader.pages), 1)
-
-    if avg_chars < MIN_CHARS_PER_PAGE:
+    if not ocr_pages:
+        full_text = _join_pages(pages_text)
         logger.info(
-            f"{file_path.name}: Wenig Text gefunden ({avg_chars:.0f} Zeichen/Seite), "
-            f"starte OCR..."
+            f"{file_path.name}: Text extrahiert ({len(full_text)} Zeichen, "
+            f"{page_count} Seiten)"
         )
-        full_text = _ocr_pdf(file_path)
         return ExtractionInfo(
             text=full_text,
-            method="ocr",
-            page_count=len(reader.pages),
+            method="text_extraction",
+            page_count=page_count,
             char_count=len(full_text),
-            is_ocr_fallback=True,
+            is_ocr_fallback=False,
         )
 
     logger.info(
-        f"{file_path.name}: Text extrahiert ({len(full_text)} Zeichen, "
-        f"{len(reader.pages)} Seiten)"
+        f"{file_path.name}: {len(ocr_pages)} von {page_count} Seite(n) mit Bildern ohne Text-Ebene "
+        f"(< {MIN_CHARS_PER_PAGE} Zeichen), starte OCR..."
     )
+    for page_number, text in _iter_ocr_pages(file_path, ocr_pages):
+        pages_text[page_number - 1] = text
+        logger.info(f"OCR Seite {page_number}/{page_count}: {len(text)} Zeichen")
+
+    full_text = _join_pages(pages_text)
+    method = "ocr" if len(ocr_pages) == page_count else "hybrid"
     return ExtractionInfo(
         text=full_text,
-        method="text_extraction",
-        page_count=len(reader.pages),
+        method=method,
+        page_count=page_count,
         char_count=len(full_text),
-        is_ocr_fallback=False,
+        is_ocr_fallback=True,
+        ocr_pages=ocr_pages,
     )
 
 
-def _ocr_pdf(file_path: Path) -> str:
-    """PDF-Seiten in Bilder konvertieren und per OCR verarbeiten."""
-    images = convert_from_path(str(file_path), dpi=settings.OCR_DPI)
-    texts = []
-    for i, img in enumerate(images):
-        # Bildvorverarbeitung für bessere Erkennung
-        processed_img = _preprocess_image(img)
-        text = pytesseract.image_to_string(
-            processed_img,
-            lang=settings.OCR_LANGUAGE,
-            config=TESSERACT_CONFIG,
-        )
-        # OCR-Artefakte bereinigen
-        text = _postprocess_text(text)
-        texts.append(f"--- Seite {i + 1} ---\n{text}")
-        logger.info(f"OCR Seite {i + 1}/{len(images)}: {len(text)} Zeichen")
-    return "\n\n".join(texts)
+def _init_ocr_worker() -> None:
+    """
+    Initialisierung der OCR-Worker-Prozesse.
+    Tesseract nutzt intern OpenMP-Threads; bei mehreren parallelen Prozessen
+    fuehrt das zu Ueberbelegung der Kerne, daher ein Thread pro Prozess.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_image(img: Image.Image) -> str:
+    """Einzelne Seite vorverarbeiten und per OCR erkennen (laeuft im Worker-Prozess)."""
+    # Bildvorverarbeitung für bessere Erkennung
+    processed_img = _preprocess_image(img)
+    text = pytesseract.image_to_string(
+        processed_img,
+        lang=settings.OCR_LANGUAGE,
+        config=TESSERACT_CONFIG,
+    )
+    # OCR-Artefakte bereinigen
+    return _postprocess_text(text)
+
+
+def _ocr_page(file_path: str, page_number: int) -> str:
+    """
+    Eine einzelne Seite rendern, vorverarbeiten und erkennen (laeuft im Worker-Prozess).
+    Es wird nur diese Seite gerendert (first_page/last_page); das Bild wird nach der
+    Erkennung sofort freigegeben. Graustufen-Rendering spart 2/3 des Speichers,
+    _preprocess_image konvertiert ohnehin nach Graustufen.
+    """
+    images = convert_from_path(
+        file_path,
+        dpi=settings.OCR_DPI,
+        first_page=page_number,
+        last_page=page_number,
+        grayscale=True,
+    )
+    if not images:
+        return ""
+    img = images[0]
+    try:
+        return _ocr_image(img)
+    finally:
+        img.close()
+
+
+def _ocr_page_timed(file_path: str, page_number: int) -> tuple[str, float, float, int]:
+    """
+    _ocr_page mit Laufzeitmessung im Worker-Prozess (Metriken und Trace werden im
+    Hauptprozess erfasst).
+
+    Returns:
+        (Text, Startzeit als Unix-Zeit, Dauer in Sekunden, PID des Worker-Prozesses)
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    text = _ocr_page(file_path, page_number)
+    return text, started_at, time.perf_counter() - start, os.getpid()
+
+
+def _record_ocr_page(page_number: int, started_at: float, seconds: float, thread: str | None = None) -> None:
+    OCR_PAGE_SECONDS.observe(seconds)
+    tracing.add_span("ocr_page", started_at, seconds, thread=thread, page=page_number)
+
+
+def _iter_ocr_pages(file_path: Path, page_numbers: list[int]) -> Iterator[tuple[int, str]]:
+    """
+    Generator-Pipeline: rendert und erkennt Seiten einzeln und liefert (Seitennummer, Text)
+    in der Reihenfolge von page_numbers.
+
+    Es sind hoechstens 2 * OCR_WORKERS Seiten gleichzeitig in Arbeit; jede Seite existiert
+    nur waehrend ihrer Erkennung als Bild im Worker-Prozess. Der Speicherbedarf ist damit
+    unabhaengig von der Seitenzahl.
+    """
+    workers = min(settings.OCR_WORKERS, len(page_numbers))
+    if workers <= 1:
+        for page_number in page_numbers:
+            text, started_at, seconds, _ = _ocr_page_timed(str(file_path), page_number)
+            _record_ocr_page(page_number, started_at, seconds)
+            yield page_number, text
+        return
+
+    logger.info(f"OCR: {len(page_numbers)} Seiten mit {workers} Prozessen")
+    # "spawn" statt "fork": der Aufruf kommt aus einem Job-Thread, fork waere dort unsicher
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_ocr_worker,
+    ) as executor:
+        remaining = iter(page_numbers)
+        pending = deque()
+
+        def _submit_next() -> None:
+            page_number = next(remaining, None)
+            if page_number is not None:
+                pending.append((page_number, executor.submit(_ocr_page_timed, str(file_path), page_number)))
+
+        # Fenster fuellen: Worker ausgelastet halten, ohne alle Seiten vorab einzuplanen
+        for _ in range(workers * 2):
+            _submit_next()
+
+        while pending:
+            page_number, future = pending.popleft()
+            text, started_at, seconds, worker_pid = future.result()
+            _record_ocr_page(page_number, started_at, seconds, thread=f"ocr-worker-{worker_pid}")
+            _submit_next()
+            yield page_number, text
 
 
 def extract_from_multiple(file_paths: list[Path]) -> str:
     """Text aus mehreren hochgeladenen PDFs extrahieren und zusammenfuegen."""
     all_texts = []
-    for fp in file_paths:
+    for index, fp in enumerate(file_paths, start=1):
         try:
-            info = extract_text_from_pdf(fp)
+            # Dateinamen enthalten oft Patientennamen → im Trace nur die Position
+            with tracing.span("document", index=index):
+                info = extract_text_from_pdf(fp)
+                tracing.set_attributes(method=info.method, pages=info.page_count, ocr_pages=len(info.ocr_pages))
             all_texts.append(
                 f"=== Dokument: {fp.name} (Methode: {info.method}) ===\n{info.text}"
             )
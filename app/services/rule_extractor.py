@@ -0,0 +1,154 @@
+"""
+Rule Extractor
+
+Deterministische Vorab-Extraktion streng formatierter Felder (Datumsangaben,
+PLZ) per regulaerem Ausdruck, bevor ein LLM-Pass laeuft.
+Die Regeln werden zusammen mit den Feldern in app/form_definitions/ deklariert
+(FormDefinition.rules).
+
+Eine Regel fuellt ihre Felder nur, wenn alle Treffer im Quelltext denselben
+normalisierten Wert ergeben. Mehrdeutige Faelle (z.B. Praxis- und
+Patientenadresse) bleiben der KI-Extraktion ueberlassen.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+from app.models.form_schema import FormField, ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FieldRule:
+    """
+    Regex-Regel: benannte Gruppen des Musters fuellen die zugeordneten Felder.
+
+    Attributes:
+        name: Bezeichnung fuer das Logging
+        pattern: Regulaerer Ausdruck mit benannten Gruppen
+        targets: Gruppenname → Feldnamen, die mit dem Gruppenwert gefuellt werden
+        normalizers: Gruppenname → Funktion, die den Rohwert normalisiert
+            (None = Treffer verwerfen)
+        flags: re-Flags fuer das Muster. Standard ist Gross-/Kleinschreibung
+            beachten, damit Zeichenklassen wie [A-ZÄÖÜ] greifen; Schluesselwoerter
+            werden im Muster per (?i:...) unabhaengig davon erkannt.
+    """
+    name: str
+    pattern: str
+    targets: Dict[str, List[str]]
+    normalizers: Dict[str, Callable[[str], Optional[str]]] = field(default_factory=dict)
+    flags: int = 0
+
+    def __post_init__(self):
+        self._regex = re.compile(self.pattern, self.flags)
+
+    def find_values(self, source_text: str) -> Dict[str, str]:
+        """
+        Wendet die Regel an.
+
+        Returns:
+            Gruppenname → eindeutiger normalisierter Wert (mehrdeutige Gruppen fehlen)
+        """
+        candidates: Dict[str, set] = {group: set() for group in self.targets}
+        for match in self._regex.finditer(source_text):
+            for group in self.targets:
+                raw = match.group(group)
+                if raw is None:
+                    continue
+                normalize = self.normalizers.get(group)
+                value = normalize(raw) if normalize else " ".join(raw.split())
+                if value:
+                    candidates[group].add(value)
+
+        values = {}
+        for group, found in candidates.items():
+            if len(found) == 1:
+                values[group] = found.pop()
+            elif len(found) > 1:
+                logger.debug(f"Regel {self.name}: Gruppe {group} mehrdeutig ({sorted(found)})")
+        return values
+
+
+def apply_rules(
+    rules: List[FieldRule],
+    fields: List[FormField],
+    source_text: str,
+) -> List[ExtractionResult]:
+    """
+    Fuehrt alle Regeln aus und liefert Ergebnisse mit Konfidenz "high".
+
+    Es werden nur Felder aus `fields` mit extract_from_ai=True gefuellt
+    (manuell zu pflegende Felder bleiben leer); bei mehreren Regeln fuer
+    dasselbe Feld gewinnt die erste.
+
+    Args:
+        rules: Regeln der Formular-Definition
+        fields: Felder des Formulars
+        source_text: Extrahierter Text aus den hochgeladenen PDFs
+
+    Returns:
+        Liste von ExtractionResult
+    """
+    known_fields = {f.field_name for f in fields if f.extract_from_ai}
+    results: List[ExtractionResult] = []
+    filled: set = set()
+
+    for rule in rules:
+        for group, value in rule.find_values(source_text).items():
+            for field_name in rule.targets[group]:
+                if field_name not in known_fields or field_name in filled:
+                    continue
+                results.append(ExtractionResult(field_name=field_name, value=value, confidence="high"))
+                filled.add(field_name)
+
+    if results:
+        logger.info(f"Regel-Extraktion: {len(results)} Felder ({', '.join(sorted(filled))})")
+    return results
+
+
+# ===================================================================
+# Normalisierung
+# ===================================================================
+
+def normalize_date(raw: str) -> Optional[str]:
+    """
+    Datum auf TT.MM.JJJJ normalisieren; zweistellige Jahre werden auf das
+    letzte Jahrhundert bezogen, das nicht in der Zukunft liegt.
+
+    Returns:
+        Normalisiertes Datum oder None bei ungueltigem Datum
+    """
+    parts = [p for p in re.split(r"[.\s]+", raw.strip()) if p]
+    if len(parts) != 3:
+        return None
+    try:
+        day, month, year = (int(p) for p in parts)
+    except ValueError:
+        return None
+    if len(parts[2]) == 2:
+        current = date.today().year
+        year += (current // 100) * 100
+        if year > current:
+            year -= 100
+    elif len(parts[2]) != 4:
+        return None
+    try:
+        parsed = date(year, month, day)
+    except ValueError:
+        return None
+    if parsed > date.today():
+        return None
+    return parsed.strftime("%d.%m.%Y")
+
+
+def normalize_plz(raw: str) -> Optional[str]:
+    """Deutsche Postleitzahl (5 Ziffern, nicht 00xxx)."""
+    plz = raw.strip()
+    if re.fullmatch(r"\d{5}", plz) and not plz.startswith("00"):
+        return plz
+    return None
+
@@ -0,0 +1,327 @@
+"""
+Session Store
+
+Persistenter, prozessuebergreifender Speicher fuer Review-Sitzungen.
+Ersetzt das frühere modulweite sessions-Dictionary, damit alle Gunicorn-Worker
+dieselben Sitzungen sehen und Neustarts laufende Reviews nicht verwerfen.
+
+Standard-Backend ist SQLite im WAL-Modus; weitere Backends implementieren
+die abstrakte Klasse SessionStore.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import fields as dataclass_fields, MISSING
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.models.form_schema import FormField, FieldType, FieldStatus
+
+logger = logging.getLogger(__name__)
+
+# Attribute, die bei der Serialisierung immer geschrieben werden
+_FIELD_KEY_ATTRS = ("field_name",)
+
+
+# ===================================================================
+# Serialisierung von FormField-Listen
+# ===================================================================
+
+def _definition_fields(form_id: Optional[str]) -> Dict[str, FormField]:
+    """Liefert die Felder der Formular-Definition als Basis fuer die Delta-Kodierung."""
+    if not form_id:
+        return {}
+    from app.form_registry import get_form_registry
+
+    entry = get_form_registry().get(form_id)
+    if not entry:
+        return {}
+    return {f.field_name: f for f in entry.definition.fields}
+
+
+def _encode_value(value):
+    if isinstance(value, (FieldType, FieldStatus)):
+        return value.value
+    return value
+
+
+def serialize_fields(fields: List[FormField], form_id: Optional[str] = None) -> list:
+    """
+    Kodiert FormFields kompakt als Liste von Dictionaries.
+
+    Gespeichert werden nur Attribute, die von der Formular-Definition (bzw.
+    vom Dataclass-Default bei unbekannten Feldern) abweichen.
+
+    Args:
+        fields: Liste der FormField-Objekte
+        form_id: Formular-ID fuer die Delta-Kodierung gegen die Definition
+
+    Returns:
+        JSON-serialisierbare Liste
+    """
+    base_fields = _definition_fields(form_id)
+    encoded = []
+    for f in fields:
+        base = base_fields.get(f.field_name)
+        item = {}
+        for attr in dataclass_fields(FormField):
+            value = getattr(f, attr.name)
+            if attr.name in _FIELD_KEY_ATTRS:
+                item[attr.name] = value
+                continue
+            if base is not None:
+                if getattr(base, attr.name) == value:
+                    continue
+            elif attr.default is not MISSING and attr.default == value:
+                continue
+            item[attr.name] = _encode_value(value)
+        if base is None:
+            item["_full"] = True
+        encoded.append(item)
+    return encoded
+
+
+def deserialize_fields(encoded: list, form_id: Optional[str] = None) -> List[FormField]:
+    """
+    Gegenstueck zu serialize_fields().
+
+    Args:
+        encoded: Kodierte Feldliste
+        form_id: Formular-ID fuer die Delta-Kodierung gegen die Definition
+
+    Returns:
+        Liste von FormField-Objekten
+    """
+    base_fields = _definition_fields(form_id)
+    fields = []
+    for item in encoded:
+        data = dict(item)
+        is_full = data.pop("_full", False)
+        if "field_type" in data:
+            data["field_type"] = FieldType(data["field_type"])
+        if "status" in data:
+            data["status"] = FieldStatus(data["status"])
+
+        base = None if is_full else base_fields.get(data["field_name"])
+        if base is not None:
+            field = base.model_copy()
+            for key, value in data.items():
+                setattr(field, key, value)
+        else:
+            field = FormField(**data)
+        fields.append(field)
+    return fields
+
+
+def _encode_session(data: dict) -> bytes:
+    form_id = data.get("form_id")
+    payload = dict(data)
+    payload["fields"] = serialize_fields(data.get("fields", []), form_id)
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(raw.encode("utf-8"))
+
+
+def _decode_session(blob: bytes) -> dict:
+    payload = json.loads(zlib.decompress(blob).decode("utf-8"))
+    payload["fields"] = deserialize_fields(payload.get("fields", []), payload.get("form_id"))
+    return payload
+
+
+# ===================================================================
+# Backends
+# ===================================================================
+
+class SessionStore(ABC):
+    """
+    Abstrakte Schnittstelle fuer Session-Backends.
+
+    Eine Session ist ein Dictionary mit mindestens "form_id", "fields"
+    (Liste von FormField) und "source_text".
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[dict]:
+        """
+        Laedt eine Session.
+
+        Returns:
+            Session-Dictionary oder None, falls unbekannt oder abgelaufen
+        """
+
+    @abstractmethod
+    def put(self, session_id: str, data: dict) -> None:
+        """Speichert (oder ueberschreibt) eine Session."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Entfernt eine Session."""
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        """
+        Entfernt abgelaufene Sessions.
+
+        Returns:
+            Anzahl entfernter Sessions
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Prozesslokaler Speicher (nur fuer Entwicklung mit einem Worker).
+    """
+
+    def __init__(self, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self._sessions: Dict[str, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        updated_at, data = entry
+        if time.time() - updated_at > self.ttl_seconds:
+            self.delete(session_id)
+            return None
+        return data
+
+    def put(self, session_id: str, data: dict) -> None:
+        with self._lock:
+            self._sessions[session_id] = (time.time(), data)
+        self.evict_expired()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, (ts, _) in self._sessions.items() if ts < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-Backend im WAL-Modus.
+
+    Mehrere Prozesse koennen gleichzeitig lesen, Schreibzugriffe werden von
+    SQLite serialisiert. Jede Session wird einzeln (lazy) geladen; der Payload
+    ist zlib-komprimiertes JSON mit delta-kodierten Feldern.
+    """
+
+    def __init__(self, db_path: Path, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Eine Verbindung pro Thread (sqlite3-Verbindungen sind nicht thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " form_id TEXT,"
+                " payload BLOB NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)"
+            )
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT payload, updated_at FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        payload, updated_at = row
+        if time.time() - updated_at > self.ttl_seconds:
+            self.delete(session_id)
+            return None
+        try:
+            return _decode_session(payload)
+        except Exception as e:
+            logger.error(f"Session {session_id} konnte nicht geladen werden: {e}")
+            return None
+
+    def put(self, session_id: str, data: dict) -> None:
+        blob = _encode_session(data)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, form_id, payload, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, data.get("form_id"), blob, time.time()),
+            )
+        self.evict_expired()
+
+    def delete(self, session_id: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def evict_expired(self) -> int:
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+        if cursor.rowcount:
+            logger.info(f"{cursor.rowcount} abgelaufene Session(s) entfernt")
+        return cursor.rowcount
+
+
+# Singleton-Instanz
+_store_instance: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    Liefert den globalen Session-Store (Singleton, Backend aus settings.SESSION_BACKEND).
+
+    Returns:
+        SessionStore-Instanz
+    """
+    global _store_instance
+
+    with _store_lock:
+        if _store_instance is None:
+            ttl_seconds = settings.SESSION_TTL_HOURS * 3600
+            backend = settings.SESSION_BACKEND.lower()
+            if backend == "memory":
+                _store_instance = MemorySessionStore(ttl_seconds)
+            elif backend == "sqlite":
+                _store_instance = SQLiteSessionStore(settings.SESSION_DB_PATH, ttl_seconds)
+            else:
+                raise ValueError(f"Unbekanntes Session-Backend: {settings.SESSION_BACKEND}")
+            logger.info(f"Session-Store: {type(_store_instance).__name__}")
+        return _store_instance
@@ -0,0 +1,237 @@
+"""
+Text Retrieval
+
+Zerlegt lange Quelltexte in Abschnitte (Dokument → Seite → Absatz) und waehlt
+per BM25 fuer jeden Extraktions-Pass nur die Abschnitte aus, die zu dessen
+Feldern passen. Als Suchanfrage dienen Label und Beschreibung der Felder.
+
+Dadurch bleiben auch lange Eingaben innerhalb von OLLAMA_NUM_CTX_LARGE und
+koennen mit dem Standard-Modell verarbeitet werden.
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.models.form_schema import FormField
+
+logger = logging.getLogger(__name__)
+
+_DOCUMENT_RE = re.compile(r"^=== Dokument: (.*?) ===\s*$")
+_PAGE_RE = re.compile(r"^--- Seite (\d+) ---\s*$")
+_TOKEN_RE = re.compile(r"[a-z0-9äöüß]+")
+
+# Haeufige deutsche Woerter ohne Aussagekraft fuer die Suche
+_STOPWORDS = {
+    "aber", "alle", "als", "am", "an", "auch", "auf", "aus", "bei", "bis", "das", "dass",
+    "dem", "den", "der", "des", "die", "ein", "eine", "einem", "einen", "einer", "eines",
+    "fuer", "für", "hat", "im", "in", "ist", "mit", "nach", "nicht", "noch", "oder",
+    "sich", "sind", "so", "sowie", "ueber", "über", "um", "und", "vom", "von", "vor",
+    "war", "wie", "wird", "wurde", "zu", "zum", "zur", "ggf", "bzw", "z", "b", "etc",
+}
+
+# BM25-Parameter (Standardwerte)
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+
+
+def _tokenize(text: str) -> list[str]:
+    """Kleinschreibung, Umlaute vereinheitlichen (ae/oe/ue), Stoppwoerter entfernen."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        token = token.replace("ä", "ae").replace("ö", "oe").replace("ü", "ue").replace("ß", "ss")
+        if len(token) > 1 and token not in _STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+@dataclass
+class TextChunk:
+    """Zusammenhaengender Abschnitt des Quelltexts."""
+    index: int
+    document: str
+    page: int | None
+    text: str
+    is_document_start: bool = False
+    tokens: list[str] = field(default_factory=list, repr=False)
+
+    @property
+    def heading(self) -> str:
+        if self.page is None:
+            return f"[{self.document}]"
+        return f"[{self.document}, Seite {self.page}]"
+
+
+def split_into_chunks(source_text: str, max_chars: int) -> list[TextChunk]:
+    """
+    Zerlegt den Quelltext (Format von pdf_reader.extract_from_multiple) in Abschnitte.
+
+    Dokument- und Seitenmarker werden als Metadaten uebernommen; innerhalb einer
+    Seite werden Absaetze zusammengefasst, bis max_chars erreicht ist.
+
+    Args:
+        source_text: Zusammengefuegter Text aller Dokumente
+        max_chars: Angestrebte maximale Abschnittsgroesse in Zeichen
+
+    Returns:
+        Liste von TextChunk in Originalreihenfolge
+    """
+    chunks: list[TextChunk] = []
+    document = "Dokument"
+    page: int | None = None
+    document_started = True
+    paragraph: list[str] = []
+    buffer: list[str] = []
+
+    def flush_buffer():
+        nonlocal buffer, document_started
+        text = "\n\n".join(buffer).strip()
+        buffer = []
+        if text:
+            chunks.append(TextChunk(
+                index=len(chunks),
+                document=document,
+                page=page,
+                text=text,
+                is_document_start=document_started,
+            ))
+            document_started = False
+
+    def flush_paragraph():
+        nonlocal paragraph
+        text = "\n".join(paragraph).strip()
+        paragraph = []
+        if not text:
+            return
+        # Ueberlange Absaetze zeilenweise aufteilen
+        pieces = [text]
+        if len(text) > max_chars:
+            pieces, current = [], ""
+            for line in text.split("\n"):
+                if current and len(current) + len(line) + 1 > max_chars:
+                    pieces.append(current)
+                    current = ""
+                current = f"{current}\n{line}" if current else line
+            if current:
+                pieces.append(current)
+        for piece in pieces:
+            if buffer and sum(len(b) for b in buffer) + len(piece) > max_chars:
+                flush_buffer()
+            buffer.append(piece)
+
+    for line in source_text.split("\n"):
+        doc_match = _DOCUMENT_RE.match(line)
+        page_match = _PAGE_RE.match(line)
+        if doc_match or page_match:
+            flush_paragraph()
+            flush_buffer()
+            if doc_match:
+                document = doc_match.group(1)
+                page = None
+                document_started = True
+            else:
+                page = int(page_match.group(1))
+            continue
+        if not line.strip():
+            flush_paragraph()
+        else:
+            paragraph.append(line)
+    flush_paragraph()
+    flush_buffer()
+
+    for chunk in chunks:
+        chunk.tokens = _tokenize(chunk.text)
+    return chunks
+
+
+class TextRetriever:
+    """
+    BM25-Index ueber die Abschnitte eines Quelltexts.
+    """
+
+    def __init__(self, source_text: str, chunk_chars: int):
+        """
+        Args:
+            source_text: Zusammengefuegter Text aller Dokumente
+            chunk_chars: Angestrebte Abschnittsgroesse in Zeichen
+        """
+        self.chunks = split_into_chunks(source_text, chunk_chars)
+        self._term_freqs = [Counter(c.tokens) for c in self.chunks]
+        self._avg_len = (
+            sum(len(c.tokens) for c in self.chunks) / len(self.chunks) if self.chunks else 0.0
+        )
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self.chunks)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+        logger.info(f"Retrieval-Index: {n} Abschnitte, {len(self._idf)} Begriffe")
+
+    def score(self, query_tokens: list[str]) -> list[float]:
+        """BM25-Score jedes Abschnitts fuer die Suchanfrage."""
+        query = Counter(query_tokens)
+        scores = []
+        for chunk, tf in zip(self.chunks, self._term_freqs):
+            length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * len(chunk.tokens) / (self._avg_len or 1))
+            total = 0.0
+            for term in query:
+                freq = tf.get(term)
+                if freq:
+                    total += self._idf[term] * freq * (_BM25_K1 + 1) / (freq + length_norm)
+            scores.append(total)
+        return scores
+
+    def select(self, fields: list[FormField], max_chars: int, include_document_starts: bool = False) -> str:
+        """
+        Waehlt die relevantesten Abschnitte fuer die Felder eines Passes.
+
+        Args:
+            fields: Felder des Passes (Label + Beschreibung bilden die Suchanfrage)
+            max_chars: Zeichenbudget fuer den ausgewaehlten Text
+            include_document_starts: Ersten Abschnitt jedes Dokuments immer aufnehmen
+                (Briefkopf mit Patientendaten, Datum, Absender)
+
+        Returns:
+            Ausgewaehlte Abschnitte in Originalreihenfolge, jeweils mit Herkunftsangabe
+        """
+        query_tokens = []
+        for f in fields:
+            query_tokens.extend(_tokenize(f"{f.label_de} {f.description}"))
+        scores = self.score(query_tokens)
+
+        ranked = sorted(range(len(self.chunks)), key=lambda i: (-scores[i], i))
+        if include_document_starts:
+            starts = [c.index for c in self.chunks if c.is_document_start]
+            ranked = starts + [i for i in ranked if i not in starts]
+
+        selected: list[int] = []
+        used = 0
+        for i in ranked:
+            if not include_document_starts or not self.chunks[i].is_document_start:
+                if scores[i] <= 0:
+                    break
+            size = len(self.chunks[i].text) + len(self.chunks[i].heading) + 2
+            if used + size > max_chars:
+                continue
+            selected.append(i)
+            used += size
+
+        if not selected:
+            # Keine Treffer: Textanfang verwenden, statt ohne Quelltext zu extrahieren
+            for chunk in self.chunks:
+                size = len(chunk.text) + len(chunk.heading) + 2
+                if used + size > max_chars:
+                    break
+                selected.append(chunk.index)
+                used += size
+
+        selected.sort()
+        logger.info(
+            f"Retrieval: {len(selected)}/{len(self.chunks)} Abschnitte, {used} Zeichen "
+            f"fuer {len(fields)} Feld(er)"
+        )
+        return "\n\n".join(f"{self.chunks[i].heading}\n{self.chunks[i].text}" for i in selected)
@@ -0,0 +1,347 @@
+"""
+Tracing
+
+Leichtgewichtige Span-Zeitleiste pro Session: Upload, OCR (je Seite),
+Extraktions-Paesse, Modell-Laden, Ollama-Anfragen und PDF-Ausfuellung.
+Zeigt, wo die Zeit eines langsamen Dokuments tatsaechlich bleibt.
+
+Ein Trace-Abschnitt (trace()) sammelt die Spans eines zusammenhaengenden
+Ablaufs, z.B. des Verarbeitungs-Jobs oder der PDF-Erzeugung, und haengt sie
+beim Verlassen als eine Zeile an UPLOAD_DIR/<session_id>/trace.jsonl an
+(wie job.json fuer alle Gunicorn-Worker lesbar). Der aktuelle Trace und
+Eltern-Span liegen in contextvars; ausserhalb eines Trace-Abschnitts ist
+span() ein No-Op. Fuer Threads eines ThreadPoolExecutor muss der Kontext
+mit in_current_context() mitgegeben werden.
+
+Nach aussen (Admin-Ansicht, Export) erscheint ein Trace nur unter seiner
+public_id, einem Hash der Session-ID: die Session-ID selbst ist die einzige
+Zugangskontrolle fuer Review-Seite und ausgefuelltes PDF.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TRACE_FILENAME = "trace.jsonl"
+
+
+@dataclass
+class Span:
+    """
+    Ein gemessener Abschnitt.
+
+    Attributes:
+        name: Bezeichnung (z.B. "ocr", "Pass 2.1")
+        start: Startzeit (Unix-Zeit in Sekunden, prozessuebergreifend vergleichbar)
+        duration: Dauer in Sekunden (None, solange der Span laeuft)
+        span_id: Eindeutige ID
+        parent_id: ID des umschliessenden Spans (None = Wurzel)
+        thread: Thread bzw. Prozess, in dem der Abschnitt lief
+        attrs: Zusatzinformationen (Modell, Tokens, Seitenzahl, Fehler, ...)
+    """
+    name: str
+    start: float
+    duration: Optional[float] = None
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+    thread: str = field(default_factory=lambda: threading.current_thread().name)
+    attrs: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class _Trace:
+    """Gesammelte Spans eines Trace-Abschnitts (threadsicher)."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+_current_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+@contextmanager
+def trace(trace_id: str, name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Startet einen Trace-Abschnitt mit Wurzel-Span `name` und speichert ihn beim Verlassen.
+
+    Args:
+        trace_id: Session-ID, unter der der Abschnitt abgelegt wird
+        name: Name des Wurzel-Spans (z.B. "processing", "generate_pdf")
+        **attrs: Zusatzinformationen fuer den Wurzel-Span
+
+    Yields:
+        Wurzel-Span (None bei TRACING_ENABLED=false)
+    """
+    if not settings.TRACING_ENABLED:
+        yield None
+        return
+
+    current = _Trace(trace_id)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _save(current)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Misst den with-Block als Kind-Span des aktuellen Spans (auch bei Exceptions).
+
+    Yields:
+        Span (Attribute koennen ergaenzt werden) bzw. None ausserhalb eines Traces
+    """
+    current = _current_trace.get()
+    if current is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    new_span = Span(name=name, start=time.time(), parent_id=parent.span_id if parent else None, attrs=dict(attrs))
+    perf_start = time.perf_counter()
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.duration = time.perf_counter() - perf_start
+        current.add(new_span)
+
+
+def add_span(name: str, start: float, duration: float, thread: Optional[str] = None, **attrs) -> None:
+    """
+    Erfasst einen bereits gemessenen Abschnitt (z.B. OCR einer Seite im Worker-Prozess)
+    als Kind des aktuellen Spans.
+
+    Args:
+        name: Bezeichnung
+        start: Startzeit (Unix-Zeit in Sekunden)
+        duration: Dauer in Sekunden
+        thread: Ausfuehrender Thread/Prozess (Standard: aktueller Thread)
+        **attrs: Zusatzinformationen
+    """
+    current = _current_trace.get()
+    if current is None:
+        return
+    parent = _current_span.get()
+    new_span = Span(name=name, start=start, duration=duration,
+                    parent_id=parent.span_id if parent else None, attrs=dict(attrs))
+    if thread:
+        new_span.thread = thread
+    current.add(new_span)
+
+
+def set_attributes(**attrs) -> None:
+    """Ergaenzt Attribute am aktuellen Span (ausserhalb eines Traces ohne Wirkung)."""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def in_current_context(func: Callable) -> Callable:
+    """
+    Bindet func an eine Kopie des aktuellen Kontexts, damit Spans aus einem
+    Executor-Thread im laufenden Trace landen. Pro Aufgabe einmal aufrufen
+    (ein Kontext kann nicht in mehreren Threads gleichzeitig aktiv sein).
+    """
+    context = contextvars.copy_context()
+
+    def _run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return _run
+
+
+# ===================================================================
+# Ablage und Export
+# ===================================================================
+
+def _trace_path(trace_id: str):
+    return settings.UPLOAD_DIR / trace_id / _TRACE_FILENAME
+
+
+def public_id(trace_id: str) -> str:
+    """Nicht umkehrbare Kennung eines Traces (statt der Session-ID in URLs und Exporten)."""
+    return hashlib.sha256(trace_id.encode("utf-8")).hexdigest()[:16]
+
+
+def _save(current: _Trace) -> None:
+    """Haengt die Spans eines Abschnitts als eine JSON-Zeile an die Trace-Datei der Session an."""
+    if not current.spans:
+        return
+    path = _trace_path(current.trace_id)
+    line = json.dumps([s.to_dict() for s in current.spans], ensure_ascii=False, default=str)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        logger.warning(f"Trace fuer {current.trace_id} konnte nicht gespeichert werden: {e}")
+
+
+def load_trace(trace_id: str) -> Optional[List[dict]]:
+    """
+    Alle gespeicherten Spans einer Session, nach Startzeit sortiert.
+
+    Returns:
+        Liste von Span-Dictionaries oder None, wenn kein Trace existiert
+    """
+    if not trace_id or trace_id.startswith(".") or "/" in trace_id or "\\" in trace_id:
+        return None
+    path = _trace_path(trace_id)
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return None
+    spans: List[dict] = []
+    for line in lines:
+        try:
+            spans.extend(json.loads(line))
+        except ValueError:
+            continue  # unvollstaendige Zeile (Abbruch beim Schreiben)
+    return sorted(spans, key=lambda s: s["start"])
+
+
+def _trace_files() -> List[tuple]:
+    """(mtime, Pfad) aller Trace-Dateien, neueste zuerst."""
+    paths = []
+    for path in settings.UPLOAD_DIR.glob(f"*/{_TRACE_FILENAME}"):
+        try:
+            paths.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    paths.sort(reverse=True)
+    return paths
+
+
+def load_public_trace(trace_public_id: str) -> Optional[List[dict]]:
+    """
+    Spans zu einer public_id (siehe load_trace).
+
+    Returns:
+        Liste von Span-Dictionaries oder None, wenn kein Trace existiert
+    """
+    for _, path in _trace_files():
+        if public_id(path.parent.name) == trace_public_id:
+            return load_trace(path.parent.name)
+    return None
+
+
+def list_traces(limit: int = 50) -> List[dict]:
+    """
+    Die zuletzt aktualisierten Traces.
+
+    Returns:
+        Liste von {"public_id", "updated_at", "sections", "form_id"}, neueste zuerst
+    """
+    paths = _trace_files()
+
+    result = []
+    for mtime, path in paths[:limit]:
+        spans = load_trace(path.parent.name) or []
+        roots = [s for s in spans if s["parent_id"] is None]
+        result.append({
+            "public_id": public_id(path.parent.name),
+            "updated_at": mtime,
+            "sections": [{"name": s["name"], "duration": s["duration"]} for s in roots],
+            "form_id": next((s["attrs"].get("form_id") for s in roots if s["attrs"].get("form_id")), None),
+        })
+    return result
+
+
+def waterfall_rows(spans: List[dict]) -> List[dict]:
+    """
+    Spans in Baum-Reihenfolge mit Einrueckung und relativer Lage fuer die Wasserfall-Ansicht.
+
+    Returns:
+        Liste von {"span", "depth", "offset" (s), "left"/"width" (% der Gesamtdauer)}
+    """
+    if not spans:
+        return []
+    begin = min(s["start"] for s in spans)
+    end = max(s["start"] + (s["duration"] or 0) for s in spans)
+    total = max(end - begin, 1e-6)
+
+    children: Dict[Optional[str], List[dict]] = {}
+    known_ids = {s["span_id"] for s in spans}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in known_ids else None
+        children.setdefault(parent, []).append(s)
+
+    rows = []
+
+    def _visit(parent_id: Optional[str], depth: int) -> None:
+        for s in children.get(parent_id, ()):
+            offset = s["start"] - begin
+            rows.append({
+                "span": s,
+                "depth": depth,
+                "offset": offset,
+                "left": offset / total * 100,
+                "width": max((s["duration"] or 0) / total * 100, 0.2),
+            })
+            _visit(s["span_id"], depth + 1)
+
+    _visit(None, 0)
+    return rows
+
+
+def to_chrome_trace(spans: List[dict]) -> dict:
+    """
+    Export im Chrome-Trace-Format (chrome://tracing, Perfetto, speedscope).
+
+    Jeder Thread bzw. OCR-Prozess wird eine eigene Zeile (tid).
+    """
+    thread_ids: Dict[str, int] = {}
+    events = []
+    for s in spans:
+        tid = thread_ids.setdefault(s["thread"], len(thread_ids) + 1)
+        events.append({
+            "name": s["name"],
+            "cat": "kiforms",
+            "ph": "X",
+            "ts": round(s["start"] * 1e6),
+            "dur": round((s["duration"] or 0) * 1e6),
+            "pid": 1,
+            "tid": tid,
+            "args": s["attrs"],
+        })
+    for thread, tid in thread_ids.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -55,4 +55,150 @@ document.addEventListener("DOMContentLoaded", function () {
 
     // Initial die bedingten Felder aktualisieren
     updateConditionalFields();
+
+    // ICD-10-Typeahead fuer Diagnose- und Schluesselfelder
+    const ICD_SEARCH_URL = "/api/icd10/search";
+    const ICD_DEBOUNCE_MS = 200;
+    const ICD_MIN_CHARS = 2;
+
+    function setFieldValue(input, value) {
+        // Wert setzen und Listener (Markierung "geaendert"/"ausgefuellt") informieren,
+        // ohne eine neue Suche auszuloesen
+        input.value = value;
+        input.dataset.icdSilent = "1";
+        input.dispatchEvent(new Event("input", { bubbles: true }));
+        input.dispatchEvent(new Event("change", { bubbles: true }));
+        delete input.dataset.icdSilent;
+    }
+
+    document.querySelectorAll(".icd-field, .diagnosis-field").forEach(function (input) {
+        const index = input.dataset.index;
+        const menu = document.createElement("div");
+        menu.className = "list-group icd-suggestions d-none";
+        input.parentNode.appendChild(menu);
+
+        let timer = null;
+        let controller = null;
+        let items = [];
+        let active = -1;
+
+        function close() {
+            menu.classList.add("d-none");
+            menu.innerHTML = "";
+            items = [];
+            active = -1;
+        }
+
+        function highlight(position) {
+            const buttons = menu.querySelectorAll(".list-group-item");
+            buttons.forEach(function (btn, i) {
+                btn.classList.toggle("active", i === position);
+            });
+            active = position;
+            if (buttons[position]) {
+                buttons[position].scrollIntoView({ block: "nearest" });
+            }
+        }
+
+        function choose(item) {
+            const icdInput = document.getElementById("VERS_DIAGNOSESCH_" + index);
+            const diagInput = document.getElementById("VERS_DIAGNOSE_" + index);
+            if (icdInput) {
+                setFieldValue(icdInput, item.code);
+            }
+            // Diagnosetext nur ersetzen, wenn darin gesucht wurde oder er leer ist
+            if (diagInput && (input === diagInput || !diagInput.value.trim())) {
+                setFieldValue(diagInput, item.label);
+            }
+            close();
+        }
+
+        function render(results) {
+            menu.innerHTML = "";
+            items = results;
+            active = -1;
+            if (!results.length) {
+                close();
+                return;
+            }
+            results.forEach(function (item) {
+                const btn = document.createElement("button");
+                btn.type = "button";
+                btn.className = "list-group-item list-group-item-action";
+                const code = document.createElement("span");
+                code.className = "icd-suggestion-code";
+                code.textContent = item.code;
+                btn.appendChild(code);
+                btn.appendChild(document.createTextNode(item.label));
+                // mousedown statt click: feuert vor dem blur des Eingabefelds
+                btn.addEventListener("mousedown", function (event) {
+                    event.preventDefault();
+                    choose(item);
+                });
+                menu.appendChild(btn);
+            });
+            menu.classList.remove("d-none");
+        }
+
+        function search(query) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const url = ICD_SEARCH_URL + "?q=" + encodeURIComponent(query);
+            fetch(url, { signal: controller.signal })
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Veraltete Antworten ignorieren
+                    if (data.query === input.value.trim() && document.activeElement === input) {
+                        render(data.results || []);
+                    }
+                })
+                .catch(function (error) {
+                    if (error.name !== "AbortError") {
+                        console.warn("ICD-10-Suche fehlgeschlagen:", error);
+                    }
+                });
+        }
+
+        input.addEventListener("input", function () {
+            if (input.dataset.icdSilent) {
+                return;
+            }
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < ICD_MIN_CHARS) {
+                if (controller) {
+                    controller.abort();
+                }
+                close();
+                return;
+            }
+            timer = setTimeout(function () { search(query); }, ICD_DEBOUNCE_MS);
+        });
+
+        input.addEventListener("keydown", function (event) {
+            if (!items.length) {
+                return;
+            }
+            if (event.key === "ArrowDown") {
+                event.preventDefault();
+                highlight((active + 1) % items.length);
+            } else if (event.key === "ArrowUp") {
+                event.preventDefault();
+                highlight((active - 1 + items.length) % items.length);
+            } else if (event.key === "Enter" && active >= 0) {
+                // Kein Formular-Submit beim Uebernehmen eines Vorschlags
+                event.preventDefault();
+                choose(items[active]);
+            } else if (event.key === "Escape") {
+                close();
+            }
+        });
+
+        input.addEventListener("blur", function () {
+            clearTimeout(timer);
+            close();
+        });
+    });
 });
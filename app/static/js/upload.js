@@ -8,7 +8,9 @@ document.addEventListener("DOMContentLoaded", function () {
     const submitBtn = document.getElementById("submitBtn");
     const uploadForm = document.getElementById("uploadForm");
     const spinnerOverlay = document.getElementById("spinnerOverlay");
+    const cancelBtn = document.getElementById("spinnerCancelBtn");
     let filesSelected = false;
+    let cancelUrl = null; // Abbruch-URL des laufenden Jobs
     let selectedFiles = []; // Array zum Speichern ausgewählter Dateien
 
     // Formular-Dropdown: Thumbnail laden und Form-Action setzen
@@ -174,34 +176,141 @@ document.addEventListener("DOMContentLoaded", function () {
 
         submitBtn.disabled = true;
 
-        // AJAX-Request senden
+        // AJAX-Request senden: Server antwortet sofort mit Job-ID
         fetch(uploadForm.action, {
             method: "POST",
             body: formData
         })
         .then(function(response) {
-            // Overlay ausblenden vor Redirect oder neuem Seiteninhalt
-            if (spinnerOverlay) {
-                spinnerOverlay.classList.add("d-none");
+            if (!response.ok) {
+                throw new Error("HTTP " + response.status);
             }
+            return response.json();
+        })
+        .then(function(job) {
+            cancelUrl = job.cancel_url;
+            if (cancelBtn) {
+                cancelBtn.classList.remove("d-none");
+            }
+            pollJobStatus(job.status_url);
+        })
+        .catch(handleProcessingError);
+    });
 
-            if (response.redirected) {
-                window.location.href = response.url;
-            } else {
-                return response.text().then(function(text) {
-                    document.open();
-                    document.write(text);
-                    document.close();
-                });
+    // Lesbare Bezeichnungen fuer die Verarbeitungsschritte
+    var STAGE_LABELS = {
+        "ocr": "Text wird extrahiert...",
+        "extraction": "KI analysiert die Dokumente...",
+        "postprocess": "Ergebnisse werden aufbereitet..."
+    };
+    var POLL_INTERVAL_MS = 2000;
+    var POLL_MAX_BACKOFF_MS = 30000;
+
+    // Fehler, bei denen ein erneuter Versuch nichts aendert (Job unbekannt oder fehlgeschlagen)
+    function permanentError(message) {
+        var error = new Error(message);
+        error.permanent = true;
+        return error;
+    }
+
+    // Job-Status abfragen, bis die Verarbeitung abgeschlossen ist.
+    // Einzelne fehlgeschlagene Abfragen (Netzwerk, Worker-Neustart) werden mit
+    // Backoff wiederholt: der Job laeuft serverseitig weiter und bleibt abbrechbar.
+    function pollJobStatus(statusUrl, failures) {
+        failures = failures || 0;
+        fetch(statusUrl)
+        .then(function(response) {
+            if (response.status === 404) {
+                throw permanentError("Job nicht gefunden");
             }
+            if (!response.ok) {
+                throw new Error("HTTP " + response.status);
+            }
+            return response.json();
+        })
+        .then(function(job) {
+            if (cancelUrl === null) {
+                return; // Vom Benutzer abgebrochen
+            }
+            if (job.status === "done") {
+                cancelUrl = null;
+                window.location.href = job.redirect_url;
+                return;
+            }
+            if (job.status === "cancelled") {
+                resetProcessingState();
+                return;
+            }
+            if (job.status === "failed") {
+                throw permanentError(job.error || "Verarbeitung fehlgeschlagen");
+            }
+            var statusText = document.getElementById("spinnerStatus");
+            if (statusText) {
+                statusText.textContent = STAGE_LABELS[job.stage] || "Dokumente werden verarbeitet...";
+            }
+            setTimeout(function() { pollJobStatus(statusUrl); }, POLL_INTERVAL_MS);
         })
         .catch(function(error) {
-            console.error("Fehler:", error);
-            alert("Ein Fehler ist aufgetreten. Bitte versuchen Sie es erneut.");
-            submitBtn.disabled = false;
-            if (spinnerOverlay) {
-                spinnerOverlay.classList.add("d-none");
+            if (error.permanent) {
+                handleProcessingError(error);
+                return;
+            }
+            if (cancelUrl === null) {
+                return; // Inzwischen vom Benutzer abgebrochen
+            }
+            failures += 1;
+            var delay = Math.min(POLL_INTERVAL_MS * Math.pow(2, failures - 1), POLL_MAX_BACKOFF_MS);
+            console.warn("Statusabfrage fehlgeschlagen (" + failures + "x), neuer Versuch in " + delay + " ms:", error);
+            var statusText = document.getElementById("spinnerStatus");
+            if (statusText) {
+                statusText.textContent = "Verbindung unterbrochen, neuer Versuch...";
             }
+            setTimeout(function() { pollJobStatus(statusUrl, failures); }, delay);
         });
+    }
+
+    // Laufenden Job serverseitig abbrechen (beendet auch die Ollama-Generierung)
+    function cancelJob(useBeacon) {
+        if (!cancelUrl) {
+            return;
+        }
+        var url = cancelUrl;
+        cancelUrl = null;
+        if (useBeacon && navigator.sendBeacon) {
+            navigator.sendBeacon(url);
+        } else {
+            fetch(url, { method: "POST" }).catch(function(error) {
+                console.warn("Abbruch-Request fehlgeschlagen:", error);
+            });
+        }
+    }
+
+    if (cancelBtn) {
+        cancelBtn.addEventListener("click", function () {
+            cancelJob(false);
+            resetProcessingState();
+        });
+    }
+
+    // Seite verlassen waehrend der Verarbeitung: Job abbrechen, GPU freigeben
+    window.addEventListener("pagehide", function () {
+        cancelJob(true);
     });
+
+    function resetProcessingState() {
+        cancelUrl = null;
+        submitBtn.disabled = false;
+        if (cancelBtn) {
+            cancelBtn.classList.add("d-none");
+        }
+        if (spinnerOverlay) {
+            spinnerOverlay.classList.add("d-none");
+        }
+    }
+
+    function handleProcessingError(error) {
+        console.error("Fehler:", error);
+        alert("Ein Fehler ist aufgetreten. Bitte versuchen Sie es erneut.");
+        resetProcessingState();
+    }
 });
@@ -0,0 +1,135 @@
+"""
+Benchmark und Regressionstest fuer das Parsen aufgezeichneter LLM-Antworten.
+
+Liest alle Kassetten (LLM_CASSETTE_MODE=record) und fuehrt _parse_response auf
+den aufgezeichneten Antworten aus – ohne Modell, in voller Geschwindigkeit.
+Mit --out wird das Ergebnis als Referenz gespeichert; --baseline vergleicht
+die geparsten Felder und Werte pro Kassette mit einer solchen Referenz und
+endet bei Abweichungen mit Exit-Code 1.
+Fuer die komplette Pipeline (Pass-Orchestrierung, Postprocessing) die App bzw.
+einen Test mit LLM_CASSETTE_MODE=replay starten.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.services.cassettes import iter_cassettes
+from app.services.field_extractor import _parse_response
+
+
+def _response_key(request: dict) -> str:
+    """JSON-Schluessel der erwarteten Antwort ("fields" oder "checkboxes")."""
+    response_format = request.get("format")
+    if isinstance(response_format, dict) and response_format.get("required"):
+        return response_format["required"][0]
+    user_prompt = next((m["content"] for m in request.get("messages", []) if m.get("role") == "user"), "")
+    return "checkboxes" if '"checkboxes"' in user_prompt else "fields"
+
+
+def run_benchmark(directory: Path, repeat: int) -> dict:
+    rows = []
+    for key, cassette in iter_cassettes(directory):
+        response_key = _response_key(cassette["request"])
+        timings = []
+        results = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = _parse_response(cassette["response"], response_key)
+            timings.append(time.perf_counter() - start)
+        rows.append({
+            "cassette": key,
+            "model": cassette["request"].get("model"),
+            "result": cassette.get("result"),
+            "chars": len(cassette["response"]),
+            "key": response_key,
+            "fields": len(results),
+            "field_names": sorted(r.field_name for r in results),
+            "values": sorted([r.field_name, r.value] for r in results),
+            "median_ms": statistics.median(timings) * 1000,
+        })
+    return {
+        "cassettes": len(rows),
+        "empty": sum(1 for r in rows if r["fields"] == 0),
+        "total_median_ms": sum(r["median_ms"] for r in rows),
+        "rows": rows,
+    }
+
+
+def compare_to_baseline(summary: dict, baseline: dict) -> list[str]:
+    """
+    Vergleicht geparste Felder und Werte pro Kassette mit einer Referenz (--out).
+
+    Returns:
+        Abweichungen als Textzeilen (leer = keine Regression)
+    """
+    reference = {row["cassette"]: row for row in baseline.get("rows", [])}
+    changes = []
+    for row in summary["rows"]:
+        before = reference.pop(row["cassette"], None)
+        if before is None:
+            print(f"  neu (nicht in der Referenz): {row['cassette'][:12]}")
+            continue
+        label = row["cassette"][:12]
+        added = sorted(set(row["field_names"]) - set(before["field_names"]))
+        removed = sorted(set(before["field_names"]) - set(row["field_names"]))
+        if added:
+            changes.append(f"{label}: zusaetzliche Felder {', '.join(added)}")
+        if removed:
+            changes.append(f"{label}: fehlende Felder {', '.join(removed)}")
+        if "values" in before:
+            old_values = {tuple(v) for v in before["values"]}
+            new_values = {tuple(v) for v in row["values"]}
+            for name, value in sorted(new_values - old_values):
+                if name in added:
+                    continue
+                old = [v for n, v in sorted(old_values - new_values) if n == name]
+                changes.append(f"{label}: {name} {old[0] if old else None!r} -> {value!r}")
+    for key in reference:
+        print(f"  fehlt (nur in der Referenz): {key[:12]}")
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parst aufgezeichnete LLM-Antworten (Kassetten) und misst die Dauer.")
+    parser.add_argument("--dir", type=Path, default=settings.LLM_CASSETTE_DIR, help="Kassetten-Verzeichnis.")
+    parser.add_argument("--repeat", type=int, default=20, help="Wiederholungen pro Kassette.")
+    parser.add_argument("--out", help="Optional: Ergebnis als JSON speichern (z.B. als Referenz für Regressionen).")
+    parser.add_argument("--baseline", help="Referenz (--out eines früheren Laufs): Abweichungen melden, Exit-Code 1.")
+    args = parser.parse_args()
+
+    summary = run_benchmark(args.dir, args.repeat)
+    for row in summary["rows"]:
+        print(
+            f"{row['cassette'][:12]}  {row['model']:<20} {row['result']:<10} {row['chars']:>6} Zeichen  "
+            f"{row['fields']:>3} {row['key']:<10} {row['median_ms']:8.3f} ms"
+        )
+    print(
+        f"\n{summary['cassettes']} Kassetten, {summary['empty']} ohne Ergebnis, "
+        f"Parsen gesamt {summary['total_median_ms']:.2f} ms (Median)"
+    )
+
+    if args.out:
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Ergebnis gespeichert: {out_path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print(f"\nVergleich mit {args.baseline}:")
+        changes = compare_to_baseline(summary, baseline)
+        for change in changes:
+            print(f"  GEAENDERT {change}")
+        if changes:
+            print(f"{len(changes)} Abweichung(en)")
+            sys.exit(1)
+        print("  keine Abweichungen")
+
+
+if __name__ == "__main__":
+    main()
@@ -121,9 +121,12 @@ def run_benchmark(
 ) -> dict:
     fields = [f.model_copy() for f in S0051_DEFINITION.fields]
     original_model = settings.OLLAMA_MODEL
+    original_cache = settings.LLM_CACHE_ENABLED
     summary = {"models": []}
 
     try:
+        # Laufzeiten messen: Antworten nicht aus dem LLM-Cache liefern
+        settings.LLM_CACHE_ENABLED = False
         for model in models:
             model_runs = []
             for run_idx in range(runs):
@@ -152,6 +155,7 @@ def run_benchmark(
             )
     finally:
         settings.OLLAMA_MODEL = original_model
+        settings.LLM_CACHE_ENABLED = original_cache
 
     summary["ranking"] = sorted(
         (
@@ -0,0 +1,643 @@
+"""
+Mock-Ollama-Server fuer deterministische Performance-Tests ohne GPU.
+
+Implementiert die von ollama_client genutzten Endpunkte /api/tags, /api/ps,
+/api/generate und /api/chat (Streaming und nicht-streamend) und simuliert:
+
+- Modell-Ladezeit und VRAM-Residenz (keep_alive, Verdraengung bei vollem VRAM
+  bzw. OLLAMA_MAX_LOADED_MODELS, Neuladen bei geaendertem num_ctx)
+- Prefill- und Decode-Rate in Tokens/s; ein identischer System-Prompt wird wie
+  bei Ollamas KV-Cache nicht erneut ausgewertet
+- OLLAMA_NUM_PARALLEL: weitere Anfragen an dasselbe Modell warten auf einen Slot
+- Verbindungsabbruch durch den Client (vorzeitiges Stream-Ende, Abbruch)
+
+Antworten kommen aus aufgezeichneten Kassetten (--cassettes, siehe
+app/services/cassettes.py), einem vorhandenen LLM-Antwort-Cache (--replay-cache,
+z.B. CACHE_DIR/llm einer echten Verarbeitung) oder werden aus dem JSON-Schema
+der Anfrage ("format") erzeugt. Alle Wartezeiten sind deterministisch; --speed
+beschleunigt sie fuer CI, die gemeldeten Dauern bleiben die simulierten.
+
+Beispiel:
+    python mock_ollama.py --port 11434 --decode-tps 40 --load-seconds 8 --num-parallel 2
+    OLLAMA_BASE_URL=http://localhost:11434 python -m flask --app app.main run
+
+Zaehler fuer Assertions in Lasttests: GET /mock/stats
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger("mock_ollama")
+
+# Fuelltext fuer Zeichenketten-Werte aus dem Antwort-Schema
+_FILLER = (
+    "Patient berichtet über belastungsabhängige Beschwerden seit mehreren Monaten, "
+    "Befund unauffällig, weitere Abklärung empfohlen. "
+)
+_DEFAULT_KEEP_ALIVE = 300.0
+
+
+@dataclass
+class MockConfig:
+    """
+    Simulationsparameter.
+
+    Attributes:
+        models: Verfuegbare Modelle (/api/tags)
+        prefill_tps: Prompt-Auswertung in Tokens/s
+        decode_tps: Generierung in Tokens/s (pro Anfrage)
+        load_seconds: Ladezeit eines Modells
+        num_parallel: Gleichzeitige Anfragen pro Modell (OLLAMA_NUM_PARALLEL)
+        max_loaded_models: Gleichzeitig geladene Modelle (OLLAMA_MAX_LOADED_MODELS)
+        vram_gb: Verfuegbarer GPU-Speicher
+        model_size_gb: Groesse der Modellgewichte
+        kv_mb_per_token: KV-Cache pro Context-Token und Slot
+        cpu_decode_factor: Decode-Rate relativ zu decode_tps, wenn das Modell nicht ganz in den VRAM passt
+        chars_per_token: Zeichen pro Token fuer die Token-Schaetzung
+        value_chars: Laenge erzeugter Zeichenketten-Werte
+        speed: Zeitraffer (2.0 = doppelt so schnell wie simuliert)
+        replay_cache: Verzeichnis eines LLM-Antwort-Caches (DiskCache) fuer aufgezeichnete Antworten
+        cassette_dir: Verzeichnis mit Kassetten (LLM_CASSETTE_MODE=record)
+    """
+    models: list[str] = field(default_factory=lambda: ["gemma4:e4b"])
+    prefill_tps: float = 2000.0
+    decode_tps: float = 40.0
+    load_seconds: float = 5.0
+    num_parallel: int = 1
+    max_loaded_models: int = 3
+    vram_gb: float = 24.0
+    model_size_gb: float = 8.0
+    kv_mb_per_token: float = 0.1
+    cpu_decode_factor: float = 0.25
+    chars_per_token: float = 4.0
+    value_chars: int = 60
+    speed: float = 1.0
+    replay_cache: Optional[Path] = None
+    cassette_dir: Optional[Path] = None
+
+
+@dataclass
+class _LoadedModel:
+    name: str
+    num_ctx: int
+    size: int
+    size_vram: int
+    slots: threading.Semaphore
+    expires_at: Optional[float] = None  # None = dauerhaft geladen
+    active: int = 0
+    last_used: float = 0.0
+    # System-Prompts, deren KV-Cache in einem Slot liegt
+    prefixes: deque = field(default_factory=deque)
+
+
+class MockOllama:
+    """Simulierter Ollama-Server (ohne HTTP-Schicht)."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded: dict[str, _LoadedModel] = {}
+        self._replay = None
+        if config.replay_cache is not None:
+            from app.services.disk_cache import DiskCache
+            self._replay = DiskCache(config.replay_cache, max_bytes=1 << 40)
+        self.stats = {
+            "requests": 0,
+            "loads": 0,
+            "unloads": 0,
+            "evictions": 0,
+            "replayed": 0,
+            "cancelled": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "max_concurrency": 0,
+            "max_queue_wait": 0.0,
+        }
+        self._running = 0
+
+    # ---------------------------------------------------------------
+    # Zeit und Tokens
+    # ---------------------------------------------------------------
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds / self.config.speed)
+
+    def count_tokens(self, text: str) -> int:
+        return max(1, round(len(text) / self.config.chars_per_token)) if text else 0
+
+    def _split_tokens(self, text: str) -> list[str]:
+        step = max(1, int(self.config.chars_per_token))
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    # ---------------------------------------------------------------
+    # Modell-Residenz
+    # ---------------------------------------------------------------
+
+    def _model_size(self, num_ctx: int) -> int:
+        kv_bytes = self.config.kv_mb_per_token * 1e6 * num_ctx * self.config.num_parallel
+        return int(self.config.model_size_gb * 1e9 + kv_bytes)
+
+    def _expire_idle(self) -> None:
+        """Entfernt Modelle mit abgelaufenem keep_alive (unter self._lock)."""
+        now = time.time()
+        for name, model in list(self._loaded.items()):
+            if model.active == 0 and model.expires_at is not None and model.expires_at <= now:
+                del self._loaded[name]
+                self.stats["unloads"] += 1
+
+    def is_known(self, name: str) -> bool:
+        return _canonical(name) in {_canonical(m) for m in self.config.models}
+
+    def tags(self) -> dict:
+        size = int(self.config.model_size_gb * 1e9)
+        return {"models": [
+            {"name": _canonical(name), "model": _canonical(name), "size": size,
+             "details": {"format": "gguf", "family": name.split(":")[0]}}
+            for name in self.config.models
+        ]}
+
+    def ps(self) -> dict:
+        with self._lock:
+            self._expire_idle()
+            models = []
+            for model in self._loaded.values():
+                expires_at = model.expires_at if model.expires_at is not None else time.time() + 10 * 365 * 86400
+                models.append({
+                    "name": model.name,
+                    "model": model.name,
+                    "size": model.size,
+                    "size_vram": model.size_vram,
+                    "context_length": model.num_ctx,
+                    "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat(),
+                })
+        return {"models": models}
+
+    def unload(self, name: str) -> None:
+        """Entlaedt ein Modell (keep_alive=0 ohne Prompt), sobald seine laufenden Anfragen fertig sind."""
+        with self._load_lock:
+            with self._lock:
+                model = self._loaded.get(_canonical(name))
+            if model is None:
+                return
+            self._drain(model)
+            with self._lock:
+                if self._loaded.get(model.name) is model:
+                    del self._loaded[model.name]
+                    self.stats["unloads"] += 1
+            self._release_all(model)
+
+    def _drain(self, model: _LoadedModel) -> None:
+        """Wartet, bis alle Slots des Modells frei sind, und belegt sie."""
+        for _ in range(self.config.num_parallel):
+            model.slots.acquire()
+
+    def _release_all(self, model: _LoadedModel) -> None:
+        for _ in range(self.config.num_parallel):
+            model.slots.release()
+
+    def _ensure_loaded(self, name: str, num_ctx: int) -> tuple[_LoadedModel, float]:
+        """
+        Laedt das Modell bei Bedarf (auch bei geaendertem num_ctx) und verdraengt
+        dafuer unbenutzte Modelle.
+
+        Returns:
+            (geladenes Modell, simulierte Ladezeit in Sekunden)
+        """
+        name = _canonical(name)
+        with self._lock:
+            self._expire_idle()
+            current = self._loaded.get(name)
+            if current is not None and current.num_ctx == num_ctx:
+                return current, 0.0
+        with self._load_lock:
+            # Erneut pruefen: ein anderer Thread kann das Modell inzwischen geladen haben
+            with self._lock:
+                self._expire_idle()
+                current = self._loaded.get(name)
+            if current is not None and current.num_ctx == num_ctx:
+                return current, 0.0
+            if current is not None:
+                # Neuladen mit anderem Context: laufende Anfragen abwarten
+                self._drain(current)
+                with self._lock:
+                    del self._loaded[name]
+                    self.stats["unloads"] += 1
+                self._release_all(current)
+
+            size = self._model_size(num_ctx)
+            vram = int(self.config.vram_gb * 1e9)
+            with self._lock:
+                # Unbenutzte Modelle verdraengen (aelteste zuerst), bis Platz ist
+                for other in sorted(self._loaded.values(), key=lambda m: m.last_used):
+                    used = sum(m.size_vram for m in self._loaded.values())
+                    if used + size <= vram and len(self._loaded) < self.config.max_loaded_models:
+                        break
+                    if other.active == 0:
+                        del self._loaded[other.name]
+                        self.stats["evictions"] += 1
+                free = max(vram - sum(m.size_vram for m in self._loaded.values()), 0)
+
+            self._sleep(self.config.load_seconds)
+            model = _LoadedModel(
+                name=name,
+                num_ctx=num_ctx,
+                size=size,
+                size_vram=min(size, free),
+                slots=threading.Semaphore(self.config.num_parallel),
+                last_used=time.time(),
+            )
+            with self._lock:
+                self._loaded[name] = model
+                self.stats["loads"] += 1
+            logger.info(f"Modell {name} geladen (num_ctx={num_ctx}, {model.size_vram / 1e9:.1f}/{size / 1e9:.1f} GB VRAM)")
+            return model, self.config.load_seconds
+
+    # ---------------------------------------------------------------
+    # Generierung
+    # ---------------------------------------------------------------
+
+    def response_text(self, body: dict) -> tuple[str, bool]:
+        """
+        Antworttext fuer eine Anfrage: aufgezeichnet (Kassette, Replay-Cache) oder aus dem Schema erzeugt.
+
+        Returns:
+            (Text, aus Aufzeichnung)
+        """
+        if (self.config.cassette_dir is not None or self._replay is not None) and "messages" in body:
+            from app.services import cassettes
+            from app.services.ollama_client import _response_cache_key
+            request = {"model": body.get("model"), "options": body.get("options", {}),
+                       "format": body.get("format"), "messages": body["messages"]}
+            for stop_on_json_complete in (True, False):
+                key = _response_cache_key(request, stop_on_json_complete)
+                if self.config.cassette_dir is not None:
+                    cassette = cassettes.load(key, self.config.cassette_dir)
+                    if cassette is not None:
+                        return cassettes.streamed_text(cassette), True
+                cached = self._replay.get(key) if self._replay is not None else None
+                if cached is not None:
+                    return cached.decode("utf-8"), True
+        if isinstance(body.get("format"), dict):
+            return json.dumps(_sample_from_schema(body["format"], self.config.value_chars), ensure_ascii=False), False
+        if body.get("format") == "json":
+            return "{}", False
+        return "Hallo! Wie kann ich helfen?", False
+
+    def generate(self, body: dict, prompt_parts: list[str], system: str) -> Iterator[dict]:
+        """
+        Fuehrt eine (simulierte) Generierung aus.
+
+        Liefert pro Token {"content": ...} und zum Schluss die Statistik
+        {"done": True, ...} wie Ollamas letzter Chunk. Bricht der Verbraucher
+        die Iteration ab (Client hat die Verbindung geschlossen), wird der Slot
+        freigegeben.
+        """
+        options = body.get("options") or {}
+        num_ctx = int(options.get("num_ctx") or 2048)
+        num_predict = int(options.get("num_predict") or -1)
+        started = time.perf_counter()
+
+        model, load_seconds = self._ensure_loaded(body["model"], num_ctx)
+        wait_start = time.perf_counter()
+        model.slots.acquire()
+        queue_wait = time.perf_counter() - wait_start
+        with self._lock:
+            model.active += 1
+            self._running += 1
+            self.stats["requests"] += 1
+            self.stats["max_concurrency"] = max(self.stats["max_concurrency"], self._running)
+            self.stats["max_queue_wait"] = max(self.stats["max_queue_wait"], round(queue_wait, 4))
+        finished = False
+        try:
+            text, replayed = self.response_text(body)
+            # KV-Cache: identischer System-Prompt eines Slots wird nicht erneut ausgewertet
+            cached_tokens = 0
+            with self._lock:
+                if system and system in model.prefixes:
+                    cached_tokens = self.count_tokens(system)
+                elif system:
+                    model.prefixes.append(system)
+                    while len(model.prefixes) > self.config.num_parallel:
+                        model.prefixes.popleft()
+                self.stats["replayed"] += int(replayed)
+            prompt_tokens = sum(self.count_tokens(p) for p in prompt_parts)
+            evaluated = max(prompt_tokens - cached_tokens, 1)
+            prompt_seconds = evaluated / self.config.prefill_tps
+            self._sleep(prompt_seconds)
+
+            decode_tps = self.config.decode_tps
+            if model.size_vram < model.size:
+                decode_tps *= self.config.cpu_decode_factor
+            tokens = self._split_tokens(text)
+            done_reason = "stop"
+            if 0 <= num_predict < len(tokens):
+                tokens = tokens[:num_predict]
+                done_reason = "length"
+            for token in tokens:
+                self._sleep(1 / decode_tps)
+                yield {"content": token}
+            finished = True
+
+            eval_seconds = len(tokens) / decode_tps
+            with self._lock:
+                self.stats["prompt_tokens"] += evaluated
+                self.stats["cached_prompt_tokens"] += cached_tokens
+                self.stats["completion_tokens"] += len(tokens)
+            yield {
+                "done": True,
+                "done_reason": done_reason,
+                "total_duration": int((load_seconds + prompt_seconds + eval_seconds + queue_wait) * 1e9),
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": evaluated,
+                "prompt_eval_duration": int(prompt_seconds * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(eval_seconds * 1e9),
+            }
+        finally:
+            if not finished:
+                with self._lock:
+                    self.stats["cancelled"] += 1
+            keep_alive = _parse_keep_alive(body.get("keep_alive"))
+            with self._lock:
+                model.active -= 1
+                self._running -= 1
+                model.last_used = time.time()
+                model.expires_at = None if keep_alive < 0 else time.time() + keep_alive
+            model.slots.release()
+            logger.debug(f"{body['model']}: Anfrage beendet nach {time.perf_counter() - started:.2f}s")
+
+
+# ===================================================================
+# Hilfsfunktionen
+# ===================================================================
+
+def _canonical(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+def _parse_keep_alive(value) -> float:
+    """keep_alive wie Ollama: Sekunden als Zahl oder Dauer ("5m", "1h", "30s"); negativ = dauerhaft."""
+    if value is None or value == "":
+        return _DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?", str(value).strip())
+    if not match:
+        return _DEFAULT_KEEP_ALIVE
+    factor = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+    return float(match.group(1)) * factor
+
+
+def _sample_from_schema(schema: dict, value_chars: int):
+    """
+    Deterministische Beispielantwort zu einem JSON-Schema. Arrays von Objekten
+    erhalten ein Element je Wert der ersten Enum-Eigenschaft (z.B. field_name).
+    """
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {
+            name: _sample_from_schema(prop, value_chars)
+            for name, prop in (schema.get("properties") or {}).items()
+        }
+    if kind == "array":
+        items = schema.get("items") or {}
+        enum_props = [
+            (name, prop["enum"]) for name, prop in (items.get("properties") or {}).items() if "enum" in prop
+        ]
+        if items.get("type") == "object" and enum_props:
+            prop_name, values = enum_props[0]
+            result = []
+            for value in values:
+                item = _sample_from_schema(items, value_chars)
+                item[prop_name] = value
+                result.append(item)
+            return result
+        return [_sample_from_schema(items, value_chars)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    filler = _FILLER * (value_chars // len(_FILLER) + 1)
+    return filler[:value_chars].strip()
+
+
+# ===================================================================
+# HTTP
+# ===================================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_MockHTTPServer"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, data: dict, status: int = 200) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: dict) -> None:
+        line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == "/api/tags":
+            self._send_json(mock.tags())
+        elif self.path == "/api/ps":
+            self._send_json(mock.ps())
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-mock"})
+        elif self.path == "/mock/stats":
+            with mock._lock:
+                self._send_json(dict(mock.stats))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+
+        mock = self.server.mock
+        model = body.get("model", "")
+        if not mock.is_known(model):
+            self._send_json({"error": f"model '{model}' not found"}, 404)
+            return
+
+        is_chat = self.path == "/api/chat"
+        if is_chat:
+            messages = body.get("messages") or []
+            system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+            prompt_parts = [m.get("content", "") for m in messages]
+        else:
+            system = body.get("system", "")
+            prompt_parts = [system, body.get("prompt", "")]
+
+        # keep_alive=0 ohne Eingabe: nur entladen (ollama_client.unload_model)
+        if _parse_keep_alive(body.get("keep_alive")) == 0 and not any(prompt_parts):
+            mock.unload(model)
+            self._send_json({"model": model, "done": True, "done_reason": "unload"})
+            return
+
+        def _envelope(chunk: dict) -> dict:
+            data = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": False}
+            content = chunk.pop("content", "")
+            if is_chat:
+                data["message"] = {"role": "assistant", "content": content}
+            else:
+                data["response"] = content
+            data.update(chunk)
+            return data
+
+        generation = mock.generate(body, prompt_parts, system)
+        if not body.get("stream", True):
+            parts, final = [], {}
+            for chunk in generation:
+                if chunk.get("done"):
+                    final = chunk
+                else:
+                    parts.append(chunk["content"])
+            final["content"] = "".join(parts)
+            self._send_json(_envelope(final))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in generation:
+                self._write_chunk(_envelope(chunk))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hat den Stream geschlossen (vorzeitiges Ende bzw. Abbruch)
+            generation.close()
+            self.close_connection = True
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, mock: MockOllama):
+        super().__init__(address, _Handler)
+        self.mock = mock
+
+    def handle_error(self, request, client_address):
+        # Vom Client geschlossene Keep-Alive-Verbindungen sind kein Fehler
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 11434) -> _MockHTTPServer:
+    """
+    Startet den Mock-Server in einem Hintergrund-Thread (z.B. fuer Lasttests im selben Prozess).
+
+    Returns:
+        Server-Instanz (server.mock fuer Statistiken, server.shutdown() zum Beenden)
+    """
+    server = _MockHTTPServer((host, port), MockOllama(config))
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    from app.config import settings
+
+    parser = argparse.ArgumentParser(description="Mock-Ollama-Server für Performance-Tests ohne GPU.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=sorted({settings.OLLAMA_MODEL, settings.OLLAMA_MODEL_SMALL}),
+        help="Verfügbare Modelle (Standard: OLLAMA_MODEL und OLLAMA_MODEL_SMALL).",
+    )
+    parser.add_argument("--prefill-tps", type=float, default=2000.0, help="Prompt-Auswertung in Tokens/s.")
+    parser.add_argument("--decode-tps", type=float, default=40.0, help="Generierung in Tokens/s pro Anfrage.")
+    parser.add_argument("--load-seconds", type=float, default=5.0, help="Ladezeit eines Modells.")
+    parser.add_argument(
+        "--num-parallel",
+        type=int,
+        default=int(os.getenv("OLLAMA_NUM_PARALLEL", "1")),
+        help="Gleichzeitige Anfragen pro Modell (Standard: OLLAMA_NUM_PARALLEL).",
+    )
+    parser.add_argument(
+        "--max-loaded-models",
+        type=int,
+        default=int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "3")),
+        help="Gleichzeitig geladene Modelle (Standard: OLLAMA_MAX_LOADED_MODELS).",
+    )
+    parser.add_argument("--vram-gb", type=float, default=24.0, help="Verfügbarer GPU-Speicher.")
+    parser.add_argument("--model-size-gb", type=float, default=8.0, help="Größe der Modellgewichte.")
+    parser.add_argument("--kv-mb-per-token", type=float, default=0.1, help="KV-Cache pro Context-Token und Slot.")
+    parser.add_argument("--value-chars", type=int, default=60, help="Länge erzeugter Feldwerte.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Zeitraffer (z.B. 10 für CI).")
+    parser.add_argument(
+        "--replay-cache",
+        type=Path,
+        help="LLM-Antwort-Cache einer echten Verarbeitung (z.B. uploads/cache/llm) für aufgezeichnete Antworten.",
+    )
+    parser.add_argument(
+        "--cassettes",
+        type=Path,
+        help="Verzeichnis mit Kassetten (LLM_CASSETTE_MODE=record); deren Stream-Text wird mit simuliertem Timing abgespielt.",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s")
+    config = MockConfig(
+        models=args.models,
+        prefill_tps=args.prefill_tps,
+        decode_tps=args.decode_tps,
+        load_seconds=args.load_seconds,
+        num_parallel=args.num_parallel,
+        max_loaded_models=args.max_loaded_models,
+        vram_gb=args.vram_gb,
+        model_size_gb=args.model_size_gb,
+        kv_mb_per_token=args.kv_mb_per_token,
+        value_chars=args.value_chars,
+        speed=args.speed,
+        replay_cache=args.replay_cache,
+        cassette_dir=args.cassettes,
+    )
+    server = _MockHTTPServer((args.host, args.port), MockOllama(config))
+    logger.info(f"Mock-Ollama auf http://{args.host}:{args.port} (Modelle: {', '.join(config.models)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test-Script für Kassetten (LLM_CASSETTE_MODE=record/replay).
+
+Zeichnet eine Anfrage gegen mock_ollama.py auf, spielt sie ohne Server wieder
+ab und prüft den Referenz-Vergleich von benchmark_cassettes.py.
+"""
+import copy
+import gzip
+import tempfile
+from pathlib import Path
+
+from app.config import settings
+from app.services import cassettes, ollama_client
+from benchmark_cassettes import compare_to_baseline, run_benchmark
+from mock_ollama import MockConfig, start_server
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "fields": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "field_name": {"type": "string", "enum": ["PAT_NAME"]},
+                    "value": {"type": "string"},
+                    "confidence": {"type": "string", "enum": ["high", "medium", "low"]},
+                },
+                "required": ["field_name", "value", "confidence"],
+            },
+        }
+    },
+    "required": ["fields"],
+}
+
+
+def _ask(user_prompt: str) -> str:
+    return ollama_client.chat_completion(
+        "Quelltext: Patient Max Mustermann",
+        user_prompt,
+        stop_on_json_complete=True,
+        response_format=SCHEMA,
+    )
+
+
+def main():
+    failed = []
+    base_dir = Path(tempfile.mkdtemp(prefix="kiforms-cassettes-"))
+    settings.UPLOAD_DIR = base_dir
+    settings.LLM_CASSETTE_DIR = base_dir / "cassettes"
+    settings.LLM_CACHE_ENABLED = False
+    settings.METRICS_DIR = base_dir / "metrics"
+
+    # Aufzeichnen gegen den Mock-Server
+    server = start_server(MockConfig(models=[settings.OLLAMA_MODEL], load_seconds=0.0, speed=1000.0), port=0)
+    settings.OLLAMA_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.LLM_CASSETTE_MODE = cassettes.MODE_RECORD
+    recorded = _ask("Extrahiere PAT_NAME")
+    server.shutdown()
+
+    entries = list(cassettes.iter_cassettes())
+    if len(entries) != 1:
+        failed.append(f"Erwartet 1 Kassette, gefunden {len(entries)}")
+    else:
+        key, cassette = entries[0]
+        if cassette["response"] != recorded:
+            failed.append("Kassette enthält nicht die zurückgegebene Antwort")
+        if not cassette["chunks"] or not cassettes.streamed_text(cassette).strip().startswith(recorded[:20]):
+            failed.append("Stream-Chunks fehlen oder passen nicht zur Antwort")
+        if cassette["request"].get("format") != SCHEMA:
+            failed.append("Request-Payload ohne Schema aufgezeichnet")
+
+    # Wiedergabe ohne Server
+    settings.LLM_CASSETTE_MODE = cassettes.MODE_REPLAY
+    if _ask("Extrahiere PAT_NAME") != recorded:
+        failed.append("Replay liefert eine andere Antwort als die Aufzeichnung")
+    try:
+        _ask("Extrahiere PAT_Geburtsdatum")
+        failed.append("Replay ohne passende Kassette hat keinen Fehler ausgelöst")
+    except cassettes.CassetteNotFound:
+        pass
+
+    # Unlesbare Dateien und andere Versionen werden übersprungen
+    (settings.LLM_CASSETTE_DIR / f"kaputt{cassettes._SUFFIX}").write_bytes(b"keine gzip-Datei")
+    with gzip.open(settings.LLM_CASSETTE_DIR / f"alt{cassettes._SUFFIX}", "wt", encoding="utf-8") as f:
+        f.write('{"version": 0}')
+    if cassettes.load("kaputt") is not None or cassettes.load("alt") is not None:
+        failed.append("Unlesbare bzw. veraltete Kassette nicht verworfen")
+    if len(list(cassettes.iter_cassettes())) != 1:
+        failed.append("iter_cassettes liefert unlesbare Kassetten")
+
+    # Referenz-Vergleich (benchmark_cassettes.py --baseline)
+    summary = run_benchmark(settings.LLM_CASSETTE_DIR, repeat=1)
+    if summary["cassettes"] != 1 or summary["rows"][0]["field_names"] != ["PAT_NAME"]:
+        failed.append(f"Benchmark: unerwartetes Ergebnis {summary['rows']}")
+    if compare_to_baseline(summary, copy.deepcopy(summary)):
+        failed.append("Vergleich mit identischer Referenz meldet Abweichungen")
+    changed = copy.deepcopy(summary)
+    changed["rows"][0]["values"] = [["PAT_NAME", "Erika Musterfrau"]]
+    if len(compare_to_baseline(summary, changed)) != 1:
+        failed.append("Geänderter Wert wird nicht gemeldet")
+    changed["rows"][0]["field_names"] = ["PAT_NAME", "PAT_Geburtsdatum"]
+    if not any("fehlende Felder PAT_Geburtsdatum" in c for c in compare_to_baseline(summary, changed)):
+        failed.append("Fehlendes Feld wird nicht gemeldet")
+
+    if failed:
+        print("KASSETTEN FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("KASSETTEN OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test-Script für den Disk-Cache (OCR-/Textextraktion und LLM-Antworten).
+
+Prüft LRU-Verdrängung nach Zugriff, TTL, beschädigte Einträge, gleichzeitige
+Schreiber aus mehreren Prozessen und den inhaltsadressierten Schlüssel der
+Textextraktion.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.disk_cache import DiskCache
+from app.services.pdf_reader import _extraction_cache_key
+
+
+def _write_many(directory: str, worker: int) -> None:
+    cache = DiskCache(Path(directory), max_bytes=10 * 1024 * 1024)
+    for i in range(200):
+        cache.set("gemeinsam", f"{worker}:{i}".encode("utf-8") * 100)
+
+
+def _age(cache: DiskCache, key: str, seconds_ago: float) -> None:
+    past = time.time() - seconds_ago
+    os.utime(cache._path(key), (past, past))
+
+
+def main():
+    failed = []
+    base_dir = Path(tempfile.mkdtemp(prefix="kiforms-cache-"))
+
+    # Grundfunktionen
+    cache = DiskCache(base_dir / "basis", max_bytes=1024 * 1024)
+    cache.set("abc123", b"\x00\x01daten")
+    if cache.get("abc123") != b"\x00\x01daten":
+        failed.append("get liefert nicht den gespeicherten Inhalt")
+    if cache.get("fehlt") is not None:
+        failed.append("Fehlender Eintrag liefert Daten")
+    cache.delete("abc123")
+    cache.delete("abc123")
+    if cache.get("abc123") is not None:
+        failed.append("Gelöschter Eintrag noch vorhanden")
+
+    # Beschädigter Eintrag (Header zu kurz) wird verworfen
+    cache._path("kaputt").parent.mkdir(parents=True, exist_ok=True)
+    cache._path("kaputt").write_bytes(b"\x01")
+    if cache.get("kaputt") is not None or cache._path("kaputt").exists():
+        failed.append("Beschädigter Eintrag nicht verworfen")
+
+    # TTL: maßgeblich ist der Erstellungszeitpunkt im Header, nicht die mtime
+    ttl_cache = DiskCache(base_dir / "ttl", max_bytes=1024 * 1024, ttl_seconds=60)
+    ttl_cache.set("alt", b"x")
+    path = ttl_cache._path("alt")
+    path.write_bytes(struct.pack("<d", time.time() - 120) + b"x")
+    if ttl_cache.get("alt") is not None:
+        failed.append("Abgelaufener Eintrag geliefert")
+    ttl_cache.set("neu", b"y")
+    if ttl_cache.get("neu") != b"y":
+        failed.append("Gültiger Eintrag mit TTL nicht geliefert")
+
+    # LRU: ein gelesener Eintrag überlebt, der am längsten ungenutzte wird verdrängt
+    lru = DiskCache(base_dir / "lru", max_bytes=3 * 1100)
+    for key in ("aa1", "bb2", "cc3"):
+        lru.set(key, b"x" * 1000)
+    _age(lru, "aa1", 300)
+    _age(lru, "bb2", 200)
+    _age(lru, "cc3", 100)
+    lru.get("aa1")
+    lru.set("dd4", b"x" * 1000)
+    present = {key for key in ("aa1", "bb2", "cc3", "dd4") if lru.get(key) is not None}
+    if present != {"aa1", "cc3", "dd4"}:
+        failed.append(f"LRU-Verdrängung falsch, vorhanden: {sorted(present)}")
+
+    # Gleichzeitige Schreiber auf denselben Schlüssel (Gunicorn-Worker)
+    shared = base_dir / "shared"
+    processes = [multiprocessing.Process(target=_write_many, args=(str(shared), n)) for n in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    value = DiskCache(shared, max_bytes=10 * 1024 * 1024).get("gemeinsam")
+    if any(p.exitcode != 0 for p in processes):
+        failed.append("Schreib-Prozess mit Fehler beendet")
+    unit = value[:len(value) // 100] if value else b""
+    if value is None or value != unit * 100 or not re.fullmatch(rb"\d:\d{1,3}", unit):
+        failed.append(f"Gleichzeitig geschriebener Eintrag beschädigt ({None if value is None else len(value)} Bytes)")
+    if list(shared.glob("*/*.tmp")):
+        failed.append("Temporäre Dateien übrig")
+
+    # Schlüssel der Textextraktion: Inhalt zählt, nicht der Dateiname
+    pdf = Path("data/S0051.pdf")
+    copy = base_dir / "Patient Mustermann.pdf"
+    shutil.copy(pdf, copy)
+    if _extraction_cache_key(pdf) != _extraction_cache_key(copy):
+        failed.append("Gleicher Inhalt ergibt unterschiedliche Cache-Schlüssel")
+    with open(copy, "ab") as f:
+        f.write(b"\n% geaendert\n")
+    if _extraction_cache_key(pdf) == _extraction_cache_key(copy):
+        failed.append("Geänderter Inhalt ergibt denselben Cache-Schlüssel")
+
+    if failed:
+        print("DISK-CACHE FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("DISK-CACHE OK")
+
+
+if __name__ == "__main__":
+    main()
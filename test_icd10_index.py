@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test-Script für den ICD-10-Index und die Code-Prüfung im S0051-Handler.
+
+Reine Schreibweisen-Korrekturen behalten die Konfidenz; unbekannte oder auf
+eine übergeordnete Ebene gekürzte Codes werden mit Konfidenz "low" markiert.
+"""
+from pathlib import Path
+
+from app.form_definitions.s0051 import S0051_DEFINITION
+from app.form_handlers.s0051_handler import S0051FormHandler
+from app.models.form_schema import FieldType, FormField
+from app.services.icd10_index import get_icd10_index, is_formatting_change
+
+
+def _diagnosis_field(number: int, value: str) -> FormField:
+    return FormField(
+        field_name=f"VERS_DIAGNOSESCH_{number}",
+        field_type=FieldType.TEXT,
+        label_de="ICD-10",
+        section=1,
+        description="Test",
+        value=value,
+        ai_confidence="high",
+    )
+
+
+def main():
+    failed = []
+    index = get_icd10_index(Path("data/icd10_codes_2025.json"))
+
+    def expect(name, actual, expected):
+        if actual != expected:
+            failed.append(f"{name}: erwartet {expected!r}, erhalten {actual!r}")
+
+    # Normalisierung
+    expect("Komma", index.normalize_code("m54,5"), "M54.5")
+    expect("Ohne Punkt, Zusatzkennzeichen", index.normalize_code("M545 G"), "M54.5 G")
+    expect("Leerzeichen, Seite", index.normalize_code("M 54.5 R"), "M54.5 R")
+    expect("Ausrufezeichen", index.normalize_code("F32.1!"), "F32.1")
+    expect("Unbekannte Subkategorie", index.normalize_code("M54.59"), "M54.5")
+    expect("Ungültig", index.normalize_code("X1"), None)
+
+    # Schreibweise vs. inhaltliche Änderung
+    expect("Format: Komma", is_formatting_change("m54,5", "M54.5"), True)
+    expect("Format: ohne Punkt", is_formatting_change("M545 G", "M54.5 G"), True)
+    expect("Format: Kreuz-Stern", is_formatting_change("F32.1!", "F32.1"), True)
+    expect("Gekürzt", is_formatting_change("M54.59", "M54.5"), False)
+    expect("Gekürzt auf Kategorie", is_formatting_change("Z99.99 G", "Z99.9 G"), False)
+
+    # Handler: Konfidenz nach der Prüfung
+    values = {1: "m54,5", 2: "M54.59", 3: "Q99.99X", 4: "M54.9"}
+    fields = {f"VERS_DIAGNOSESCH_{n}": _diagnosis_field(n, v) for n, v in values.items()}
+    S0051FormHandler(S0051_DEFINITION)._validate_icd_codes(fields)
+    expect("Handler: Komma korrigiert", (fields["VERS_DIAGNOSESCH_1"].value, fields["VERS_DIAGNOSESCH_1"].ai_confidence), ("M54.5", "high"))
+    expect("Handler: gekürzt", (fields["VERS_DIAGNOSESCH_2"].value, fields["VERS_DIAGNOSESCH_2"].ai_confidence), ("M54.5", "low"))
+    expect("Handler: unbekannt", (fields["VERS_DIAGNOSESCH_3"].value, fields["VERS_DIAGNOSESCH_3"].ai_confidence), ("Q99.99X", "low"))
+    expect("Handler: gültig", (fields["VERS_DIAGNOSESCH_4"].value, fields["VERS_DIAGNOSESCH_4"].ai_confidence), ("M54.9", "high"))
+
+    # Suche
+    expect("Code-Präfix", [r["code"] for r in index.search("m54.", 2)], ["M54", "M54.0"])
+    expect("Volltext", index.search("rueckenschm", 1)[0]["code"], "M54")
+
+    if failed:
+        print("ICD-10 FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("ICD-10 OK")
+
+
+if __name__ == "__main__":
+    main()
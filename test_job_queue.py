@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test-Script für die Job-Queue (job.json im Upload-Verzeichnis).
+
+Prüft gleichzeitige Updates aus mehreren Threads und Prozessen (kein
+verlorenes cancel_requested), Abbruch und das Markieren verwaister Jobs.
+"""
+import logging
+import multiprocessing
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.services import job_queue
+
+
+def _update_many(upload_dir: str, job_id: str, prefix: str, count: int) -> None:
+    settings.UPLOAD_DIR = Path(upload_dir)
+    for i in range(count):
+        job_queue.update_job(job_id, **{f"{prefix}_{i}": i}, stage=f"{prefix}-{i}")
+
+
+def main():
+    failed = []
+    logging.getLogger("app.services.job_queue").setLevel(logging.CRITICAL)
+    settings.UPLOAD_DIR = Path(tempfile.mkdtemp(prefix="kiforms-jobs-"))
+
+    # Gleichzeitige Updates: Threads und Prozesse, dazwischen ein Abbruch
+    job_id = "job-concurrent"
+    job_queue.update_job(job_id, status=job_queue.JOB_RUNNING)
+    threads = [
+        threading.Thread(target=_update_many, args=(str(settings.UPLOAD_DIR), job_id, f"t{n}", 50))
+        for n in range(4)
+    ]
+    processes = [
+        multiprocessing.Process(target=_update_many, args=(str(settings.UPLOAD_DIR), job_id, f"p{n}", 50))
+        for n in range(2)
+    ]
+    for worker in threads + processes:
+        worker.start()
+    if not job_queue.cancel_job(job_id):
+        failed.append("cancel_job: laufender Job nicht abbrechbar")
+    for worker in threads + processes:
+        worker.join()
+    if any(p.exitcode != 0 for p in processes):
+        failed.append("Update-Prozess mit Fehler beendet")
+
+    job = job_queue.get_job(job_id)
+    missing = [
+        f"{prefix}_{i}" for prefix in ("t0", "t1", "t2", "t3", "p0", "p1") for i in range(50)
+        if job.get(f"{prefix}_{i}") != i
+    ]
+    if missing:
+        failed.append(f"Verlorene Updates: {len(missing)} (z.B. {missing[:3]})")
+    if not job.get("cancel_requested"):
+        failed.append("cancel_requested wurde überschrieben")
+    leftovers = [p.name for p in (settings.UPLOAD_DIR / job_id).iterdir() if p.name.endswith(".tmp")]
+    if leftovers:
+        failed.append(f"Temporäre Dateien übrig: {leftovers}")
+
+    # Abgeschlossener Job lässt sich nicht mehr abbrechen
+    job_queue.update_job("job-done", status=job_queue.JOB_DONE)
+    if job_queue.cancel_job("job-done"):
+        failed.append("cancel_job: beendeter Job abgebrochen")
+    if job_queue.cancel_job("job-unknown"):
+        failed.append("cancel_job: unbekannter Job abgebrochen")
+
+    # Verwaister Job (kein Heartbeat) → failed
+    job_queue.update_job("job-orphan", status=job_queue.JOB_RUNNING, stage="extraction")
+    job_queue.update_job("job-fresh", status=job_queue.JOB_RUNNING, stage="extraction")
+    job = job_queue.get_job("job-orphan")
+    job["updated_at"] = time.time() - settings.JOB_STALE_SECONDS - 1
+    job_queue._write_job(job)
+    orphan = job_queue.get_job("job-orphan")
+    if orphan["status"] != job_queue.JOB_FAILED or not orphan.get("error"):
+        failed.append(f"Verwaister Job nicht als fehlgeschlagen markiert: {orphan['status']}")
+    if job_queue.get_job("job-fresh")["status"] != job_queue.JOB_RUNNING:
+        failed.append("Aktiver Job fälschlich als verwaist markiert")
+
+    # Job-Ausführung: erfolgreich, Fehler, Abbruch während der Verarbeitung
+    def _work(job_id, mode):
+        token = job_queue.get_cancel_token(job_id)
+        if mode == "error":
+            raise ValueError("kaputt")
+        if mode == "cancel":
+            for _ in range(100):
+                token.raise_if_set()
+                time.sleep(0.05)
+
+    job_queue.submit_job("job-ok", "S0051", _work, "ok")
+    job_queue.submit_job("job-error", "S0051", _work, "error")
+    job_queue.submit_job("job-cancel", "S0051", _work, "cancel")
+    deadline = time.time() + 10
+    while time.time() < deadline and job_queue.get_job("job-cancel")["status"] != job_queue.JOB_RUNNING:
+        time.sleep(0.05)
+    job_queue.cancel_job("job-cancel")
+    expected = {"job-ok": job_queue.JOB_DONE, "job-error": job_queue.JOB_FAILED, "job-cancel": job_queue.JOB_CANCELLED}
+    while time.time() < deadline and any(job_queue.get_job(j)["status"] != s for j, s in expected.items()):
+        time.sleep(0.05)
+    for j, status in expected.items():
+        actual = job_queue.get_job(j)["status"]
+        if actual != status:
+            failed.append(f"{j}: erwartet {status}, erhalten {actual}")
+
+    if failed:
+        print("JOB-QUEUE FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("JOB-QUEUE OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test-Script für die prozessübergreifenden Metrik-Snapshots.
+
+Prüft, dass Prozesse ohne Messwerte (z.B. OCR-Worker) keinen Snapshot
+hinterlassen und Snapshots beendeter Prozesse zusammengefasst werden,
+ohne dass Counter-Stände verloren gehen.
+"""
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.config import settings
+from app.services import metrics
+
+
+def _idle(metrics_dir: str) -> int:
+    settings.METRICS_DIR = Path(metrics_dir)
+    return 0
+
+
+def _count(metrics_dir: str) -> None:
+    settings.METRICS_DIR = Path(metrics_dir)
+    metrics.JSON_REPAIRS.inc(2)
+
+
+def _value(text: str, name: str) -> str:
+    lines = [line for line in text.splitlines() if line.startswith(name + " ")]
+    return lines[0].split()[1] if lines else ""
+
+
+def main():
+    failed = []
+    base_dir = Path(tempfile.mkdtemp(prefix="kiforms-metrics-"))
+    settings.METRICS_ENABLED = True
+    settings.METRICS_DIR = base_dir
+    ctx = multiprocessing.get_context("spawn")
+
+    # Prozesse ohne Messwerte (wie der OCR-Pool) schreiben nichts
+    with ProcessPoolExecutor(max_workers=3, mp_context=ctx) as executor:
+        list(executor.map(_idle, [str(base_dir)] * 3))
+    leftovers = sorted(p.name for p in base_dir.iterdir())
+    if leftovers:
+        failed.append(f"Snapshots ohne Messwerte: {leftovers}")
+
+    # Beendete Prozesse: Stand bleibt erhalten, Einzeldateien verschwinden
+    for _ in range(3):
+        process = ctx.Process(target=_count, args=(str(base_dir),))
+        process.start()
+        process.join()
+    if len(list(base_dir.glob("[0-9]*.json"))) != 3:
+        failed.append("Messende Prozesse haben keinen Snapshot geschrieben")
+    metrics.JSON_REPAIRS.inc()
+    text = metrics.render()
+    if _value(text, "kiforms_json_repairs_total") != "7":
+        failed.append(f"Counter nach Zusammenfassen falsch: {_value(text, 'kiforms_json_repairs_total')!r}")
+    remaining = sorted(p.name for p in base_dir.glob("*.json"))
+    if remaining != sorted(["retired.json", f"{multiprocessing.current_process().pid}.json"]):
+        failed.append(f"Snapshots beendeter Prozesse nicht zusammengefasst: {remaining}")
+
+    # Erneuter Scrape zählt zusammengefasste Stände nicht doppelt
+    if _value(metrics.render(), "kiforms_json_repairs_total") != "7":
+        failed.append("Zusammengefasste Stände beim zweiten Scrape doppelt gezählt")
+
+    if failed:
+        print("METRIKEN FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("METRIKEN OK")
+
+
+if __name__ == "__main__":
+    main()
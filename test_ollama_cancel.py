@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test-Script für den Abbruch laufender Ollama-Anfragen (cancel_event).
+
+Prüft, dass ein Abbruch auch während des Prefills greift, in dem Ollama noch
+keine Header sendet, dass die Verbindung dabei geschlossen wird (Ollama gibt
+den Slot frei) und dass Anfragen ohne Abbruch unverändert funktionieren.
+"""
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from app.config import settings
+from app.services import ollama_client
+from app.services.metrics import OLLAMA_REQUESTS
+from mock_ollama import MockConfig, start_server
+
+MODEL = "prefill-test"
+NUM_CTX = 2048
+# Gesetzt, sobald der Server das Schliessen der Verbindung bemerkt
+client_gone = threading.Event()
+
+
+class _SilentPrefillHandler(BaseHTTPRequestHandler):
+    """Beantwortet /api/ps, sendet auf /api/chat aber nie Header (langer Prefill)."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": MODEL, "model": MODEL, "context_length": NUM_CTX}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/chat":
+            self._send_json({"model": MODEL, "done": True})
+            return
+        self.connection.settimeout(10)
+        try:
+            if self.connection.recv(1) == b"":
+                client_gone.set()
+        except OSError:
+            client_gone.set()
+        self.close_connection = True
+
+
+def _cancel_after(seconds: float) -> threading.Event:
+    event = threading.Event()
+    threading.Timer(seconds, event.set).start()
+    return event
+
+
+def _cancelled_count(model: str) -> float:
+    return OLLAMA_REQUESTS._values.get((("model", model), ("result", "cancelled")), 0.0)
+
+
+def main():
+    failed = []
+    base_dir = Path(tempfile.mkdtemp(prefix="kiforms-cancel-"))
+    settings.METRICS_DIR = base_dir / "metrics"
+    settings.LLM_CACHE_ENABLED = False
+
+    # Abbruch während des Prefills (noch keine Header)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SilentPrefillHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.OLLAMA_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    ollama_client._http_client = None
+    start = time.perf_counter()
+    try:
+        ollama_client.chat_completion(
+            "System", "Prompt", model=MODEL, num_ctx=NUM_CTX, cancel_event=_cancel_after(0.3),
+        )
+        failed.append("Prefill: kein GenerationCancelled")
+    except ollama_client.GenerationCancelled:
+        pass
+    elapsed = time.perf_counter() - start
+    if elapsed > 3:
+        failed.append(f"Prefill: Abbruch erst nach {elapsed:.1f}s")
+    if not client_gone.wait(3):
+        failed.append("Prefill: Verbindung zum Server nicht geschlossen")
+    if _cancelled_count(MODEL) != 1:
+        failed.append(f"Prefill: Metrik cancelled = {_cancelled_count(MODEL)}")
+    server.shutdown()
+
+    # Abbruch während der Generierung und Anfragen ohne Abbruch (Mock-Server)
+    server = start_server(MockConfig(models=[settings.OLLAMA_MODEL], load_seconds=0.0, decode_tps=5.0), port=0)
+    settings.OLLAMA_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    ollama_client._http_client = None
+    ollama_client._resident_models.clear()
+    ollama_client._ps_cache = None
+    start = time.perf_counter()
+    try:
+        ollama_client.chat_completion("System", "Prompt", cancel_event=_cancel_after(0.5))
+        failed.append("Generierung: kein GenerationCancelled")
+    except ollama_client.GenerationCancelled:
+        pass
+    if time.perf_counter() - start > 3:
+        failed.append("Generierung: Abbruch verzögert")
+
+    server.mock.config.decode_tps = 2000.0
+    for _ in range(2):
+        if not ollama_client.chat_completion("System", "Prompt", cancel_event=threading.Event()):
+            failed.append("Anfrage ohne Abbruch liefert keine Antwort")
+    server.shutdown()
+
+    if failed:
+        print("OLLAMA-ABBRUCH FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("OLLAMA-ABBRUCH OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test-Script für die Regel-Extraktion (Pass 0) des S0051.
+
+Prüft, dass nur eindeutige Treffer übernommen werden und Aufzählungen,
+Befunddaten oder Geburtsdaten weiterer Personen kein Feld füllen.
+"""
+from app.form_definitions.s0051 import S0051_DEFINITION, S0051_RULES
+from app.services.rule_extractor import apply_rules, normalize_date, normalize_plz
+
+
+def _extract(text: str) -> dict:
+    results = apply_rules(S0051_RULES, S0051_DEFINITION.fields, text)
+    return {r.field_name: r.value for r in results}
+
+
+def main():
+    failed = []
+
+    def expect(name, actual, expected):
+        if actual != expected:
+            failed.append(f"{name}: erwartet {expected!r}, erhalten {actual!r}")
+
+    # Eindeutiges Geburtsdatum → nur PAT_Geburtsdatum
+    values = _extract("Patient: Max Mustermann, geb. 03.04.1961\nwohnhaft Hauptstr. 5, 91541 Ansbach")
+    expect("Geburtsdatum", values.get("PAT_Geburtsdatum"), "03.04.1961")
+    expect("VERS_GEBDAT bleibt bei der KI", values.get("VERS_GEBDAT"), None)
+    expect("PLZ", values.get("VERS_PLZ"), "91541")
+    expect("Wohnort", values.get("VERS_WOHNORT"), "Ansbach")
+    expect("Strasse", values.get("VERS_STRASSE_HNR"), "Hauptstr. 5")
+
+    # Aufzählungszeichen vor einem Befunddatum ist kein Geburtsdatum
+    values = _extract("Patient: Max Mustermann\nBefunde:\n* 12.03.2021 MRT LWS: Protrusion L4/5\n*12.05.2022 Labor")
+    expect("Befund-Aufzählung", values.get("PAT_Geburtsdatum"), None)
+
+    # Geburtsdatum einer zweiten Person → mehrdeutig, keine Übernahme
+    values = _extract("Patient: Max Mustermann, geb. 03.04.1961\nEhefrau Erika Mustermann, geb. 17.09.1963")
+    expect("Zweite Person", values.get("PAT_Geburtsdatum"), None)
+
+    # Dasselbe Datum in zwei Schreibweisen ist eindeutig
+    values = _extract("geb. 3.4.61\nGeburtsdatum: 03.04.1961")
+    expect("Schreibweisen", values.get("PAT_Geburtsdatum"), "03.04.1961")
+
+    # Praxis- oder Absenderadressen sind nicht die Anschrift des Versicherten
+    for text in (
+        "Praxis-Adresse: Hauptstraße 5, 12345 Berlin",
+        "Anschrift der Praxis: Hauptstr. 5, 12345 Berlin",
+        "Praxisadresse: Hauptstraße 5, 12345 Berlin",
+        "anschrift unbekannt: siehe Akte 5, 12345 Berlin",
+    ):
+        values = _extract(text)
+        address = [values.get(f) for f in ("VERS_STRASSE_HNR", "VERS_PLZ", "VERS_WOHNORT")]
+        expect(f"Fremdadresse {text!r}", address, [None, None, None])
+
+    # Schlüsselwörter unabhängig von der Schreibweise
+    values = _extract("GEB. 03.04.1961\nANSCHRIFT: Hauptstr. 5a, 91541 Ansbach")
+    expect("Geburtsdatum Großschreibung", values.get("PAT_Geburtsdatum"), "03.04.1961")
+    expect("Strasse Großschreibung", values.get("VERS_STRASSE_HNR"), "Hauptstr. 5a")
+
+    # Felder mit extract_from_ai=False werden nie gefüllt
+    manual = {f.field_name for f in S0051_DEFINITION.fields if not f.extract_from_ai}
+    values = _extract("geb. 03.04.1961, Anschrift: Hauptstr. 5, 91541 Ansbach")
+    expect("Manuelle Felder", sorted(manual & set(values)), [])
+
+    # Normalisierung
+    expect("Datum zweistellig", normalize_date("01.02.99"), "01.02.1999")
+    expect("Datum ungültig", normalize_date("31.02.1990"), None)
+    expect("Datum in der Zukunft", normalize_date("01.01.2999"), None)
+    expect("PLZ 00xxx", normalize_plz("01234"), "01234")
+    expect("PLZ ungültig", normalize_plz("00123"), None)
+
+    if failed:
+        print("REGEL-EXTRAKTION FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("REGEL-EXTRAKTION OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test-Script für den Session-Store (SQLite und Memory).
+
+Prüft die Delta-Kodierung der Felder gegen die Formular-Definition,
+Sichtbarkeit zwischen Prozessen (Gunicorn-Worker) und den Ablauf per TTL.
+"""
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from app.form_definitions.s0051 import S0051_DEFINITION
+from app.models.form_schema import FieldStatus, FieldType, FormField
+from app.services.session_store import (
+    MemorySessionStore,
+    SQLiteSessionStore,
+    deserialize_fields,
+    serialize_fields,
+)
+
+
+def _session() -> dict:
+    fields = [f.model_copy() for f in S0051_DEFINITION.fields]
+    by_name = {f.field_name: f for f in fields}
+    by_name["PAT_NAME"].value = "Mustermann, Max"
+    by_name["PAT_NAME"].status = FieldStatus.FILLED
+    by_name["PAT_NAME"].ai_confidence = "high"
+    by_name["VERS_GEBDAT"].status = FieldStatus.MANUAL
+    by_name["AW_13"].value = "ja"
+    fields.append(FormField(
+        field_name="EXTRA_FELD",
+        field_type=FieldType.TEXT,
+        label_de="Nicht in der Definition",
+        section=99,
+        description="Test",
+        value="Wert mit Umlauten äöü",
+    ))
+    return {"form_id": "S0051", "fields": fields, "source_text": "Quelltext äöü\n" * 3}
+
+
+def _snapshot(fields) -> list:
+    return [
+        (f.field_name, f.field_type, f.value, f.status, f.ai_confidence, f.extract_from_ai, f.label_de)
+        for f in fields
+    ]
+
+
+def _put_in_other_process(db_path: str, session_id: str) -> None:
+    SQLiteSessionStore(Path(db_path), ttl_seconds=3600).put(session_id, _session())
+
+
+def main():
+    failed = []
+    base_dir = Path(tempfile.mkdtemp(prefix="kiforms-sessions-"))
+    session = _session()
+
+    # Delta-Kodierung: unveränderte Felder tragen nur ihren Namen
+    encoded = serialize_fields(session["fields"], "S0051")
+    by_name = {item["field_name"]: item for item in encoded}
+    if set(by_name["PAF_AIGR"]) != {"field_name"}:
+        failed.append(f"Unverändertes Feld nicht delta-kodiert: {by_name['PAF_AIGR']}")
+    if by_name["PAT_NAME"].get("value") != "Mustermann, Max" or by_name["PAT_NAME"].get("status") != "filled":
+        failed.append(f"Geänderte Attribute fehlen: {by_name['PAT_NAME']}")
+    if not by_name["EXTRA_FELD"].get("_full"):
+        failed.append("Feld ohne Definition nicht vollständig kodiert")
+    if _snapshot(deserialize_fields(encoded, "S0051")) != _snapshot(session["fields"]):
+        failed.append("serialize/deserialize verändert Felder")
+
+    # Beide Backends: Round-Trip, Löschen, Ablauf
+    stores = {
+        "sqlite": SQLiteSessionStore(base_dir / "sessions.db", ttl_seconds=3600),
+        "memory": MemorySessionStore(ttl_seconds=3600),
+    }
+    for name, store in stores.items():
+        store.put("s1", _session())
+        loaded = store.get("s1")
+        if loaded is None or _snapshot(loaded["fields"]) != _snapshot(session["fields"]):
+            failed.append(f"{name}: Felder nach put/get verändert")
+        elif loaded["source_text"] != session["source_text"] or loaded["form_id"] != "S0051":
+            failed.append(f"{name}: Session-Daten nach put/get verändert")
+        store.delete("s1")
+        if store.get("s1") is not None:
+            failed.append(f"{name}: gelöschte Session noch vorhanden")
+        if store.get("unbekannt") is not None:
+            failed.append(f"{name}: unbekannte Session geliefert")
+
+        store.ttl_seconds = 1
+        store.put("kurz", _session())
+        time.sleep(1.2)
+        if store.get("kurz") is not None:
+            failed.append(f"{name}: abgelaufene Session geliefert")
+        store.put("alt", _session())
+        time.sleep(1.2)
+        if store.evict_expired() != 1:
+            failed.append(f"{name}: evict_expired entfernt abgelaufene Session nicht")
+
+    # SQLite: Schreiben in einem anderen Prozess ist sofort sichtbar
+    db_path = base_dir / "shared.db"
+    reader = SQLiteSessionStore(db_path, ttl_seconds=3600)
+    process = multiprocessing.Process(target=_put_in_other_process, args=(str(db_path), "s-prozess"))
+    process.start()
+    process.join()
+    loaded = reader.get("s-prozess")
+    if process.exitcode != 0 or loaded is None or _snapshot(loaded["fields"]) != _snapshot(session["fields"]):
+        failed.append("SQLite: Session aus anderem Prozess nicht lesbar")
+
+    if failed:
+        print("SESSION-STORE FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("SESSION-STORE OK")
+
+
+if __name__ == "__main__":
+    main()
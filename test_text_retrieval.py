@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test-Script für die Abschnittsauswahl (BM25) bei großen Quelltexten.
+
+Prüft Zerlegung an Dokument-/Seitenmarkern, Aufteilung überlanger Absätze,
+Einhaltung des Zeichenbudgets, Briefköpfe und den Rückfall ohne Treffer.
+"""
+from app.models.form_schema import FieldType, FormField
+from app.services.text_retrieval import TextRetriever, split_into_chunks
+
+FILLER = "Allgemeiner Verlauf ohne besondere Vorkommnisse, Kontrolle in vier Wochen. "
+
+SOURCE_TEXT = "\n\n".join([
+    "=== Dokument: arztbrief.pdf (Methode: text_extraction) ===",
+    "--- Seite 1 ---",
+    "Patient: Max Mustermann, geb. 03.04.1961\nHauptstr. 5, 91541 Ansbach",
+    "\n".join([FILLER] * 10),
+    "--- Seite 2 ---",
+    "Diagnosen: chronische Rückenschmerzen (M54.5), Bandscheibenvorfall L4/5",
+    "\n".join([FILLER] * 10),
+    "=== Dokument: labor.pdf (Methode: ocr) ===",
+    "--- Seite 1 ---",
+    "Laborwerte: CRP 12 mg/l, Leukozyten 9.800/µl",
+    "\n".join([FILLER] * 10),
+    "--- Seite 2 ---",
+    "\n".join(f"Zeile {i}: {FILLER}" for i in range(40)),
+])
+
+
+def _field(label: str, description: str) -> FormField:
+    return FormField(field_name=label, field_type=FieldType.TEXT, label_de=label, section=1, description=description)
+
+
+def main():
+    failed = []
+    chunk_chars = 600
+    chunks = split_into_chunks(SOURCE_TEXT, chunk_chars)
+
+    # Zerlegung: Marker werden zu Metadaten, Abschnitte bleiben im Budget
+    headings = {c.heading for c in chunks}
+    for expected in ("[arztbrief.pdf (Methode: text_extraction), Seite 2]", "[labor.pdf (Methode: ocr), Seite 1]"):
+        if expected not in headings:
+            failed.append(f"Abschnitt {expected} fehlt")
+    if any("=== Dokument" in c.text or "--- Seite" in c.text for c in chunks):
+        failed.append("Marker im Abschnittstext")
+    oversized = [c.heading for c in chunks if len(c.text) > chunk_chars]
+    if oversized:
+        failed.append(f"Abschnitte über dem Budget: {oversized}")
+    starts = [c.document for c in chunks if c.is_document_start]
+    if starts != ["arztbrief.pdf (Methode: text_extraction)", "labor.pdf (Methode: ocr)"]:
+        failed.append(f"Dokumentanfänge falsch erkannt: {starts}")
+    if "".join(c.text for c in chunks).count("Zeile 39") != 1:
+        failed.append("Überlanger Absatz beim Aufteilen verändert")
+
+    retriever = TextRetriever(SOURCE_TEXT, chunk_chars)
+    budget = 900
+
+    # Relevanter Abschnitt wird gefunden (Umlaute: "Rueckenschmerzen" ↔ "Rückenschmerzen")
+    selected = retriever.select([_field("Diagnose", "Rueckenschmerzen")], budget)
+    if "M54.5" not in selected or "Laborwerte" in selected:
+        failed.append("Diagnose-Abschnitt nicht gezielt ausgewählt")
+    if len(selected) > budget:
+        failed.append(f"Zeichenbudget überschritten ({len(selected)} > {budget})")
+
+    # Briefköpfe werden mitgenommen und stehen in Originalreihenfolge vorne
+    selected = retriever.select([_field("Labor", "Laborwerte CRP Leukozyten")], 2000, include_document_starts=True)
+    positions = [selected.find(s) for s in ("Patient: Max Mustermann", "Laborwerte: CRP")]
+    if -1 in positions or positions != sorted(positions):
+        failed.append("Briefkopf fehlt oder Reihenfolge nicht erhalten")
+
+    # Ohne Treffer: Textanfang statt leerem Quelltext
+    selected = retriever.select([_field("Xyz", "qwertz")], budget)
+    if not selected.startswith("[arztbrief.pdf (Methode: text_extraction), Seite 1]"):
+        failed.append("Kein Rückfall auf den Textanfang ohne Treffer")
+
+    if failed:
+        print("TEXT-RETRIEVAL FEHLER")
+        for e in failed:
+            print(" -", e)
+        raise SystemExit(1)
+
+    print("TEXT-RETRIEVAL OK")
+
+
+if __name__ == "__main__":
+    main()